@@ -0,0 +1,121 @@
+import contextlib
+import io
+import json
+import pathlib
+import sys
+import time
+from typing import Dict, List, Optional
+
+import typer
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))  # make main.py and commands importable
+
+from benchmarks.fake_ec2 import FakeEC2  # noqa: E402
+from benchmarks.scenarios import PROFILE_NAME, REGION_NAME, SCENARIOS, Scenario  # noqa: E402
+
+BASELINE_PATH = pathlib.Path(__file__).resolve().parent.joinpath("baseline.json")
+app = typer.Typer()
+
+
+@app.command()
+def run_benchmarks(
+        latency: float = typer.Option(0.02),
+        only: Optional[str] = typer.Option(None),
+        update_baseline: bool = typer.Option(False),
+):
+    """
+    Run every benchmark scenario against in-memory EC2 stand-in that sleeps `latency` seconds per call. Number of API
+    calls by operation and number of polling calls of each scenario are compared with stored baseline, and the suite
+    fails if any scenario makes more calls than its baseline.
+    """
+    scenarios = [scenario for scenario in SCENARIOS if only is None or only in scenario.name]
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    results = {}
+    regressions = []
+    print(f"{'SCENARIO':<48}{'TIME(s)':>9}{'CALLS':>7}{'POLLS':>7}  STATUS")
+    for scenario in scenarios:
+        result = run_scenario(scenario, latency)
+        results[scenario.name] = {"calls": result["calls"], "polls": result["polls"]}
+        problems = compare(result, baseline.get(scenario.name))
+        status = "new" if scenario.name not in baseline else ("; ".join(problems) if problems else "ok")
+        if problems:
+            regressions.append(scenario.name)
+        print(
+            f"{scenario.name:<48}{result['seconds']:>9.3f}{sum(result['calls'].values()):>7}{result['polls']:>7}"
+            f"  {status}"
+        )
+    if update_baseline:
+        BASELINE_PATH.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f">>> Baseline of {len(results)} scenarios saved to {BASELINE_PATH}")
+    elif regressions:
+        print(f">>> {len(regressions)} scenarios make more API calls than baseline: {regressions}")
+        raise typer.Exit(code=1)
+
+
+def run_scenario(scenario: Scenario, latency: float) -> dict:
+    """
+    Run setup steps of scenario without latency, then measure its run step on cold caches
+    :param scenario: benchmark scenario
+    :param latency: seconds to sleep per API call while measuring
+    :return: dictionary of wall time, API calls by operation and number of polling calls
+    """
+    import commands.cache as cache_commands
+    import commands.clients as clients_commands
+    fakes: Dict[str, FakeEC2] = {}
+    ec2_clients = {}
+
+    def get_ec2_client(profile_name: str, region_name: str):
+        if region_name not in ec2_clients:
+            import boto3
+            fakes[region_name] = FakeEC2(region_name)
+            session = boto3.Session(aws_access_key_id="fake", aws_secret_access_key="fake", region_name=region_name)
+            ec2_clients[region_name] = fakes[region_name].attach(session.client("ec2"))
+        return ec2_clients[region_name]
+
+    original_get_ec2_client = clients_commands.get_ec2_client
+    clients_commands.get_ec2_client = get_ec2_client
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ec2_client = get_ec2_client(PROFILE_NAME, REGION_NAME)
+            cache_commands.clear()
+            for step in scenario.setup:
+                step(ec2_client)
+            cache_commands.clear()
+            for fake in fakes.values():
+                fake.calls.clear()
+                fake.polls = 0
+                fake.latency = latency
+            started_at = time.perf_counter()
+            scenario.run(ec2_client)
+            seconds = time.perf_counter() - started_at
+    finally:
+        clients_commands.get_ec2_client = original_get_ec2_client
+    calls = {}
+    for fake in fakes.values():
+        for operation_name, count in fake.calls.items():
+            calls[operation_name] = calls.get(operation_name, 0) + count
+    polls = sum(fake.polls for fake in fakes.values())
+    return {"seconds": seconds, "calls": dict(sorted(calls.items())), "polls": polls}
+
+
+def compare(result: dict, baseline: Optional[dict]) -> List[str]:
+    """
+    Find operations whose number of calls exceeds baseline
+    :param result: result of scenario
+    :param baseline: baseline of scenario, or None if scenario is new
+    :return: list of descriptions of regressions
+    """
+    if baseline is None:
+        return []
+    problems = [
+        f"{operation_name} {baseline['calls'].get(operation_name, 0)} -> {count}"
+        for operation_name, count in result["calls"].items()
+        if count > baseline["calls"].get(operation_name, 0)
+    ]
+    if result["polls"] > baseline["polls"]:
+        problems.append(f"polls {baseline['polls']} -> {result['polls']}")
+    return problems
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,448 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import dataclasses
+import pathlib
+import tempfile
+from typing import Any, Callable, List, Sequence
+
+from benchmarks.fake_ec2 import FakeEC2
+from commands import aio, ec2, journal, placement, ratelimit, spec, vpc
+from commands.waiter import Schedule
+
+PROFILE_NAME = "benchmark"
+REGION_NAME = "us-east-1"
+OTHER_REGION_NAME = "ap-northeast-2"
+VPC_NAME = "bench"
+KEY_DIR = pathlib.Path(tempfile.gettempdir()).joinpath("aws-ec2-workspace-benchmark")
+JOURNAL_PATH = KEY_DIR.joinpath("journal.jsonl")
+# schedule used by setup steps, so that preparing resources does not wait for first delay of default schedule
+SETUP_SCHEDULE = Schedule(first_delay=0.0, delay=0.0, jitter=0.0)
+
+Step = Callable[[Any], Any]
+
+
+@dataclasses.dataclass(frozen=True)
+class Scenario:
+    """
+    Benchmark scenario: `setup` steps prepare resources without being measured, and `run` is measured. Each step takes
+    EC2 client of default region.
+    """
+    name: str
+    setup: Sequence[Step]
+    run: Step
+
+
+def cli(*args: str, region_name: str = REGION_NAME) -> Step:
+    """
+    Build step that runs main.py command in process
+    :param args: arguments of command without profile and region(ex. 'vpc', 'create', '--vpc-name', 'bench')
+    :param region_name: value of region-name option, or None to omit it
+    :return: step function
+    """
+    import main
+    options = ["--profile-name", PROFILE_NAME] + (["--region-name", region_name] if region_name else [])
+    arguments = list(args) + options
+    return lambda _: main.app(arguments, standalone_mode=False)
+
+
+def create_vpc(ec2_client):
+    vpc.create_vpc(ec2_client, VPC_NAME, "172.40.0.0/16")
+    vpc.create_vpc_security_group(ec2_client, VPC_NAME, ["22", "80"])
+    vpc.create_vpc_internet_gateway(ec2_client, VPC_NAME)
+
+
+def create_public_subnet(ec2_client):
+    vpc.create_subnet(ec2_client, VPC_NAME, "pub-a", "11", REGION_NAME, "a", True)
+    vpc.create_route_table(ec2_client, VPC_NAME, "rt-pub", True)
+    vpc.create_route_table_subnet_association(ec2_client, VPC_NAME, "pub-a", "rt-pub")
+
+
+def create_zone_subnets(ec2_client):
+    for index, postfix in enumerate("abc"):
+        vpc.create_subnet(ec2_client, VPC_NAME, f"pub-{postfix}", str(21 + index), REGION_NAME, postfix, True)
+
+
+def exhaust_zone_capacity(ec2_client):
+    FakeEC2.of(ec2_client).zone_capacity[f"{REGION_NAME}a"] = 0
+
+
+def create_key_pair(ec2_client):
+    KEY_DIR.mkdir(parents=True, exist_ok=True)
+    KEY_DIR.joinpath("bench.pem").unlink(missing_ok=True)
+    ec2.create_key_pair(ec2_client, "bench", KEY_DIR)
+
+
+def run_instance(ec2_client):
+    ec2.run_instance(
+        ec2_client, "ami-bench", "t2.micro", "bench", VPC_NAME, "pub-a", "ws-1", schedule=SETUP_SCHEDULE
+    )
+
+
+def stop_instance(ec2_client):
+    ec2.stop_instances(ec2_client, VPC_NAME, "pub-a", ["ws-1"], schedule=SETUP_SCHEDULE)
+
+
+def allocate_elastic_ip(ec2_client):
+    ec2.allocate_elastic_ip(ec2_client, REGION_NAME, "bench-ip")
+
+
+def associate_elastic_ip(ec2_client):
+    ec2.associate_instance_to_elastic_ip(ec2_client, REGION_NAME, "ws-1", "bench-ip")
+
+
+def interrupt_instance_run(ec2_client):
+    """
+    Record `instance run` of ws-1 in journal as if it was interrupted after launching instance
+    """
+    JOURNAL_PATH.unlink(missing_ok=True)
+    journal.configure(str(JOURNAL_PATH))
+    try:
+        operation = journal.begin(ec2_client, f"instance run {VPC_NAME}/pub-a ['ws-1'] None")
+        operation.step("launch", lambda: ec2.launch_instances(
+            ec2_client, "ami-bench", "t2.micro", "bench", VPC_NAME, "pub-a", ["ws-1"], operation.client_token("launch")
+        ))
+    finally:
+        journal.configure(None)
+
+
+def unlink_key_pair_file(_):
+    KEY_DIR.joinpath("bench.pem").unlink(missing_ok=True)
+
+
+def describe_under_rate_limit(ec2_client):
+    """
+    Make burst of concurrent describe calls, a quarter of them as polling, through rate limiter of small budget
+    """
+    ratelimit.configure(ratelimit.RateLimitOptions(describe=ratelimit.Budget(capacity=10, refill_rate=200.0)))
+    ratelimit.install(ec2_client)  # registered before fake EC2 handles the call, so waiting is measured
+
+    def describe(index: int):
+        with ratelimit.polling() if index % 4 == 0 else contextlib.nullcontext():
+            ec2_client.describe_vpcs()  # made directly, since lookups by name are cached
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+            list(executor.map(describe, range(40)))
+    finally:
+        ratelimit.configure(ratelimit.RateLimitOptions())
+
+
+def run_instances_concurrently(ec2_client):
+    """
+    Launch instances by 50 concurrent operations sharing one event loop, each waiting for its own instance
+    """
+    async def run_all():
+        await asyncio.gather(*(
+            aio.run_instances(
+                ec2_client, "ami-bench", "t2.micro", "bench", VPC_NAME, "pub-a", [f"ws-{i}"], schedule=SETUP_SCHEDULE
+            )
+            for i in range(50)
+        ))
+
+    asyncio.run(run_all())
+
+
+WORKSPACE = [create_vpc, create_public_subnet, create_key_pair, run_instance]
+WORKSPACE_SPEC = {
+    "vpc": {"name": VPC_NAME, "cidr": "172.40.0.0/16", "ports": "22"},
+    "subnets": [
+        {"name": "pub-a", "cidr_substitute": 11, "az_postfix": "a", "route_table_name": "rt-pub", "is_public": True},
+    ],
+    "key_pair": {"name": "bench", "key_dir": str(KEY_DIR)},
+    "instances": [
+        {
+            "name": "ws-1",
+            "subnet_name": "pub-a",
+            "image_id": "ami-bench",
+            "instance_type": "t2.micro",
+            "key_name": "bench",
+        },
+    ],
+    "elastic_ips": [{"name": "bench-ip", "instance_name": "ws-1"}],
+}
+VPC_ARGS = ["--vpc-name", VPC_NAME]
+INSTANCE_ARGS = VPC_ARGS + ["--subnet-name", "pub-a", "--instance-name", "ws-1"]
+
+SCENARIOS: List[Scenario] = [
+    # commands of main.py
+    Scenario(
+        "cli/vpc-create",
+        [],
+        cli("vpc", "create", *VPC_ARGS, "--vpc-cidr", "172.40.0.0/16", "--ports", "22,80,8888-8890"),
+    ),
+    Scenario("cli/vpc-delete", [create_vpc], cli("vpc", "delete", *VPC_ARGS)),
+    Scenario("cli/vpc-ports", [create_vpc], cli("vpc", "ports", *VPC_ARGS, "--ports", "22,20-25,8000-8010")),
+    Scenario("cli/vpc-ports-unchanged", [create_vpc], cli("vpc", "ports", *VPC_ARGS, "--ports", "80,22")),
+    Scenario(
+        "cli/subnet-create",
+        [create_vpc],
+        cli(
+            "subnet", "create", *VPC_ARGS, "--subnet-name", "pub-a", "--cidr-substitute", "11", "--az-postfix", "a",
+            "--route-table-name", "rt-pub", "--is-public",
+        ),
+    ),
+    Scenario(
+        "cli/subnet-create-allocated",
+        [create_vpc, create_public_subnet],
+        cli(
+            "subnet", "create", *VPC_ARGS, "--subnet-name", "prv-b", "--az-postfix", "b",
+            "--route-table-name", "rt-prv", "--no-is-public",
+        ),
+    ),
+    Scenario(
+        "cli/subnet-create-many",
+        [create_vpc],
+        cli(
+            "subnet", "create", *VPC_ARGS, "--subnet-name", "pub-{az}{i}", "--route-table-name", "rt-pub-{az}{i}",
+            "--count", "6", "--prefix-length", "22", "--is-public",
+        ),
+    ),
+    Scenario(
+        "cli/subnet-delete",
+        [create_vpc, create_public_subnet],
+        cli("subnet", "delete", *VPC_ARGS, "--subnet-name", "pub-a", "--route-table-name", "rt-pub"),
+    ),
+    Scenario(
+        "cli/key-pair-create",
+        [unlink_key_pair_file],
+        cli("key-pair", "create", "--key-name", "bench", "--key-dir", str(KEY_DIR)),
+    ),
+    Scenario(
+        "cli/key-pair-delete",
+        [create_key_pair],
+        cli("key-pair", "delete", "--key-name", "bench", "--key-dir", str(KEY_DIR)),
+    ),
+    Scenario(
+        "cli/instance-run",
+        [create_vpc, create_public_subnet, create_key_pair],
+        cli(
+            "instance", "run", *INSTANCE_ARGS, "--key-name", "bench", "--image-id", "ami-bench",
+            "--instance-type", "t2.micro",
+        ),
+    ),
+    Scenario(
+        "cli/instance-run-many",
+        [create_vpc, create_public_subnet, create_key_pair],
+        cli(
+            "instance", "run", *VPC_ARGS, "--subnet-name", "pub-a", "--instance-name", "ws-{i}", "--count", "20",
+            "--key-name", "bench", "--image-id", "ami-bench", "--instance-type", "t2.micro",
+        ),
+    ),
+    Scenario(
+        "cli/instance-run-resume",
+        [create_vpc, create_public_subnet, create_key_pair, interrupt_instance_run],
+        cli(
+            "--journal-file", str(JOURNAL_PATH), "--resume", "instance", "run", *INSTANCE_ARGS, "--key-name", "bench",
+            "--image-id", "ami-bench", "--instance-type", "t2.micro",
+        ),
+    ),
+    Scenario(
+        "cli/instance-run-placement",
+        [create_vpc, create_zone_subnets, create_key_pair, exhaust_zone_capacity],
+        cli(
+            "instance", "run", *VPC_ARGS, "--placement", "spread", "--instance-name", "ws-{i}", "--count", "12",
+            "--key-name", "bench", "--image-id", "ami-bench", "--instance-type", "t2.micro",
+        ),
+    ),
+    Scenario("cli/instance-describe", WORKSPACE, cli("instance", "describe", *INSTANCE_ARGS)),
+    Scenario("cli/instance-watch", WORKSPACE, cli("instance", "watch", *VPC_ARGS, "--duration", "0")),
+    Scenario("cli/instance-stop", WORKSPACE, cli("instance", "stop", *INSTANCE_ARGS)),
+    Scenario("cli/instance-start", WORKSPACE + [stop_instance], cli("instance", "start", *INSTANCE_ARGS)),
+    Scenario("cli/instance-reboot", WORKSPACE, cli("instance", "reboot", *INSTANCE_ARGS)),
+    Scenario("cli/instance-terminate", WORKSPACE, cli("instance", "terminate", *INSTANCE_ARGS)),
+    Scenario(
+        "cli/instance-describe-regions",
+        WORKSPACE,
+        cli(
+            "instance", "describe", "--regions", f"{REGION_NAME},{OTHER_REGION_NAME}", *VPC_ARGS,
+            "--instance-name", "ws-*",
+            region_name=None,
+        ),
+    ),
+    Scenario("cli/elastic-ip-allocate", [], cli("elastic-ip", "allocate", "--eip-name", "bench-ip")),
+    Scenario("cli/elastic-ip-fetch", [allocate_elastic_ip], cli("elastic-ip", "fetch", "--eip-name", "bench-ip")),
+    Scenario(
+        "cli/elastic-ip-associate",
+        WORKSPACE + [allocate_elastic_ip],
+        cli("elastic-ip", "associate", "--eip-name", "bench-ip", "--instance-name", "ws-1"),
+    ),
+    Scenario(
+        "cli/elastic-ip-disassociate",
+        WORKSPACE + [allocate_elastic_ip, associate_elastic_ip],
+        cli("elastic-ip", "disassociate", "--eip-name", "bench-ip"),
+    ),
+    Scenario(
+        "cli/elastic-ip-release",
+        [allocate_elastic_ip],
+        cli("elastic-ip", "release", "--eip-name", "bench-ip"),
+    ),
+    Scenario("cli/list-instances", WORKSPACE, cli("list", "instances", "--filter", "tag:Name=ws-*")),
+    Scenario("cli/list-subnets-vpc", WORKSPACE, cli("list", "subnets", *VPC_ARGS, "--page-size", "5")),
+    Scenario("cli/list-elastic-ips", [allocate_elastic_ip], cli("list", "elastic-ips")),
+    Scenario(
+        "cli/destroy",
+        WORKSPACE + [allocate_elastic_ip, associate_elastic_ip],
+        cli("destroy", *VPC_ARGS),
+    ),
+    # functions of commands/vpc.py
+    Scenario("vpc/create_vpc", [], lambda c: vpc.create_vpc(c, VPC_NAME, "172.40.0.0/16")),
+    Scenario(
+        "vpc/create_vpc_security_group",
+        [lambda c: vpc.create_vpc(c, VPC_NAME, "172.40.0.0/16")],
+        lambda c: vpc.create_vpc_security_group(c, VPC_NAME, ["22", "80"]),
+    ),
+    Scenario(
+        "vpc/create_vpc_internet_gateway",
+        [lambda c: vpc.create_vpc(c, VPC_NAME, "172.40.0.0/16")],
+        lambda c: vpc.create_vpc_internet_gateway(c, VPC_NAME),
+    ),
+    Scenario(
+        "vpc/create_subnet",
+        [create_vpc],
+        lambda c: vpc.create_subnet(c, VPC_NAME, "pub-a", "11", REGION_NAME, "a", True),
+    ),
+    Scenario("vpc/create_route_table", [create_vpc], lambda c: vpc.create_route_table(c, VPC_NAME, "rt-pub", True)),
+    Scenario(
+        "vpc/create_route_table_subnet_association",
+        [
+            create_vpc,
+            lambda c: vpc.create_subnet(c, VPC_NAME, "pub-a", "11", REGION_NAME, "a", True),
+            lambda c: vpc.create_route_table(c, VPC_NAME, "rt-pub", True),
+        ],
+        lambda c: vpc.create_route_table_subnet_association(c, VPC_NAME, "pub-a", "rt-pub"),
+    ),
+    Scenario("vpc/fetch_vpc_id", [create_vpc], lambda c: vpc.fetch_vpc_id(c, VPC_NAME)),
+    Scenario("vpc/fetch_vpc_security_group_id", [create_vpc], lambda c: vpc.fetch_vpc_security_group_id(c, VPC_NAME)),
+    Scenario(
+        "vpc/fetch_subnet_id",
+        [create_vpc, create_public_subnet],
+        lambda c: vpc.fetch_subnet_id(c, VPC_NAME, "pub-a"),
+    ),
+    Scenario(
+        "vpc/fetch_route_table_id",
+        [create_vpc, create_public_subnet],
+        lambda c: vpc.fetch_route_table_id(c, VPC_NAME, "rt-pub"),
+    ),
+    Scenario(
+        "vpc/delete_route_table_subnet_association",
+        [create_vpc, create_public_subnet],
+        lambda c: vpc.delete_route_table_subnet_association(c, VPC_NAME, "pub-a", "rt-pub"),
+    ),
+    Scenario(
+        "vpc/delete_route_table",
+        [
+            create_vpc,
+            create_public_subnet,
+            lambda c: vpc.delete_route_table_subnet_association(c, VPC_NAME, "pub-a", "rt-pub"),
+        ],
+        lambda c: vpc.delete_route_table(c, VPC_NAME, "rt-pub"),
+    ),
+    Scenario(
+        "vpc/delete_subnet",
+        [create_vpc, create_public_subnet],
+        lambda c: vpc.delete_subnet(c, VPC_NAME, "pub-a"),
+    ),
+    Scenario("vpc/delete_vpc_security_group", [create_vpc], lambda c: vpc.delete_vpc_security_group(c, VPC_NAME)),
+    Scenario("vpc/delete_vpc_internet_gateway", [create_vpc], lambda c: vpc.delete_vpc_internet_gateway(c, VPC_NAME)),
+    Scenario(
+        "vpc/delete_vpc",
+        [
+            lambda c: vpc.create_vpc(c, VPC_NAME, "172.40.0.0/16"),
+        ],
+        lambda c: vpc.delete_vpc(c, VPC_NAME),
+    ),
+    # functions of commands/ec2.py
+    Scenario("ec2/create_key_pair", [unlink_key_pair_file], lambda c: ec2.create_key_pair(c, "bench", KEY_DIR)),
+    Scenario("ec2/delete_key_pair", [create_key_pair], lambda c: ec2.delete_key_pair(c, "bench", KEY_DIR)),
+    Scenario(
+        "ec2/run_instance",
+        [create_vpc, create_public_subnet, create_key_pair],
+        lambda c: ec2.run_instance(
+            c, "ami-bench", "t2.micro", "bench", VPC_NAME, "pub-a", "ws-1", schedule=SETUP_SCHEDULE
+        ),
+    ),
+    Scenario(
+        "ec2/run_instances-status",
+        [create_vpc, create_public_subnet, create_key_pair],
+        lambda c: ec2.run_instances(
+            c, "ami-bench", "t2.micro", "bench", VPC_NAME, "pub-a", [f"ws-{i}" for i in range(150)],
+            schedule=SETUP_SCHEDULE, wait_mode="status",
+        ),
+    ),
+    Scenario(
+        "ec2/stop_instances",
+        WORKSPACE,
+        lambda c: ec2.stop_instances(c, VPC_NAME, "pub-a", ["ws-1"], schedule=SETUP_SCHEDULE),
+    ),
+    Scenario(
+        "ec2/start_instances",
+        WORKSPACE + [stop_instance],
+        lambda c: ec2.start_instances(c, VPC_NAME, "pub-a", ["ws-1"], schedule=SETUP_SCHEDULE),
+    ),
+    Scenario(
+        "ec2/reboot_instances",
+        WORKSPACE,
+        lambda c: ec2.reboot_instances(c, VPC_NAME, "pub-a", ["ws-1"], schedule=SETUP_SCHEDULE),
+    ),
+    Scenario(
+        "ec2/terminate_instances",
+        WORKSPACE,
+        lambda c: ec2.terminate_instances(c, VPC_NAME, "pub-a", ["ws-1"], schedule=SETUP_SCHEDULE),
+    ),
+    Scenario("ec2/fetch_instance_id", WORKSPACE, lambda c: ec2.fetch_instance_id(c, VPC_NAME, "pub-a", "ws-1")),
+    Scenario("ec2/fetch_instances", WORKSPACE, lambda c: ec2.fetch_instances(c, VPC_NAME, None, ["ws-*"])),
+    Scenario("ec2/describe_instances", WORKSPACE, lambda c: ec2.describe_instances(c, VPC_NAME, None, ["ws-*"])),
+    Scenario("ec2/describe_instance", WORKSPACE, lambda c: ec2.describe_instance(c, VPC_NAME, "pub-a", "ws-1")),
+    Scenario("ec2/allocate_elastic_ip", [], lambda c: ec2.allocate_elastic_ip(c, REGION_NAME, "bench-ip")),
+    Scenario(
+        "ec2/fetch_elastic_ip_info",
+        [allocate_elastic_ip],
+        lambda c: ec2.fetch_elastic_ip_info(c, REGION_NAME, "bench-ip"),
+    ),
+    Scenario(
+        "ec2/associate_instance_to_elastic_ip",
+        WORKSPACE + [allocate_elastic_ip],
+        lambda c: ec2.associate_instance_to_elastic_ip(c, REGION_NAME, "ws-1", "bench-ip"),
+    ),
+    Scenario(
+        "ec2/disassociate_instance_from_elastic_ip",
+        WORKSPACE + [allocate_elastic_ip, associate_elastic_ip],
+        lambda c: ec2.disassociate_instance_from_elastic_ip(c, REGION_NAME, "bench-ip"),
+    ),
+    Scenario(
+        "ec2/release_elastic_ip",
+        [allocate_elastic_ip],
+        lambda c: ec2.release_elastic_ip(c, REGION_NAME, "bench-ip"),
+    ),
+    # functions of commands/spec.py
+    Scenario("spec/apply_spec", [create_key_pair], lambda c: spec.apply_spec(c, WORKSPACE_SPEC, REGION_NAME)),
+    Scenario(
+        "spec/apply_spec-converged",
+        [create_key_pair, lambda c: spec.apply_spec(c, WORKSPACE_SPEC, REGION_NAME)],
+        lambda c: spec.apply_spec(c, WORKSPACE_SPEC, REGION_NAME),
+    ),
+    # asynchronous functions of commands/aio.py
+    Scenario(
+        "aio/run_instances-concurrent",
+        [create_vpc, create_public_subnet, create_key_pair],
+        run_instances_concurrently,
+    ),
+    # placement of commands/placement.py
+    Scenario(
+        "placement/place_instances-spread",
+        [create_vpc, create_zone_subnets, create_key_pair, exhaust_zone_capacity],
+        lambda c: placement.place_instances(
+            c, "ami-bench", "t2.micro", "bench", VPC_NAME, ["pub-*"], [f"ws-{i}" for i in range(30)], "spread"
+        ),
+    ),
+    Scenario(
+        "placement/place_instances-pack",
+        [create_vpc, create_zone_subnets, create_key_pair],
+        lambda c: placement.place_instances(
+            c, "ami-bench", "t2.micro", "bench", VPC_NAME, None, [f"ws-{i}" for i in range(300)], "pack"
+        ),
+    ),
+    # rate limiter of commands/ratelimit.py
+    Scenario("ratelimit/describe-burst", [create_vpc], describe_under_rate_limit),
+]
@@ -1,2 +0,0 @@
-import commands.vpc as vpc
-import commands.ec2 as ec2
@@ -0,0 +1,346 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from commands import ec2, vpc
+from commands.waiter import Schedule, WaitProgress, fetch_states, validate_wait, wait_by_botocore
+
+# Asynchronous variants of functions in commands/vpc.py and commands/ec2.py that make API calls, with the same arguments
+# and return values, to embed commands in services running on asyncio. Functions without API call(ex.
+# `vpc.merge_port_ranges`) and `describe_*` functions that print reports of CLI have no variant. Each API call runs on
+# dedicated executor, so calls neither block event loop nor exhaust its default executor, while waiting for state
+# changes sleeps on event loop without holding any thread. Therefore, hundreds of workspace operations can share one
+# event loop, and each of them can be cancelled or bounded by `asyncio.wait_for`. Cancellation takes effect at the next
+# await: an API call already submitted to executor runs to completion, but its result is discarded.
+
+DEFAULT_MAX_WORKERS = 32
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def configure(max_workers: int = DEFAULT_MAX_WORKERS):
+    """
+    Resize executor that runs API calls. Calls already submitted keep running on previous executor.
+    :param max_workers: maximum number of API calls running at the same time
+    :return: None
+    """
+    global _executor
+    with _lock:
+        previous, _executor = _executor, concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="aio")
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+async def call(function: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run blocking function on dedicated executor and await its result
+    :param function: function that makes API calls(ex. `vpc.create_vpc`)
+    :param args: positional arguments of function
+    :param kwargs: keyword arguments of function
+    :return: value returned by function
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(function, *args, **kwargs))
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(DEFAULT_MAX_WORKERS, thread_name_prefix="aio")
+        return _executor
+
+
+def _wrap(function: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await call(function, *args, **kwargs)
+
+    return wrapper
+
+
+# functions that finish within their API calls are awaited on executor as they are
+create_vpc = _wrap(vpc.create_vpc)
+create_vpc_security_group = _wrap(vpc.create_vpc_security_group)
+sync_vpc_security_group_ports = _wrap(vpc.sync_vpc_security_group_ports)
+create_vpc_internet_gateway = _wrap(vpc.create_vpc_internet_gateway)
+create_subnet = _wrap(vpc.create_subnet)
+create_route_table = _wrap(vpc.create_route_table)
+create_route_table_subnet_association = _wrap(vpc.create_route_table_subnet_association)
+associate_route_table = _wrap(vpc.associate_route_table)
+create_internet_route = _wrap(vpc.create_internet_route)
+recover_vpc_security_group = _wrap(vpc.recover_vpc_security_group)
+recover_vpc_internet_gateway = _wrap(vpc.recover_vpc_internet_gateway)
+recover_subnet = _wrap(vpc.recover_subnet)
+recover_route_table = _wrap(vpc.recover_route_table)
+recover_route_table_subnet_association = _wrap(vpc.recover_route_table_subnet_association)
+fetch_availability_zone_postfixes = _wrap(vpc.fetch_availability_zone_postfixes)
+fetch_vpc = _wrap(vpc.fetch_vpc)
+fetch_vpc_id = _wrap(vpc.fetch_vpc_id)
+fetch_vpc_cidr = _wrap(vpc.fetch_vpc_cidr)
+fetch_vpc_ingress_ports = _wrap(vpc.fetch_vpc_ingress_ports)
+fetch_vpc_security_group = _wrap(vpc.fetch_vpc_security_group)
+fetch_vpc_security_group_id = _wrap(vpc.fetch_vpc_security_group_id)
+fetch_subnet = _wrap(vpc.fetch_subnet)
+fetch_subnet_id = _wrap(vpc.fetch_subnet_id)
+fetch_route_table = _wrap(vpc.fetch_route_table)
+fetch_route_table_id = _wrap(vpc.fetch_route_table_id)
+delete_route_table_subnet_association = _wrap(vpc.delete_route_table_subnet_association)
+delete_route_table = _wrap(vpc.delete_route_table)
+delete_subnet = _wrap(vpc.delete_subnet)
+delete_vpc_security_group = _wrap(vpc.delete_vpc_security_group)
+delete_vpc_internet_gateway = _wrap(vpc.delete_vpc_internet_gateway)
+delete_vpc = _wrap(vpc.delete_vpc)
+create_key_pair = _wrap(ec2.create_key_pair)
+delete_key_pair = _wrap(ec2.delete_key_pair)
+launch_instances = _wrap(ec2.launch_instances)
+change_instance_state = _wrap(ec2.change_instance_state)
+fetch_instance = _wrap(ec2.fetch_instance)
+fetch_instance_id = _wrap(ec2.fetch_instance_id)
+fetch_instance_ids = _wrap(ec2.fetch_instance_ids)
+fetch_instances = _wrap(ec2.fetch_instances)
+build_instance_filters = _wrap(ec2.build_instance_filters)
+allocate_elastic_ip = _wrap(ec2.allocate_elastic_ip)
+fetch_elastic_ip = _wrap(ec2.fetch_elastic_ip)
+fetch_elastic_ip_info = _wrap(ec2.fetch_elastic_ip_info)
+associate_elastic_ip = _wrap(ec2.associate_elastic_ip)
+associate_instance_to_elastic_ip = _wrap(ec2.associate_instance_to_elastic_ip)
+disassociate_instance_from_elastic_ip = _wrap(ec2.disassociate_instance_from_elastic_ip)
+release_elastic_ip = _wrap(ec2.release_elastic_ip)
+
+
+async def wait_for_instance_state(
+        ec2_client,
+        instance_ids: List[str],
+        target_state: str,
+        schedule: Schedule = Schedule(),
+        mode: str = "describe",
+) -> List[dict]:
+    """
+    Wait until every instance reaches target state as explained in `waiter.wait_for_instance_state` method, while
+    sleeping between polls on event loop. Built-in waiter of botocore sleeps by itself, so 'botocore' mode holds a
+    thread of executor during the whole wait.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs to wait for
+    :param target_state: one of ('running', 'stopped', 'terminated')
+    :param schedule: polling schedule
+    :param mode: one of ('describe', 'status', 'botocore')
+    :return: list of state transitions observed, each as dictionary of InstanceId, From, To and Elapsed seconds
+    """
+    validate_wait(target_state, mode)
+    if mode == "botocore":
+        return await call(wait_by_botocore, ec2_client, instance_ids, target_state, schedule)
+    progress = WaitProgress(instance_ids, target_state, schedule.timeout)
+    for delay in schedule.delays():
+        await asyncio.sleep(progress.clip(delay))
+        if progress.observe(await call(fetch_states, ec2_client, instance_ids, target_state, mode)):
+            return progress.transitions
+
+
+async def run_instances(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_names: List[str],
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Launch instances as explained in `ec2.run_instances` method and wait until every instance gets ready
+    :param ec2_client: EC2 client created by boto3 session
+    :param image_id: AMI ID which can be found in AMI catalog menu in EC2 console
+    :param instance_type: identifier of instance type listed in Instance Types menu in EC2 console
+    :param key_name: name of key pair
+    :param vpc_name: name of VPC where the subnet belongs to
+    :param subnet_name: name of subnet where instances will be created
+    :param instance_names: names of instances to be created
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instances = await launch_instances(
+        ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, instance_names
+    )
+    instance_ids = [instance.instance_id for instance in instances]
+    return await wait_for_instance_state(ec2_client, instance_ids, "running", schedule, wait_mode)
+
+
+async def run_instance(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Launch instance and wait until it gets ready, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await run_instances(
+        ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, [instance_name], schedule, wait_mode
+    )
+
+
+async def stop_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Stop instances as explained in `ec2.stop_instances` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await _change_and_wait(ec2_client, "stop", vpc_name, subnet_name, instance_names, tags, schedule, wait_mode)
+
+
+async def start_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Start instances as explained in `ec2.start_instances` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await _change_and_wait(ec2_client, "start", vpc_name, subnet_name, instance_names, tags, schedule, wait_mode)
+
+
+async def reboot_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Reboot instances as explained in `ec2.reboot_instances` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await _change_and_wait(
+        ec2_client, "reboot", vpc_name, subnet_name, instance_names, tags, schedule, wait_mode
+    )
+
+
+async def terminate_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Terminate instances as explained in `ec2.terminate_instances` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await _change_and_wait(
+        ec2_client, "terminate", vpc_name, subnet_name, instance_names, tags, schedule, wait_mode
+    )
+
+
+async def stop_instance(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Stop instance as explained in `ec2.stop_instance` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await stop_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
+
+
+async def start_instance(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Start instance as explained in `ec2.start_instance` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await start_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
+
+
+async def reboot_instance(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Reboot instance as explained in `ec2.reboot_instance` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await reboot_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
+
+
+async def terminate_instance(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[dict]:
+    """
+    Terminate instance as explained in `ec2.terminate_instance` method, while waiting on event loop
+    :return: list of state transitions observed while waiting
+    """
+    return await terminate_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
+
+
+async def _change_and_wait(
+        ec2_client,
+        action: str,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]],
+        schedule: Schedule,
+        wait_mode: str,
+) -> List[dict]:
+    """
+    Request state change of instances and wait until they reach the state
+    :param ec2_client: EC2 client created by boto3 session
+    :param action: one of ('stop', 'start', 'reboot', 'terminate')
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    validate_wait(ec2.TARGET_STATES.get(action, "running"), wait_mode)  # fail before state is changed
+    instance_ids = await change_instance_state(ec2_client, action, vpc_name, subnet_name, instance_names, tags)
+    return await wait_for_instance_state(ec2_client, instance_ids, ec2.TARGET_STATES[action], schedule, wait_mode)
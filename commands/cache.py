@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from commands import clients, state
+
+DEFAULT_TTL = 300.0  # seconds until resolved ID is looked up again
+
+_entries: Dict[Tuple[Optional[str], str, str, str], Tuple[str, float]] = {}
+# lock of each key being looked up, with number of resolutions waiting for it; entry is dropped when none is left
+_lookup_locks: Dict[Tuple[Optional[str], str, str, str], List] = {}
+_lock = threading.Lock()
+
+
+def resolve(
+        ec2_client,
+        resource_type: str,
+        name: str,
+        lookup: Callable[[], str],
+        ttl: float = DEFAULT_TTL,
+) -> str:
+    """
+    Return ID of resource resolved by its name. Resolutions are shared by every command within the process and keyed on
+    (profile, region, resource type, name), so lookup function is called only when the entry is missing or expired.
+    Concurrent resolutions of the same resource wait for single lookup instead of calling it on their own. If local
+    state store is enabled, IDs recorded by previous runs are used before calling lookup function.
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, prefixed with name of its VPC if the name is only unique within VPC
+    :param lookup: function that fetches ID of the resource through describe call
+    :param ttl: number of seconds the resolved ID stays valid
+    :return: ID of resource
+    """
+    key = _key(ec2_client, resource_type, name)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        lookup_lock = _lookup_locks.setdefault(key, [threading.Lock(), 0])
+        lookup_lock[1] += 1
+    try:
+        with lookup_lock[0]:
+            with _lock:
+                entry = _entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            resource_id = state.lookup(ec2_client, resource_type, name) or lookup()
+            store(ec2_client, resource_type, name, resource_id, ttl)
+            return resource_id
+    finally:
+        with _lock:
+            lookup_lock[1] -= 1
+            if lookup_lock[1] == 0 and _lookup_locks.get(key) is lookup_lock:
+                del _lookup_locks[key]
+
+
+def store(
+        ec2_client,
+        resource_type: str,
+        name: str,
+        resource_id: str,
+        ttl: float = DEFAULT_TTL,
+        arn: Optional[str] = None,
+):
+    """
+    Save ID of resource that is already known(ex. ID from response of create call) to skip its next lookup. The ID is
+    recorded in local state store as well if it is enabled.
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, prefixed with name of its VPC if the name is only unique within VPC
+    :param resource_id: ID of resource
+    :param ttl: number of seconds the ID stays valid
+    :param arn: ARN of resource to be recorded in local state store
+    :return: None
+    """
+    with _lock:
+        _entries[_key(ec2_client, resource_type, name)] = (resource_id, time.monotonic() + ttl)
+    state.record(ec2_client, resource_type, name, resource_id, arn)
+
+
+def invalidate(ec2_client, resource_type: str, name: str):
+    """
+    Drop resolved ID of resource that is deleted or replaced, from local state store as well
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, prefixed with name of its VPC if the name is only unique within VPC
+    :return: None
+    """
+    with _lock:
+        _entries.pop(_key(ec2_client, resource_type, name), None)
+    state.forget(ec2_client, resource_type, name)
+
+
+def invalidate_ids(ec2_client, resource_type: str, resource_ids: Iterable[str]):
+    """
+    Drop resolved IDs of resources that are deleted, whatever names they were resolved by(ex. terminated instances
+    selected by tags without knowing their subnets), from local state store as well
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param resource_ids: IDs of resources
+    :return: None
+    """
+    resource_ids = set(resource_ids)
+    prefix = _key(ec2_client, resource_type, "")[:-1]
+    with _lock:
+        for key, (resource_id, _) in list(_entries.items()):
+            if key[:-1] == prefix and resource_id in resource_ids:
+                del _entries[key]
+    state.forget_ids(ec2_client, resource_type, resource_ids)
+
+
+def clear():
+    """
+    Drop every resolved ID
+    :return: None
+    """
+    with _lock:
+        _entries.clear()
+        _lookup_locks.clear()
+
+
+def _key(ec2_client, resource_type: str, name: str) -> Tuple[Optional[str], str, str, str]:
+    """
+    Build key of resolved ID. Profile is part of the key since the same name may refer to resources of different
+    accounts when commands of several profiles share the process(ex. in shell).
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, prefixed with name of its VPC if the name is only unique within VPC
+    :return: key of cache entry
+    """
+    return clients.profile_of(ec2_client), ec2_client.meta.region_name, resource_type, name
@@ -0,0 +1,78 @@
+import ipaddress
+import threading
+from typing import Iterable, List, Tuple
+
+from commands.listing import iter_resources
+from commands.vpc import fetch_vpc_cidr, fetch_vpc_id
+
+MAX_PREFIX_LENGTH = 28  # smallest subnet allowed by EC2 has 16 addresses
+
+
+class CidrAllocator:
+    """
+    Index of free address ranges within VPC CIDR block. Free ranges are kept as sorted list of disjoint
+    [start, end) intervals of integer addresses, so blocks of any prefix length are assigned without overlapping
+    existing subnets or each other.
+    """
+
+    def __init__(self, vpc_cidr: str, used_cidrs: Iterable[str] = ()):
+        self.network = ipaddress.ip_network(vpc_cidr)
+        self._free: List[Tuple[int, int]] = [
+            (int(self.network.network_address), int(self.network.broadcast_address) + 1)
+        ]
+        self._lock = threading.Lock()
+        for used_cidr in used_cidrs:
+            self._take(ipaddress.ip_network(used_cidr))
+
+    def allocate(self, prefix_length: int) -> str:
+        """
+        Assign first free block of given prefix length, aligned to its size
+        :param prefix_length: prefix length of block(ex. 24 for 256 addresses)
+        :return: CIDR notation of assigned block
+        """
+        if not self.network.prefixlen <= prefix_length <= MAX_PREFIX_LENGTH:
+            raise ValueError(
+                f"prefix_length must be between {self.network.prefixlen} and {MAX_PREFIX_LENGTH}; got: {prefix_length}"
+            )
+        size = 2 ** (self.network.max_prefixlen - prefix_length)
+        with self._lock:
+            for start, end in self._free:
+                aligned_start = -(-start // size) * size
+                if aligned_start + size <= end:
+                    block = ipaddress.ip_network((aligned_start, prefix_length))
+                    self._take(block)
+                    return str(block)
+        raise ValueError(f"No free /{prefix_length} block is left in VPC CIDR {self.network}")
+
+    def _take(self, block):
+        """
+        Remove addresses of block from free ranges
+        :param block: ipaddress network object
+        :return: None
+        """
+        start, end = int(block.network_address), int(block.broadcast_address) + 1
+        remaining = []
+        for free_start, free_end in self._free:
+            if free_end <= start or end <= free_start:
+                remaining.append((free_start, free_end))
+                continue
+            if free_start < start:
+                remaining.append((free_start, start))
+            if end < free_end:
+                remaining.append((end, free_end))
+        self._free = remaining
+
+
+def load_allocator(ec2_client, vpc_name: str) -> CidrAllocator:
+    """
+    Build allocator of VPC from CIDR blocks of its existing subnets, which are read by single paginated describe call
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC
+    :return: CIDR allocator of VPC
+    """
+    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
+    used_cidrs = (
+        subnet["CidrBlock"]
+        for subnet in iter_resources(ec2_client, "describe_subnets", Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])
+    )
+    return CidrAllocator(fetch_vpc_cidr(ec2_client, vpc_name), used_cidrs)
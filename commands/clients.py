@@ -0,0 +1,121 @@
+import dataclasses
+import functools
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+from commands import ratelimit
+
+timings: Dict[str, float] = {}
+
+
+@dataclasses.dataclass(frozen=True)
+class ClientOptions:
+    """
+    Configuration shared by every EC2 client. Connection pool is sized for concurrent steps of commands, and `adaptive`
+    retry mode rate-limits calls on client side once throttling errors(ex. RequestLimitExceeded) are returned.
+    """
+    max_pool_connections: int = 50
+    retry_mode: str = "adaptive"
+    max_attempts: int = 10
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    tcp_keepalive: bool = True
+    collect_metrics: bool = False
+
+
+_options = ClientOptions()
+_clients: Dict[Tuple[str, str], object] = {}
+_profiles = weakref.WeakKeyDictionary()  # name of profile of each client created by `get_ec2_client`
+_lock = threading.Lock()
+
+
+def configure(options: ClientOptions):
+    """
+    Set configuration of EC2 clients created afterward. Clients created with previous configuration are discarded, while
+    they are kept if configuration is not changed.
+    :param options: configuration of EC2 clients
+    :return: None
+    """
+    global _options
+    with _lock:
+        if options != _options:
+            _options = options
+            _clients.clear()
+
+
+def get_ec2_client(profile_name: str, region_name: str):
+    """
+    Get EC2 client of profile and region. Client is created once per process for each pair of profile and region, so
+    its connection pool and state of adaptive retry are shared by every call made to the region. Every call of the
+    client is rate-limited by budgets shared across the process.
+    :param profile_name: name of AWS profile
+    :param region_name: name of region
+    :return: EC2 client
+    """
+    with _lock:  # creating clients from the same session is not thread-safe
+        ec2_client = _clients.get((profile_name, region_name))
+        if ec2_client is None:
+            started_at = time.perf_counter()
+            ec2_client = get_session(profile_name).client("ec2", region_name=region_name, config=_build_config())
+            ratelimit.install(ec2_client)
+            if _options.collect_metrics:
+                from commands import metrics
+                metrics.instrument(ec2_client)
+            _clients[(profile_name, region_name)] = ec2_client
+            _profiles[ec2_client] = profile_name
+            timings["client setup"] = timings.get("client setup", 0.0) + time.perf_counter() - started_at
+        return ec2_client
+
+
+def profile_of(ec2_client) -> Optional[str]:
+    """
+    Get name of profile whose credentials the client signs calls with
+    :param ec2_client: EC2 client
+    :return: name of profile, or None if client was not created by `get_ec2_client`
+    """
+    return _profiles.get(ec2_client)
+
+
+@functools.lru_cache(maxsize=None)
+def get_session(profile_name: str):
+    """
+    Create boto3 session of profile that shares data loader with other sessions
+    :param profile_name: name of AWS profile
+    :return: boto3 session
+    """
+    loader = _service_loader()
+    import boto3
+    import botocore.session
+    botocore_session = botocore.session.Session(profile=profile_name)
+    botocore_session.register_component("data_loader", loader)
+    return boto3.Session(botocore_session=botocore_session)
+
+
+@functools.lru_cache(maxsize=None)
+def _service_loader():
+    """
+    Create data loader shared by every session, so EC2 service model is loaded at most once per process
+    :return: botocore data loader
+    """
+    started_at = time.perf_counter()
+    import boto3  # noqa: F401  imported here only to time it as "boto3 import"; sessions import it on their own
+    import botocore.loaders
+    timings["boto3 import"] = time.perf_counter() - started_at
+    return botocore.loaders.create_loader()
+
+
+def _build_config():
+    """
+    Build botocore configuration from current client options
+    :return: botocore configuration
+    """
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=_options.max_pool_connections,
+        retries={"mode": _options.retry_mode, "total_max_attempts": _options.max_attempts},
+        connect_timeout=_options.connect_timeout,
+        read_timeout=_options.read_timeout,
+        tcp_keepalive=_options.tcp_keepalive,
+    )
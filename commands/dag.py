@@ -0,0 +1,46 @@
+import concurrent.futures
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def run_steps(
+        steps: Dict[str, Tuple[Callable[[], Any], Sequence[str]]],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Dict[str, Any]:
+    """
+    Run steps of a command as directed acyclic graph on thread pool. Each step is submitted as soon as every step it
+    depends on is finished, so independent steps run concurrently and total time is bounded by the longest chain of
+    dependencies. If any step fails, no more step is submitted and the first error is raised after running steps end.
+    :param steps: dictionary of step name to tuple of function without argument and names of steps it depends on
+    :param max_workers: maximum number of steps running at the same time
+    :return: dictionary of step name to value returned by its function
+    """
+    for name, (_, dependencies) in steps.items():
+        unknown = set(dependencies) - set(steps)
+        if unknown:
+            raise ValueError(f"Step '{name}' depends on unknown steps {sorted(unknown)}")
+    results = {}
+    pending = dict(steps)
+    running = {}
+    error = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if error is None:
+                for name in [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]:
+                    function, _ = pending.pop(name)
+                    running[executor.submit(function)] = name
+            if not running:
+                if error is None:
+                    raise ValueError(f"Steps {sorted(pending)} have cyclic dependencies")
+                break
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as exception:
+                    error = error or exception
+    if error is not None:
+        raise error
+    return results
@@ -1,7 +1,17 @@
+import functools
 import pathlib
-import time
+from typing import Dict, List, Optional
 
-from commands.vpc import fetch_vpc_security_group_id, fetch_subnet_id
+from commands import cache, state
+from commands.dag import run_steps
+from commands.handles import Eip, Instance
+from commands.listing import list_resources
+from commands.topology import name_of
+from commands.vpc import fetch_vpc_id, fetch_vpc_security_group_id, fetch_subnet_id
+from commands.waiter import Schedule, wait_for_instance_state
+
+# state that instances reach after each state change action
+TARGET_STATES = {"stop": "stopped", "start": "running", "reboot": "running", "terminate": "terminated"}
 
 
 def create_key_pair(
@@ -36,6 +46,8 @@ def run_instance(
         vpc_name: str,
         subnet_name: str,
         instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
 ):
     """
     Launch instance and wait until it gets ready
@@ -46,8 +58,74 @@ def run_instance(
     :param subnet_name: name of subnet where instance will be created
     :param vpc_name: name of VPC where the subnet belongs to
     :param instance_name: name of instance to be created
-    :return: None
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    return run_instances(
+        ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, [instance_name], schedule, wait_mode
+    )
+
+
+def run_instances(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_names: List[str],
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+):
     """
+    Launch instances by single RunInstances call and wait until every instance gets ready. Either every instance is
+    launched or none is, and each instance is named in the order of its launch index. Tags on launch are shared by all
+    instances, so many instances are tagged with name of the batch(ex. 'ws-0..ws-7') on launch and renamed concurrently
+    afterward.
+    :param ec2_client: EC2 client created by boto3 session
+    :param image_id: AMI ID which can be found in AMI catalog menu in EC2 console
+    :param instance_type: identifier of instance type listed in Instance Types menu in EC2 console
+    :param key_name: name of key pair
+    :param subnet_name: name of subnet where instances will be created
+    :param vpc_name: name of VPC where the subnet belongs to
+    :param instance_names: names of instances to be created
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instances = launch_instances(
+        ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, instance_names
+    )
+    instance_ids = [instance.instance_id for instance in instances]
+    return wait_for_instance_state(ec2_client, instance_ids, "running", schedule, wait_mode)
+
+
+def launch_instances(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_names: List[str],
+        client_token: Optional[str] = None,
+) -> List[Instance]:
+    """
+    Launch instances by single RunInstances call without waiting for them to get ready. Repeated call with the same
+    client token returns instances launched by the first call, instead of launching them again.
+    :param ec2_client: EC2 client created by boto3 session
+    :param image_id: AMI ID which can be found in AMI catalog menu in EC2 console
+    :param instance_type: identifier of instance type listed in Instance Types menu in EC2 console
+    :param key_name: name of key pair
+    :param subnet_name: name of subnet where instances will be created
+    :param vpc_name: name of VPC where the subnet belongs to
+    :param instance_names: names of instances to be created
+    :param client_token: idempotency token of RunInstances call
+    :return: handles of launched instances in the order of their names
+    """
+    if not instance_names or len(set(instance_names)) < len(instance_names):
+        raise ValueError(f"Names of instances must be given without duplicates; got: {instance_names}")
     response = ec2_client.run_instances(
         ImageId=image_id,
         InstanceType=instance_type,
@@ -56,37 +134,60 @@ def run_instance(
             fetch_vpc_security_group_id(ec2_client, vpc_name),
         ],
         SubnetId=fetch_subnet_id(ec2_client, vpc_name, subnet_name),
-        MaxCount=1,
-        MinCount=1,
+        MaxCount=len(instance_names),
+        MinCount=len(instance_names),
         TagSpecifications=[
             {
                 "ResourceType": "instance",
-                "Tags": [{"Key": "Name", "Value": instance_name}]
+                # many instances share name of the batch(ex. 'ws-0..ws-7') until each is renamed, so they stay
+                # visible to lookups by name or glob pattern even if renaming is interrupted
+                "Tags": [{"Key": "Name", "Value": _batch_name(instance_names)}]
             }
-        ]
+        ],
+        **({} if client_token is None else {"ClientToken": client_token}),
     )
-    instance_id = response["Instances"][0]["InstanceId"]
-    is_running = False
-    while not is_running:
-        time.sleep(3)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_info = response["Reservations"][0]["Instances"][0]
-        is_running = instance_info["State"]["Name"] == "running"
+    instance_ids = [
+        instance["InstanceId"] for instance in sorted(response["Instances"], key=lambda info: info["AmiLaunchIndex"])
+    ]
+    if len(instance_names) > 1:
+        run_steps({
+            f"tag:{instance_name}": (
+                functools.partial(
+                    ec2_client.create_tags,
+                    Resources=[instance_id],
+                    Tags=[{"Key": "Name", "Value": instance_name}],
+                ),
+                [],
+            )
+            for instance_name, instance_id in zip(instance_names, instance_ids)
+        })
+    for instance_name, instance_id in zip(instance_names, instance_ids):
+        cache.store(
+            ec2_client,
+            "instance",
+            f"{vpc_name}/{subnet_name}/{instance_name}",
+            instance_id,
+            arn=state.build_arn(ec2_client, response["OwnerId"], "instance", instance_id),
+        )
+    return [
+        Instance(vpc_name, subnet_name, instance_name, instance_id)
+        for instance_name, instance_id in zip(instance_names, instance_ids)
+    ]
 
 
 def allocate_elastic_ip(
         ec2_client,
         region_name: str,
         eip_name: str
-):
+) -> Eip:
     """
     Allocate elastic IP within current subnet region
     :param ec2_client: EC2 client created by boto3 session
     :param region_name: name of region where elastic IP will be defined
     :param eip_name: name of elastic IP
-    :return: None
+    :return: handle of allocated elastic IP
     """
-    ec2_client.allocate_address(
+    response = ec2_client.allocate_address(
         Domain="vpc",
         NetworkBorderGroup=region_name,
         TagSpecifications=[
@@ -96,6 +197,8 @@ def allocate_elastic_ip(
             }
         ]
     )
+    cache.store(ec2_client, "elastic-ip", eip_name, response["AllocationId"])
+    return Eip(eip_name, response["AllocationId"])
 
 
 def associate_instance_to_elastic_ip(
@@ -112,18 +215,54 @@ def associate_instance_to_elastic_ip(
     :param eip_name: name of elastic IP
     :return: None
     """
-    address_info = fetch_elastic_ip_info(ec2_client, region_name, eip_name)
-    allocation_id = address_info["AllocationId"]
-    instance_info = ec2_client.describe_instances(
+    eip = fetch_elastic_ip(ec2_client, region_name, eip_name)
+    instance_info = list_resources(
+        ec2_client,
+        "describe_instances",
+        limit=1,
         Filters=[
             {"Name": "tag:Name", "Values": [instance_name]},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
         ]
-    )["Reservations"][0]["Instances"][0]
+    )
+    assert len(instance_info) > 0, f"Instance with name {instance_name} does not exists"
     ec2_client.associate_address(
-        AllocationId=allocation_id, InstanceId=instance_info["InstanceId"]
+        AllocationId=eip.allocation_id, InstanceId=instance_info[0]["InstanceId"]
     )
 
 
+def associate_elastic_ip(ec2_client, eip: Eip, instance: Instance):
+    """
+    Associate elastic IP with EC2 instance given as handles(ex. returned by create functions), without any lookup
+    :param ec2_client: EC2 client created by boto3 session
+    :param eip: handle of elastic IP
+    :param instance: handle of instance
+    :return: None
+    """
+    ec2_client.associate_address(AllocationId=eip.allocation_id, InstanceId=instance.instance_id)
+
+
+def fetch_elastic_ip(
+        ec2_client,
+        region_name: str,
+        eip_name: str,
+) -> Eip:
+    """
+    Fetch handle of elastic IP. Its allocation ID is resolved through cache, unlike `fetch_elastic_ip_info` method
+    which always describes current association of the address.
+    :param ec2_client: EC2 client created by boto3 session
+    :param region_name: name of region where elastic IP is defined
+    :param eip_name: name of elastic IP
+    :return: handle of elastic IP
+    """
+    return Eip(eip_name, cache.resolve(
+        ec2_client,
+        "elastic-ip",
+        eip_name,
+        lambda: fetch_elastic_ip_info(ec2_client, region_name, eip_name)["AllocationId"],
+    ))
+
+
 def fetch_elastic_ip_info(
         ec2_client,
         region_name: str,
@@ -136,11 +275,12 @@ def fetch_elastic_ip_info(
     :param eip_name: name of elastic IP
     :return: dictionary of elastic IP information
     """
-    address_info = ec2_client.describe_addresses(Filters=[
+    address_info = list_resources(ec2_client, "describe_addresses", limit=1, Filters=[
         {"Name": "tag:Name", "Values": [eip_name]},
         {"Name": "network-border-group", "Values": [region_name]},
-    ])["Addresses"]
-    assert len(address_info) > 0, f"Elastic IP of name {eip_name} for region {region_name} does not exists"
+    ])
+    if len(address_info) == 0:
+        raise ValueError(f"Elastic IP of name {eip_name} for region {region_name} does not exists")
     return address_info[0]
 
 
@@ -173,8 +313,9 @@ def release_elastic_ip(
     :param eip_name: name of elastic IP to release
     :return: None
     """
-    address_info = fetch_elastic_ip_info(ec2_client, region_name, eip_name)
-    ec2_client.release_address(AllocationId=address_info["AllocationId"])
+    eip = fetch_elastic_ip(ec2_client, region_name, eip_name)
+    ec2_client.release_address(AllocationId=eip.allocation_id)
+    cache.invalidate(ec2_client, "elastic-ip", eip_name)
 
 
 def stop_instance(
@@ -182,6 +323,8 @@ def stop_instance(
         vpc_name: str,
         subnet_name: str,
         instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
 ):
     """
     Stop EC2 instance
@@ -189,22 +332,11 @@ def stop_instance(
     :param subnet_name: name of subnet where instance is created
     :param vpc_name: name of VPC where the subnet belongs to
     :param instance_name: name of instance to stop
-    :return: None
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
     """
-    instance_info = ec2_client.describe_instances(
-        Filters=[
-            {"Name": "tag:Name", "Values": [instance_name]},
-            {"Name": "subnet-id", "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]}
-        ]
-    )["Reservations"][0]["Instances"][0]
-    instance_id = instance_info["InstanceId"]
-    ec2_client.stop_instances(InstanceIds=[instance_id])
-    is_stopped = False
-    while not is_stopped:
-        time.sleep(3)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_info = response["Reservations"][0]["Instances"][0]
-        is_stopped = instance_info["State"]["Name"] == "stopped"
+    return stop_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
 
 
 def start_instance(
@@ -212,6 +344,8 @@ def start_instance(
         vpc_name: str,
         subnet_name: str,
         instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
 ):
     """
     Start stopped EC2 instance
@@ -219,22 +353,11 @@ def start_instance(
     :param subnet_name: name of subnet where instance is created
     :param vpc_name: name of VPC where the subnet belongs to
     :param instance_name: name of instance to stop
-    :return: None
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
     """
-    instance_info = ec2_client.describe_instances(
-        Filters=[
-            {"Name": "tag:Name", "Values": [instance_name]},
-            {"Name": "subnet-id", "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]}
-        ]
-    )["Reservations"][0]["Instances"][0]
-    instance_id = instance_info["InstanceId"]
-    ec2_client.start_instances(InstanceIds=[instance_id])
-    is_running = False
-    while not is_running:
-        time.sleep(3)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_info = response["Reservations"][0]["Instances"][0]
-        is_running = instance_info["State"]["Name"] == "running"
+    return start_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
 
 
 def reboot_instance(
@@ -242,6 +365,8 @@ def reboot_instance(
         vpc_name: str,
         subnet_name: str,
         instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
 ):
     """
     Reboot EC2 instance
@@ -249,22 +374,11 @@ def reboot_instance(
     :param subnet_name: name of subnet where instance is created
     :param vpc_name: name of VPC where the subnet belongs to
     :param instance_name: name of instance to stop
-    :return: None
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
     """
-    instance_info = ec2_client.describe_instances(
-        Filters=[
-            {"Name": "tag:Name", "Values": [instance_name]},
-            {"Name": "subnet-id", "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]}
-        ]
-    )["Reservations"][0]["Instances"][0]
-    instance_id = instance_info["InstanceId"]
-    ec2_client.reboot_instances(InstanceIds=[instance_info["InstanceId"]])
-    is_running = False
-    while not is_running:
-        time.sleep(3)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_info = response["Reservations"][0]["Instances"][0]
-        is_running = instance_info["State"]["Name"] == "running"
+    return reboot_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
 
 
 def terminate_instance(
@@ -272,29 +386,335 @@ def terminate_instance(
         vpc_name: str,
         subnet_name: str,
         instance_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
 ):
     """
-    Associate elastic IP with EC2 instance
+    Terminate EC2 instance
     :param ec2_client: EC2 client created by boto3 session
     :param subnet_name: name of subnet where instance is created
     :param vpc_name: name of VPC where the subnet belongs to
     :param instance_name: name of instance to terminate
-    :return: None
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
     """
-    instance_info = ec2_client.describe_instances(
-        Filters=[
-            {"Name": "tag:Name", "Values": [instance_name]},
-            {"Name": "subnet-id", "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]}
+    return terminate_instances(ec2_client, vpc_name, subnet_name, [instance_name], None, schedule, wait_mode)
+
+
+def stop_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+):
+    """
+    Stop every EC2 instance selected by names or tags with single StopInstances call and wait for them together
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances to stop
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instance_ids = change_instance_state(ec2_client, "stop", vpc_name, subnet_name, instance_names, tags)
+    return wait_for_instance_state(ec2_client, instance_ids, TARGET_STATES["stop"], schedule, wait_mode)
+
+
+def start_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+):
+    """
+    Start every EC2 instance selected by names or tags with single StartInstances call and wait for them together
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances to start
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instance_ids = change_instance_state(ec2_client, "start", vpc_name, subnet_name, instance_names, tags)
+    return wait_for_instance_state(ec2_client, instance_ids, TARGET_STATES["start"], schedule, wait_mode)
+
+
+def reboot_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+):
+    """
+    Reboot every EC2 instance selected by names or tags with single RebootInstances call and wait for them together
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances to reboot
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instance_ids = change_instance_state(ec2_client, "reboot", vpc_name, subnet_name, instance_names, tags)
+    return wait_for_instance_state(ec2_client, instance_ids, TARGET_STATES["reboot"], schedule, wait_mode)
+
+
+def terminate_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+):
+    """
+    Terminate every EC2 instance selected by names or tags with single TerminateInstances call and wait for them
+    together
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances to terminate
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    instance_ids = change_instance_state(ec2_client, "terminate", vpc_name, subnet_name, instance_names, tags)
+    return wait_for_instance_state(ec2_client, instance_ids, TARGET_STATES["terminate"], schedule, wait_mode)
+
+
+def change_instance_state(
+        ec2_client,
+        action: str,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """
+    Request state change of every EC2 instance selected by names or tags with single API call, without waiting for
+    instances to reach the state
+    :param ec2_client: EC2 client created by boto3 session
+    :param action: one of ('stop', 'start', 'reboot', 'terminate')
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: IDs of instances whose state is changed
+    """
+    if action not in TARGET_STATES:
+        raise ValueError(f"action must be one of {tuple(TARGET_STATES)}; got: '{action}'")
+    instance_ids = fetch_instance_ids(ec2_client, vpc_name, subnet_name, instance_names, tags)
+    getattr(ec2_client, f"{action}_instances")(InstanceIds=instance_ids)
+    if action == "terminate":  # names of terminated instances may be reused
+        cache.invalidate_ids(ec2_client, "instance", instance_ids)
+    return instance_ids
+
+
+def fetch_instance(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+) -> Instance:
+    """
+    Fetch handle of instance, whose ID is resolved as explained in `fetch_instance_id` method
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where the subnet belongs to
+    :param subnet_name: name of subnet where instance is created
+    :param instance_name: name of instance
+    :return: handle of instance
+    """
+    instance_id = fetch_instance_id(ec2_client, vpc_name, subnet_name, instance_name)
+    return Instance(vpc_name, subnet_name, instance_name, instance_id)
+
+
+def fetch_instance_id(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+) -> str:
+    """
+    Fetch ID of instance located in given subnet
+    :param ec2_client: EC2 client created by boto3 session
+    :param subnet_name: name of subnet where instance is created
+    :param vpc_name: name of VPC where the subnet belongs to
+    :param instance_name: name of instance to fetch ID
+    :return: InstanceId
+    """
+    def lookup():
+        instances = fetch_instances(ec2_client, vpc_name, subnet_name, [instance_name])
+        return instances[0]["InstanceId"]
+
+    return cache.resolve(ec2_client, "instance", f"{vpc_name}/{subnet_name}/{instance_name}", lookup)
+
+
+def fetch_instance_ids(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """
+    Fetch IDs of instances selected by names or tags. Single instance selected by its exact name is resolved through
+    cache, and other selections are resolved by `fetch_instances` method.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: list of InstanceId
+    """
+    is_exact_name = instance_names is not None and len(instance_names) == 1 and not _is_pattern(instance_names[0])
+    if subnet_name is not None and is_exact_name and not tags:
+        return [fetch_instance_id(ec2_client, vpc_name, subnet_name, instance_names[0])]
+    instances = fetch_instances(ec2_client, vpc_name, subnet_name, instance_names, tags)
+    return [instance["InstanceId"] for instance in instances]
+
+
+def fetch_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+) -> List[dict]:
+    """
+    Fetch information of instances that are not terminated and selected by names or tags. Every condition is expressed
+    as server-side filter of paginated describe_instances call, so any number of instances are resolved at once(names
+    are split into one call per 200 names, which is the limit of values of a filter).
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: list of dictionary of instance information
+    """
+    check_instance_selection(instance_names, tags)
+    filters = [{"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]}]
+    filters.extend(build_instance_filters(ec2_client, vpc_name, subnet_name, None, tags))
+    if instance_names:
+        name_chunks = [
+            list(instance_names[index:index + state.MAX_FILTER_VALUES])
+            for index in range(0, len(instance_names), state.MAX_FILTER_VALUES)
         ]
-    )["Reservations"][0]["Instances"][0]
-    instance_id = instance_info["InstanceId"]
-    ec2_client.terminate_instances(InstanceIds=[instance_id])
-    is_terminated = False
-    while not is_terminated:
-        time.sleep(3)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        instance_info = response["Reservations"][0]["Instances"][0]
-        is_terminated = instance_info["State"]["Name"] == "terminated"
+    else:
+        name_chunks = [None]
+    instances = {}  # an instance may match patterns of several chunks
+    for name_chunk in name_chunks:
+        name_filter = [] if name_chunk is None else [{"Name": "tag:Name", "Values": name_chunk}]
+        for instance in list_resources(ec2_client, "describe_instances", Filters=filters + name_filter):
+            instances[instance["InstanceId"]] = instance
+    if len(instances) == 0:
+        raise ValueError(f"Instance with name {instance_names} and tags {tags} does not exists")
+    if subnet_name is not None:
+        for instance in instances.values():
+            if name_of(instance) is not None:
+                cache.store(
+                    ec2_client, "instance", f"{vpc_name}/{subnet_name}/{name_of(instance)}", instance["InstanceId"]
+                )
+    return list(instances.values())
+
+
+def check_instance_selection(instance_names: Optional[List[str]], tags: Optional[Dict[str, str]]):
+    """
+    Check that instances are selected by names or tags. Callers that report missing instances as a result(ex. describe
+    command over several regions) check it in advance, so the argument error is not mistaken for missing instances.
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: None
+    """
+    if not instance_names and not tags:
+        raise ValueError("Either instance names or tags must be given to select instances")
+
+
+def build_instance_filters(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+) -> List[dict]:
+    """
+    Build server-side filters of describe_instances that select instances by location, names and tags
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances, or None to select every instance
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: list of filters
+    """
+    if subnet_name is None:
+        filters = [{"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]}]
+    else:
+        filters = [{"Name": "subnet-id", "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]}]
+    if instance_names:
+        filters.append({"Name": "tag:Name", "Values": list(instance_names)})
+    for key, value in (tags or {}).items():
+        filters.append({"Name": f"tag:{key}", "Values": [value]})
+    return filters
+
+
+def describe_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]],
+        tags: Optional[Dict[str, str]] = None,
+):
+    """
+    Print current status of every instance selected by names or tags
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to select from whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :return: None
+    """
+    check_instance_selection(instance_names, tags)
+    try:
+        instances = fetch_instances(ec2_client, vpc_name, subnet_name, instance_names, tags)
+    except ValueError:
+        print("Instance has not been created yet")
+        return
+    for line in format_instances(instances):
+        print(line)
+
+
+def format_instances(instances: List[dict]) -> List[str]:
+    """
+    Format current status of instances as lines of report
+    :param instances: list of dictionary of instance information
+    :return: list of lines
+    """
+    lines = []
+    named = [(name_of(instance_info) or "", instance_info) for instance_info in instances]  # unnamed ones sort first
+    for name, instance_info in sorted(named, key=lambda pair: pair[0]):
+        state = instance_info["State"]["Name"]
+        lines.append(f"{name} ({instance_info['InstanceId']})")
+        lines.append(f"  CURRENT STATE  : {state}")
+        if state == "running":
+            key_file = f'{instance_info.get("KeyName")}.pem'
+            lines.append(f'  LAUNCH COMMAND : ssh -i "{key_file}" ubuntu@{instance_info["PublicDnsName"]}')
+    return lines
 
 
 def describe_instance(
@@ -311,26 +731,7 @@ def describe_instance(
     :param instance_name: name of instance to stop
     :return: None
     """
-    try:
-        response = ec2_client.describe_instances(
-            Filters=[
-                {
-                    "Name": "subnet-id",
-                    "Values": [fetch_subnet_id(ec2_client, vpc_name, subnet_name)]
-                },
-                {
-                    "Name": "tag:Name",
-                    "Values": [instance_name]
-                }
-            ]
-        )
-        instance_info = response["Reservations"][0]["Instances"][0]
-        state = instance_info["State"]["Name"]
-        print(f"CURRENT STATE  : {state}")
-        if state == "running":
-            print(f'LAUNCH COMMAND : ssh -i "awselk.pem" ubuntu@{instance_info["PublicDnsName"]}')
-    except Exception:
-        print("Instance has not been created yet")
+    describe_instances(ec2_client, vpc_name, subnet_name, [instance_name])
 
 
 def delete_key_pair(
@@ -347,3 +748,23 @@ def delete_key_pair(
     """
     pathlib.os.remove(local_dir.joinpath(f"{key_name}.pem"))
     ec2_client.delete_key_pair(KeyName=key_name)
+
+
+def _is_pattern(name: str) -> bool:
+    """
+    Check whether name is glob pattern, which is evaluated by tag filter of EC2 API
+    :param name: name of resource
+    :return: whether name contains wildcard
+    """
+    return "*" in name or "?" in name
+
+
+def _batch_name(instance_names: List[str]) -> str:
+    """
+    Name tagged on launch to every instance launched by single RunInstances call
+    :param instance_names: names of instances in the order of their launch index
+    :return: name of single instance, or range of names(ex. 'ws-0..ws-7') at most 256 characters long
+    """
+    if len(instance_names) == 1:
+        return instance_names[0]
+    return f"{instance_names[0]}..{instance_names[-1]}"[:256]
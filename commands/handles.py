@@ -0,0 +1,51 @@
+import dataclasses
+
+# Handles identify resources created or resolved by commands. They carry names used as keys of cache together with IDs
+# returned by EC2, so a handle can be passed to following operations instead of resolving the resource by name again.
+# Slots keep them as small as tuples even when thousands of instances are handled at once.
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Vpc:
+    name: str
+    vpc_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Subnet:
+    vpc_name: str
+    name: str
+    subnet_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RouteTable:
+    vpc_name: str
+    name: str
+    route_table_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SecurityGroup:
+    vpc_name: str
+    group_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class InternetGateway:
+    vpc_name: str
+    internet_gateway_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Eip:
+    name: str
+    allocation_id: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Instance:
+    vpc_name: str
+    subnet_name: str
+    name: str
+    instance_id: str
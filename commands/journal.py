@@ -0,0 +1,258 @@
+import dataclasses
+import json
+import pathlib
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from commands import cache, handles
+
+# function that returns resource name used as key of cache, for each type of handle whose ID is cached on resume
+CACHE_KEYS = {
+    handles.Vpc: ("vpc", lambda handle: handle.name),
+    handles.Subnet: ("subnet", lambda handle: f"{handle.vpc_name}/{handle.name}"),
+    handles.RouteTable: ("route-table", lambda handle: f"{handle.vpc_name}/{handle.name}"),
+    handles.SecurityGroup: ("security-group", lambda handle: handle.vpc_name),
+    handles.InternetGateway: ("internet-gateway", lambda handle: handle.vpc_name),
+    handles.Eip: ("elastic-ip", lambda handle: handle.name),
+    handles.Instance: ("instance", lambda handle: f"{handle.vpc_name}/{handle.subnet_name}/{handle.name}"),
+}
+
+_path: Optional[pathlib.Path] = None
+_resume = False
+_lock = threading.Lock()
+
+
+def configure(path: Optional[str], resume: bool = False):
+    """
+    Enable journal of multi-step commands saved as JSON lines file in given path, or disable it if path is None
+    :param path: path to journal file
+    :param resume: whether commands continue unfinished run of the same command recorded in the journal
+    :return: None
+    """
+    global _path, _resume
+    if resume and path is None:
+        raise ValueError("journal_file must be given to resume command")
+    with _lock:
+        _path = None if path is None else pathlib.Path(path).resolve()
+        _resume = resume
+
+
+class Operation:
+    """
+    Run of a multi-step command recorded in journal. Every step appends a line when it starts and another line with its
+    result when it is done, so the journal tells which steps finished, which were in flight and which resources they
+    produced even if the process is killed. Resumed operation returns recorded results of finished steps instead of
+    running them again.
+    """
+
+    def __init__(self, ec2_client, command: str, operation_id: str, results: Dict[str, Any], in_flight: Sequence[str]):
+        self.ec2_client = ec2_client
+        self.command = command
+        self.operation_id = operation_id
+        self.results = results
+        self.in_flight = set(in_flight)
+
+    def client_token(self, step: str) -> Optional[str]:
+        """
+        Build idempotency token of step, which stays the same when the operation is resumed. EC2 returns the result of
+        the first request for repeated request with the same token(ex. RunInstances), instead of creating resources
+        again.
+        :param step: name of step
+        :return: client token of at most 64 characters, or None if operation is not recorded
+        """
+        return f"{self.operation_id}:{step}"[:64]
+
+    def step(self, name: str, function: Callable[[], Any], recover: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Run step of operation, or return its recorded result if it is already done
+        :param name: name of step, unique within the operation
+        :param function: function without argument that runs the step
+        :param recover: function without argument that finds result of step which was in flight when operation was
+            interrupted(ex. fetch handle of resource created by the step), raising ValueError if there is none
+        :return: result of step
+        """
+        if name in self.results:
+            print(f">>> Step '{name}' of '{self.command}' is already done")
+            result = self.results[name]
+            _store_handles(self.ec2_client, result)
+            return result
+        if name in self.in_flight and recover is not None:
+            try:
+                result = recover()
+            except ValueError:
+                pass  # step did not take effect before interruption
+            else:
+                self._done(name, result)
+                return result
+        _append({"operation": self.operation_id, "event": "start", "step": name})
+        try:
+            result = function()
+        except Exception as error:
+            _append({"operation": self.operation_id, "event": "fail", "step": name, "error": repr(error)})
+            raise
+        self._done(name, result)
+        return result
+
+    def steps(
+            self,
+            steps: Dict[str, Tuple[Callable[[], Any], Sequence[str]]],
+            recover: Optional[Dict[str, Callable[[], Any]]] = None,
+    ) -> Dict[str, Tuple[Callable[[], Any], Sequence[str]]]:
+        """
+        Wrap steps of `dag.run_steps` so that each of them is run by `step` method
+        :param steps: dictionary of step name to tuple of function without argument and names of steps it depends on
+        :param recover: dictionary of step name to function that finds result of the step left in flight
+        :return: steps in the same form
+        """
+        recover = recover or {}
+        return {
+            name: (lambda name=name, function=function: self.step(name, function, recover.get(name)), dependencies)
+            for name, (function, dependencies) in steps.items()
+        }
+
+    def finish(self):
+        """
+        Mark operation as finished, so it is not resumed afterward
+        :return: None
+        """
+        _append({"operation": self.operation_id, "event": "finish"})
+
+    def _done(self, name: str, result: Any):
+        self.results[name] = result
+        _append({"operation": self.operation_id, "event": "done", "step": name, "result": _encode(result)})
+
+
+def begin(ec2_client, command: str) -> Operation:
+    """
+    Begin operation of multi-step command. If resuming is enabled and the latest run of the same command in the same
+    region is unfinished, that run is continued; otherwise new run is recorded. Operation is not recorded at all when
+    journal is disabled.
+    :param ec2_client: EC2 client created by boto3 session
+    :param command: description of command and its arguments that identifies the operation(ex. 'instance run ws-1')
+    :return: operation
+    """
+    command = f"{ec2_client.meta.region_name}:{command}"
+    with _lock:
+        path, resume = _path, _resume
+    if path is None:
+        return unrecorded(ec2_client, command)
+    unfinished = _find_unfinished(path, command)
+    if resume and unfinished is not None:
+        operation_id, results, in_flight = unfinished
+        print(f">>> Resuming '{command}' with {len(results)} steps done and {len(in_flight)} steps in flight")
+        return Operation(ec2_client, command, operation_id, results, in_flight)
+    if resume:
+        print(f">>> No unfinished run of '{command}' is recorded in journal; starting new one")
+    elif unfinished is not None:
+        print(f">>> Unfinished run of '{command}' is recorded in journal; pass --resume to continue it")
+    operation = Operation(ec2_client, command, uuid.uuid4().hex[:16], {}, [])
+    _append({"operation": operation.operation_id, "event": "begin", "command": command})
+    return operation
+
+
+def unrecorded(ec2_client, command: str) -> Operation:
+    """
+    Create operation whose steps are run as is without being recorded, regardless of journal configuration
+    :param ec2_client: EC2 client created by boto3 session
+    :param command: description of command and its arguments
+    :return: operation
+    """
+    return _Unrecorded(ec2_client, command, uuid.uuid4().hex[:16], {}, [])
+
+
+class _Unrecorded(Operation):
+    """
+    Operation run as is while journal is disabled
+    """
+
+    def client_token(self, step: str) -> Optional[str]:
+        return None
+
+    def step(self, name: str, function: Callable[[], Any], recover: Optional[Callable[[], Any]] = None) -> Any:
+        return function()
+
+    def finish(self):
+        pass
+
+
+def _find_unfinished(path: pathlib.Path, command: str) -> Optional[Tuple[str, Dict[str, Any], Sequence[str]]]:
+    """
+    Read journal for the latest run of command, if it is not finished
+    :param path: path to journal file
+    :param command: command prefixed with region
+    :return: tuple of operation ID, dictionary of results of done steps and names of steps in flight, or None
+    """
+    if not path.exists():
+        return None
+    operation_id, results, in_flight = None, {}, set()
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line may be cut off when process was killed while writing it
+            if record["event"] == "begin" and record["command"] == command:
+                operation_id, results, in_flight = record["operation"], {}, set()
+            elif record["operation"] != operation_id:
+                continue
+            elif record["event"] == "start":
+                in_flight.add(record["step"])
+            elif record["event"] == "done":
+                results[record["step"]] = _decode(record["result"])
+                in_flight.discard(record["step"])
+            elif record["event"] == "fail":
+                in_flight.discard(record["step"])
+            elif record["event"] == "finish":
+                operation_id = None
+    return None if operation_id is None else (operation_id, results, sorted(in_flight))
+
+
+def _append(record: dict):
+    """
+    Append record to journal file. File is only appended, so records written before interruption are kept intact.
+    :param record: record without time
+    :return: None
+    """
+    with _lock:
+        if _path is None:
+            return
+        _path.parent.mkdir(parents=True, exist_ok=True)
+        with open(_path, "a") as file:
+            file.write(json.dumps({**record, "at": round(time.time(), 3)}) + "\n")
+
+
+def _encode(value: Any) -> Any:
+    if dataclasses.is_dataclass(value):
+        return {"handle": type(value).__name__, **dataclasses.asdict(value)}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and "handle" in value:
+        fields = dict(value)
+        return getattr(handles, fields.pop("handle"))(**fields)
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+
+def _store_handles(ec2_client, result: Any):
+    """
+    Cache IDs of resources in recorded result, so following steps do not resolve them by name
+    :param ec2_client: EC2 client created by boto3 session
+    :param result: recorded result of step
+    :return: None
+    """
+    for handle in result if isinstance(result, list) else [result]:
+        if type(handle) in CACHE_KEYS:
+            resource_type, name_of = CACHE_KEYS[type(handle)]
+            resource_id = getattr(handle, dataclasses.fields(handle)[-1].name)  # ID is the last field of handle
+            cache.store(ec2_client, resource_type, name_of(handle), resource_id)
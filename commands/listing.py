@@ -0,0 +1,95 @@
+import itertools
+from typing import Dict, Iterator, List, Optional
+
+# key of resources in response of each describe operation
+RESULT_KEYS = {
+    "describe_vpcs": "Vpcs",
+    "describe_subnets": "Subnets",
+    "describe_route_tables": "RouteTables",
+    "describe_security_groups": "SecurityGroups",
+    "describe_internet_gateways": "InternetGateways",
+    "describe_instances": "Reservations",
+    "describe_instance_status": "InstanceStatuses",
+    "describe_addresses": "Addresses",
+    "describe_key_pairs": "KeyPairs",
+    "describe_tags": "Tags",
+    "describe_regions": "Regions",
+    "describe_availability_zones": "AvailabilityZones",
+}
+# largest MaxResults accepted by each paginated operation
+PAGE_SIZES = {
+    "describe_vpcs": 1000,
+    "describe_subnets": 1000,
+    "describe_route_tables": 100,
+    "describe_security_groups": 1000,
+    "describe_internet_gateways": 1000,
+    "describe_instances": 1000,
+    "describe_instance_status": 1000,
+    "describe_tags": 1000,
+}
+# resources that can be listed by `list` command, and name of filter that selects them by VPC
+LISTABLE_RESOURCES = {
+    "vpcs": ("describe_vpcs", "vpc-id"),
+    "subnets": ("describe_subnets", "vpc-id"),
+    "route-tables": ("describe_route_tables", "vpc-id"),
+    "security-groups": ("describe_security_groups", "vpc-id"),
+    "internet-gateways": ("describe_internet_gateways", "attachment.vpc-id"),
+    "instances": ("describe_instances", "vpc-id"),
+    "elastic-ips": ("describe_addresses", None),
+}
+
+
+def iter_resources(ec2_client, operation_name: str, page_size: Optional[int] = None, **params) -> Iterator[dict]:
+    """
+    Yield resources of describe call lazily, page by page. Operations that support pagination are paginated by
+    botocore paginator with largest page size by default, while the others are called once. Page size is not applied
+    when resources are selected by their IDs, since MaxResults cannot be combined with IDs in most operations.
+    Reservations of describe_instances are flattened into instances.
+    :param ec2_client: EC2 client created by boto3 session
+    :param operation_name: name of describe operation(ex. 'describe_subnets')
+    :param page_size: number of resources per call, or None to use largest page size of the operation
+    :param params: parameters of the operation(ex. Filters)
+    :return: iterator of resources
+    """
+    key = RESULT_KEYS[operation_name]
+    if ec2_client.can_paginate(operation_name):
+        if not any(name.endswith("Ids") for name in params):
+            params["PaginationConfig"] = {"PageSize": page_size or PAGE_SIZES[operation_name]}
+        pages = ec2_client.get_paginator(operation_name).paginate(**params)
+    else:
+        pages = [getattr(ec2_client, operation_name)(**params)]
+    for page in pages:
+        for resource in page[key]:
+            if operation_name == "describe_instances":
+                yield from resource["Instances"]
+            else:
+                yield resource
+
+
+def list_resources(ec2_client, operation_name: str, limit: Optional[int] = None, **params) -> List[dict]:
+    """
+    Collect resources of describe call, stopping pagination as soon as `limit` resources are collected. Lookups by
+    name use limit of 2, which is enough to tell whether the name is missing, unique or ambiguous.
+    :param ec2_client: EC2 client created by boto3 session
+    :param operation_name: name of describe operation(ex. 'describe_subnets')
+    :param limit: maximum number of resources to collect, or None to collect all
+    :param params: parameters of the operation(ex. Filters)
+    :return: list of resources
+    """
+    return list(itertools.islice(iter_resources(ec2_client, operation_name, **params), limit))
+
+
+def build_filters(vpc_id: Optional[str], vpc_filter_name: Optional[str], filters: Dict[str, str]) -> List[dict]:
+    """
+    Build server-side filters of `list` command
+    :param vpc_id: ID of VPC to select resources within, or None
+    :param vpc_filter_name: name of filter that selects resources by VPC, or None if resource is not bound to VPC
+    :param filters: dictionary of filter name and value(ex. {'tag:Name': 'ws-*'})
+    :return: list of filters
+    """
+    built = [{"Name": name, "Values": [value]} for name, value in filters.items()]
+    if vpc_id is not None:
+        if vpc_filter_name is None:
+            raise ValueError("Resource is not bound to VPC, so vpc_name cannot be used to select it")
+        built.append({"Name": vpc_filter_name, "Values": [vpc_id]})
+    return built
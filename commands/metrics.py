@@ -0,0 +1,197 @@
+import dataclasses
+import json
+import threading
+import time
+from typing import Dict, List
+
+FORMATS = ("table", "json", "prometheus")
+# upper bounds of latency histogram buckets in seconds, where the last bucket counts every call
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "EC2ThrottledException",
+}
+
+
+@dataclasses.dataclass
+class OperationMetrics:
+    """
+    Metrics of API calls of an operation(ex. 'DescribeVpcs'). Latency of a call includes time spent on its retries,
+    while time spent waiting for rate limiter before the call is counted separately as queued time.
+    """
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    throttles: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    queued_seconds: float = 0.0
+    buckets: List[int] = dataclasses.field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+    def observe(self, seconds: float, is_error: bool):
+        self.count += 1
+        self.errors += int(is_error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                self.buckets[index] += 1
+                break
+
+
+_operations: Dict[str, OperationMetrics] = {}
+_lock = threading.Lock()
+
+
+def instrument(ec2_client):
+    """
+    Register handlers that record metrics of every API call made by the client
+    :param ec2_client: EC2 client created by boto3 session
+    :return: the client
+    """
+    events = ec2_client.meta.events
+    events.register_first("before-call.ec2.*", _start_call, unique_id="metrics-before-call")
+    events.register("after-call.ec2.*", _finish_call, unique_id="metrics-after-call")
+    events.register("after-call-error.ec2.*", _fail_call, unique_id="metrics-after-call-error")
+    events.register("needs-retry.ec2.*", _check_attempt, unique_id="metrics-needs-retry")
+    return ec2_client
+
+
+def reset():
+    """
+    Discard every recorded metric
+    :return: None
+    """
+    with _lock:
+        _operations.clear()
+
+
+def snapshot() -> Dict[str, OperationMetrics]:
+    """
+    Copy metrics recorded so far
+    :return: dictionary of operation name to its metrics
+    """
+    with _lock:
+        return {
+            name: dataclasses.replace(metrics, buckets=list(metrics.buckets)) for name, metrics in _operations.items()
+        }
+
+
+def format_metrics(output_format: str) -> str:
+    """
+    Format metrics recorded so far
+    :param output_format: one of ('table', 'json', 'prometheus')
+    :return: formatted metrics
+    """
+    operations = dict(sorted(snapshot().items()))
+    if output_format == "table":
+        return _format_table(operations)
+    elif output_format == "json":
+        return _format_json(operations)
+    elif output_format == "prometheus":
+        return _format_prometheus(operations)
+    raise ValueError(f"output_format must be one of {FORMATS}; got: '{output_format}'")
+
+
+def _start_call(context, **kwargs):
+    context["metrics_started_at"] = time.perf_counter()
+
+
+def _finish_call(http_response, parsed, model, context, **kwargs):
+    finished_at = time.perf_counter()
+    seconds = finished_at - context.get("metrics_started_at", finished_at)
+    with _lock:
+        metrics = _operations.setdefault(model.name, OperationMetrics())
+        metrics.observe(seconds, is_error=http_response.status_code >= 300)
+        metrics.queued_seconds += context.get("ratelimit_queued_seconds", 0.0)
+        metrics.retries += parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+
+
+def _fail_call(context, **kwargs):
+    # operation name is not passed with this event, so it is parsed from name of the event
+    operation_name = kwargs["event_name"].rsplit(".", 1)[-1]
+    finished_at = time.perf_counter()
+    seconds = finished_at - context.get("metrics_started_at", finished_at)
+    with _lock:
+        metrics = _operations.setdefault(operation_name, OperationMetrics())
+        metrics.observe(seconds, is_error=True)
+        metrics.queued_seconds += context.get("ratelimit_queued_seconds", 0.0)
+
+
+def _check_attempt(response, operation, attempts, **kwargs):
+    if response is None:
+        return None
+    error_code = response[1].get("Error", {}).get("Code")
+    if error_code in THROTTLING_ERROR_CODES:
+        with _lock:
+            _operations.setdefault(operation.name, OperationMetrics()).throttles += 1
+    return None  # decision to retry is left to retry handler of botocore
+
+
+def _format_table(operations: Dict[str, OperationMetrics]) -> str:
+    lines = [
+        f"{'OPERATION':<36}{'CALLS':>7}{'ERRORS':>8}{'RETRIES':>9}{'THROTTLES':>11}"
+        f"{'AVG(s)':>9}{'MAX(s)':>9}{'TOTAL(s)':>10}{'QUEUED(s)':>11}"
+    ]
+    for name, metrics in operations.items():
+        lines.append(
+            f"{name:<36}{metrics.count:>7}{metrics.errors:>8}{metrics.retries:>9}{metrics.throttles:>11}"
+            f"{metrics.total_seconds / max(metrics.count, 1):>9.3f}{metrics.max_seconds:>9.3f}"
+            f"{metrics.total_seconds:>10.3f}{metrics.queued_seconds:>11.3f}"
+        )
+    total_calls = sum(metrics.count for metrics in operations.values())
+    total_seconds = sum(metrics.total_seconds for metrics in operations.values())
+    total_queued_seconds = sum(metrics.queued_seconds for metrics in operations.values())
+    lines.append(f"{'TOTAL':<36}{total_calls:>7}{'':>46}{total_seconds:>10.3f}{total_queued_seconds:>11.3f}")
+    return "\n".join(lines)
+
+
+def _format_json(operations: Dict[str, OperationMetrics]) -> str:
+    return json.dumps(
+        {
+            name: {
+                **{key: value for key, value in dataclasses.asdict(metrics).items() if key != "buckets"},
+                "latency_buckets": {
+                    ("+Inf" if upper_bound == float("inf") else str(upper_bound)): count
+                    for upper_bound, count in zip(LATENCY_BUCKETS, metrics.buckets)
+                },
+            }
+            for name, metrics in operations.items()
+        },
+        indent=2,
+    )
+
+
+def _format_prometheus(operations: Dict[str, OperationMetrics]) -> str:
+    lines = [
+        "# HELP ec2_api_call_duration_seconds Latency of EC2 API calls including retries",
+        "# TYPE ec2_api_call_duration_seconds histogram",
+    ]
+    for name, metrics in operations.items():
+        cumulative = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+            cumulative += count
+            label = "+Inf" if upper_bound == float("inf") else str(upper_bound)
+            lines.append(f'ec2_api_call_duration_seconds_bucket{{operation="{name}",le="{label}"}} {cumulative}')
+        lines.append(f'ec2_api_call_duration_seconds_sum{{operation="{name}"}} {metrics.total_seconds:.6f}')
+        lines.append(f'ec2_api_call_duration_seconds_count{{operation="{name}"}} {metrics.count}')
+    lines.append("# HELP ec2_api_call_queued_seconds_total Time EC2 API calls waited for client-side rate limiter")
+    lines.append("# TYPE ec2_api_call_queued_seconds_total counter")
+    for name, metrics in operations.items():
+        lines.append(f'ec2_api_call_queued_seconds_total{{operation="{name}"}} {metrics.queued_seconds:.6f}')
+    for metric_name, attribute, description in (
+        ("ec2_api_call_errors_total", "errors", "Number of EC2 API calls that failed"),
+        ("ec2_api_call_retries_total", "retries", "Number of retried attempts of EC2 API calls"),
+        ("ec2_api_call_throttles_total", "throttles", "Number of attempts of EC2 API calls that were throttled"),
+    ):
+        lines.append(f"# HELP {metric_name} {description}")
+        lines.append(f"# TYPE {metric_name} counter")
+        for name, metrics in operations.items():
+            lines.append(f'{metric_name}{{operation="{name}"}} {getattr(metrics, attribute)}')
+    return "\n".join(lines)
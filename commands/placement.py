@@ -0,0 +1,246 @@
+import dataclasses
+import functools
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+
+from commands import cache, journal
+from commands.dag import run_steps
+from commands.ec2 import launch_instances
+from commands.handles import Instance
+from commands.listing import iter_resources
+from commands.vpc import fetch_vpc_id
+
+PLACEMENT_POLICIES = ("spread", "pack")
+# errors of RunInstances after which the availability zone is skipped, since another subnet of the zone would fail too
+ZONE_ERRORS = ("InsufficientInstanceCapacity", "InsufficientHostCapacity", "Unsupported")
+# errors of RunInstances after which only the subnet is skipped
+SUBNET_ERRORS = ("InsufficientFreeAddressesInSubnet",)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Candidate:
+    name: str
+    subnet_id: str
+    availability_zone: str
+    available_ips: int
+
+
+class CapacityIndex:
+    """
+    Index of free addresses of candidate subnets grouped by availability zone. Instances are assigned to subnets by
+    placement policy: `spread` places each instance in the zone with the fewest instances placed so far, and `pack`
+    fills one subnet after another, starting from the subnet with the most free addresses. Zones and subnets that fail
+    to launch instances are excluded from following assignments. Planning an assignment and reserving addresses for it
+    are separate, so an assignment recorded by previous run is reserved in the same way as new one.
+    """
+
+    def __init__(self, candidates: List[Candidate]):
+        self.candidates = {candidate.name: candidate for candidate in candidates}
+        self._free = {candidate.name: candidate.available_ips for candidate in candidates}
+        self._placed_in_zone = {candidate.availability_zone: 0 for candidate in candidates}
+        self._placed_in_subnet = {candidate.name: 0 for candidate in candidates}
+        self._excluded_zones = set()
+        self._excluded_subnets = set()
+        self._lock = threading.Lock()
+
+    def plan(self, instance_names: List[str], policy: str) -> Dict[str, List[str]]:
+        """
+        Assign instances to subnets without reserving their addresses
+        :param instance_names: names of instances to place
+        :param policy: one of ('spread', 'pack')
+        :return: dictionary of subnet name to names of instances assigned to it
+        """
+        if policy not in PLACEMENT_POLICIES:
+            raise ValueError(f"policy must be one of {PLACEMENT_POLICIES}; got: '{policy}'")
+        assignment: Dict[str, List[str]] = {}
+        with self._lock:
+            free, placed_in_zone, placed_in_subnet = (
+                dict(self._free), dict(self._placed_in_zone), dict(self._placed_in_subnet)
+            )
+            for position, instance_name in enumerate(instance_names):
+                usable = [
+                    candidate for candidate in self.candidates.values()
+                    if free[candidate.name] > 0
+                    and candidate.availability_zone not in self._excluded_zones
+                    and candidate.name not in self._excluded_subnets
+                ]
+                if not usable:
+                    raise RuntimeError(f"No subnet has capacity left for instances {instance_names[position:]}")
+                chosen = min(  # ties keep order of candidates
+                    usable, key=functools.partial(_rank, policy, free, placed_in_zone, placed_in_subnet)
+                )
+                free[chosen.name] -= 1
+                placed_in_zone[chosen.availability_zone] += 1
+                placed_in_subnet[chosen.name] += 1
+                assignment.setdefault(chosen.name, []).append(instance_name)
+        return assignment
+
+    def reserve(self, subnet_name: str, count: int, take_addresses: bool = True):
+        """
+        Count instances placed in subnet by assignment
+        :param subnet_name: name of subnet
+        :param count: number of instances
+        :param take_addresses: whether free addresses of subnet are reduced as well, which is not the case for
+            instances already launched when free addresses were read
+        :return: None
+        """
+        with self._lock:
+            if take_addresses:
+                self._free[subnet_name] -= count
+            self._placed_in_zone[self.candidates[subnet_name].availability_zone] += count
+            self._placed_in_subnet[subnet_name] += count
+
+    def release(self, subnet_name: str, count: int):
+        """
+        Return addresses reserved for instances that failed to launch
+        :param subnet_name: name of subnet
+        :param count: number of instances
+        :return: None
+        """
+        with self._lock:
+            self._free[subnet_name] += count
+            self._placed_in_zone[self.candidates[subnet_name].availability_zone] -= count
+            self._placed_in_subnet[subnet_name] -= count
+
+    def exclude(self, subnet_name: str, error_code: str):
+        """
+        Stop assigning instances to subnet, or to every subnet of its zone if error is about capacity of the zone
+        :param subnet_name: name of subnet that failed to launch instances
+        :param error_code: error code of RunInstances
+        :return: None
+        """
+        with self._lock:
+            if error_code in ZONE_ERRORS:
+                self._excluded_zones.add(self.candidates[subnet_name].availability_zone)
+            else:
+                self._excluded_subnets.add(subnet_name)
+
+
+def _rank(
+        policy: str,
+        free: Dict[str, int],
+        placed_in_zone: Dict[str, int],
+        placed_in_subnet: Dict[str, int],
+        candidate: Candidate,
+) -> Tuple[int, ...]:
+    if policy == "spread":
+        return placed_in_zone[candidate.availability_zone], -free[candidate.name]
+    return int(placed_in_subnet[candidate.name] == 0), -free[candidate.name]
+
+
+def load_index(ec2_client, vpc_name: str, subnet_names: Optional[List[str]] = None) -> CapacityIndex:
+    """
+    Build capacity index from candidate subnets of VPC, which are read with their free addresses and availability zones
+    by single paginated describe call. IDs of candidates are cached, so launching instances makes no more lookup.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC
+    :param subnet_names: names or glob patterns(ex. 'pub-*') of candidate subnets, or None for every named subnet
+    :return: capacity index
+    """
+    filters = [{"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]}]
+    filters.append({"Name": "tag:Name", "Values": subnet_names or ["*"]})
+    candidates = []
+    for subnet in iter_resources(ec2_client, "describe_subnets", Filters=filters):
+        name = next(tag["Value"] for tag in subnet["Tags"] if tag["Key"] == "Name")
+        cache.store(ec2_client, "subnet", f"{vpc_name}/{name}", subnet["SubnetId"])
+        candidates.append(
+            Candidate(name, subnet["SubnetId"], subnet["AvailabilityZone"], subnet["AvailableIpAddressCount"])
+        )
+    if not candidates:
+        raise ValueError(f"No subnet matches {subnet_names} in VPC '{vpc_name}'")
+    return CapacityIndex(sorted(candidates, key=lambda candidate: (candidate.availability_zone, candidate.name)))
+
+
+def place_instances(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_names: Optional[List[str]],
+        instance_names: List[str],
+        policy: str = "spread",
+        operation: Optional[journal.Operation] = None,
+) -> List[Instance]:
+    """
+    Launch instances across candidate subnets by placement policy. Instances assigned to the same subnet are launched by
+    single RunInstances call, and calls for different subnets are made concurrently. If a call fails for lack of
+    capacity of its zone(or free addresses of its subnet), the zone(or subnet) is excluded and its instances are
+    assigned again to the rest, until every instance is launched or no candidate is left.
+    :param ec2_client: EC2 client created by boto3 session
+    :param image_id: AMI ID which can be found in AMI catalog menu in EC2 console
+    :param instance_type: identifier of instance type listed in Instance Types menu in EC2 console
+    :param key_name: name of key pair
+    :param vpc_name: name of VPC where candidate subnets belong to
+    :param subnet_names: names or glob patterns(ex. 'pub-*') of candidate subnets, or None for every named subnet
+    :param instance_names: names of instances to be created
+    :param policy: one of ('spread', 'pack')
+    :param operation: journaled operation that records each assignment and each launch as its own step, so resumed
+        placement launches the same groups with the same idempotency tokens instead of assigning instances again.
+        Recorded assignments and exclusions are applied to the index read on resume before following rounds are planned
+    :return: handles of launched instances in the order of their names
+    """
+    if not instance_names or len(set(instance_names)) < len(instance_names):
+        raise ValueError(f"Names of instances must be given without duplicates; got: {instance_names}")
+    if policy not in PLACEMENT_POLICIES:
+        raise ValueError(f"policy must be one of {PLACEMENT_POLICIES}; got: '{policy}'")
+    operation = operation or journal.unrecorded(ec2_client, "place instances")
+    index = load_index(ec2_client, vpc_name, subnet_names)
+    launched: Dict[str, Instance] = {}
+    pending = list(instance_names)
+    round_number = 0
+    while pending:
+        # assignment depends on free addresses read at the time, so recorded one is reused on resume
+        assignment = operation.step(f"assign:{round_number}", functools.partial(index.plan, pending, policy))
+        steps, subnet_of_step = {}, {}
+        for subnet_name, names in assignment.items():
+            step = f"launch:{round_number}:{zlib.crc32(subnet_name.encode()):08x}"
+            # instances launched by previous run are already left out of free addresses read on resume
+            index.reserve(subnet_name, len(names), take_addresses=not isinstance(operation.results.get(step), list))
+            steps[step] = (
+                functools.partial(
+                    _launch_group,
+                    ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, names,
+                    operation.client_token(step),
+                ),
+                [],
+            )
+            subnet_of_step[step] = subnet_name
+        for step, result in run_steps(operation.steps(steps)).items():
+            if isinstance(result, str):  # error code of RunInstances, recorded as well to exclude subnet on resume
+                index.release(subnet_of_step[step], len(assignment[subnet_of_step[step]]))
+                index.exclude(subnet_of_step[step], result)
+            else:
+                launched.update({instance.name: instance for instance in result})
+        pending = [name for name in pending if name not in launched]
+        round_number += 1
+    return [launched[name] for name in instance_names]
+
+
+def _launch_group(
+        ec2_client,
+        image_id: str,
+        instance_type: str,
+        key_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_names: List[str],
+        client_token: Optional[str],
+) -> Union[List[Instance], str]:
+    """
+    Launch instances assigned to subnet
+    :return: handles of launched instances, or error code of RunInstances if subnet(or its zone) lacks capacity
+    """
+    try:
+        return launch_instances(
+            ec2_client, image_id, instance_type, key_name, vpc_name, subnet_name, instance_names, client_token
+        )
+    except ClientError as error:
+        error_code = error.response["Error"]["Code"]
+        if error_code not in ZONE_ERRORS + SUBNET_ERRORS:
+            raise
+        print(f">>> {subnet_name} : {error_code}, instances {instance_names} are placed again")
+        return error_code
@@ -0,0 +1,165 @@
+import contextlib
+import dataclasses
+import functools
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Iterator, Tuple
+
+# prefixes of operations that do not change resources, which are throttled by EC2 apart from mutating operations
+DESCRIBE_PREFIXES = ("Describe", "Get", "List")
+# bucket that each class of calls takes tokens from, where polling calls of waiters are describe calls
+BUCKETS = {"mutate": "mutate", "describe": "describe", "poll": "describe"}
+
+
+@dataclasses.dataclass(frozen=True)
+class Budget:
+    """
+    Token bucket of API calls: `capacity` calls can be made in a burst, and tokens are refilled by `refill_rate` calls
+    per second afterward. Zero refill rate disables limiting of the bucket.
+    """
+    capacity: float
+    refill_rate: float
+
+
+@dataclasses.dataclass(frozen=True)
+class RateLimitOptions:
+    """
+    Budgets of API calls made by every EC2 client of the process, which default to request throttling of EC2 for each
+    account and region. Mutating calls have their own budget, so they never queue behind polling, and calls waiting
+    for the same bucket are served in order of `priorities` so that polling of waiters yields to other describe calls.
+    """
+    describe: Budget = Budget(capacity=100, refill_rate=20.0)
+    mutate: Budget = Budget(capacity=200, refill_rate=5.0)
+    priorities: Dict[str, int] = dataclasses.field(default_factory=lambda: {"mutate": 0, "describe": 1, "poll": 2})
+
+
+class TokenBucket:
+    """
+    Token bucket shared by threads. Each call takes one token, and calls that find the bucket empty wait in order of
+    priority and then arrival, so a low priority call never takes token that higher priority call is waiting for.
+    """
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self._tokens = float(budget.capacity)
+        self._updated_at = time.monotonic()
+        self._waiters = []  # heap of (priority, sequence) of waiting calls
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: int = 0) -> float:
+        """
+        Take a token, waiting until it is refilled if the bucket is empty
+        :param priority: priority of the call, where lower value is served first
+        :return: seconds spent waiting for the token
+        """
+        started_at = time.monotonic()
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                self._refill()
+                is_next = self._waiters[0] == ticket
+                if is_next and self._tokens >= 1:
+                    break
+                # only the next call sleeps until its token is refilled, while the others wait to become the next
+                self._condition.wait((1 - self._tokens) / self.budget.refill_rate if is_next else None)
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._condition.notify_all()
+        return time.monotonic() - started_at
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.budget.capacity, self._tokens + (now - self._updated_at) * self.budget.refill_rate)
+        self._updated_at = now
+
+
+_options = RateLimitOptions()
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_queued: Dict[str, Tuple[int, float]] = {}  # class of calls -> (number of calls that waited, seconds spent waiting)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(options: RateLimitOptions):
+    """
+    Set budgets of API calls. Buckets are refilled to their capacity if budgets are changed.
+    :param options: budgets and priorities of API calls
+    :return: None
+    """
+    global _options
+    with _lock:
+        if options != _options:
+            _options = options
+            _buckets.clear()
+
+
+def install(ec2_client):
+    """
+    Register handler that makes every API call of the client take a token of its class before it is sent. Buckets are
+    shared by every client of the same region, while retried attempts are left to retry mode of the client.
+    :param ec2_client: EC2 client created by boto3 session
+    :return: the client
+    """
+    ec2_client.meta.events.register_first(
+        "before-parameter-build.ec2.*",
+        functools.partial(_acquire, ec2_client.meta.region_name),
+        unique_id="ratelimit-acquire",
+    )
+    return ec2_client
+
+
+@contextlib.contextmanager
+def polling() -> Iterator[None]:
+    """
+    Mark describe calls made by current thread within the context as polling, which yields to other describe calls
+    :return: context manager
+    """
+    previous = getattr(_local, "polling", False)
+    _local.polling = True
+    try:
+        yield
+    finally:
+        _local.polling = previous
+
+
+def queued() -> Dict[str, Tuple[int, float]]:
+    """
+    Report time that calls were queued by rate limiter
+    :return: dictionary of class of calls to tuple of number of calls that waited and total seconds spent waiting
+    """
+    with _lock:
+        return dict(_queued)
+
+
+def reset():
+    """
+    Discard queued time reported so far
+    :return: None
+    """
+    with _lock:
+        _queued.clear()
+
+
+def _acquire(region_name: str, model, context, **kwargs):
+    if not model.name.startswith(DESCRIBE_PREFIXES):
+        call_class = "mutate"
+    else:
+        call_class = "poll" if getattr(_local, "polling", False) else "describe"
+    with _lock:
+        options = _options
+        budget = getattr(options, BUCKETS[call_class])
+        if budget.refill_rate <= 0:
+            return
+        bucket = _buckets.get((region_name, BUCKETS[call_class]))
+        if bucket is None:
+            bucket = _buckets[(region_name, BUCKETS[call_class])] = TokenBucket(budget)
+    seconds = bucket.acquire(options.priorities[call_class])
+    context["ratelimit_queued_seconds"] = seconds
+    if seconds > 0.001:  # calls that found token at once are not regarded as queued
+        with _lock:
+            count, total = _queued.get(call_class, (0, 0.0))
+            _queued[call_class] = (count + 1, total + seconds)
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from commands.listing import iter_resources
+from commands.ratelimit import polling
+from commands.vpc import fetch_vpc_ingress_ports, merge_port_ranges
+from commands.waiter import MAX_IDS_PER_CALL, Schedule
+
+MAX_DEFAULT_PORTS = 32  # ports opened by security group are probed only up to this number, unless given explicitly
+PROBE_INTERVAL = 1.0  # connection attempts make no API call, so they are repeated at short fixed interval
+SSH_PORT = 22
+
+
+def parse_ports(ports: str) -> List[int]:
+    """
+    Parse comma separated ports in the same format as `ports` of VPC(ex. '22,8888-8890')
+    :param ports: comma separated port or range of ports
+    :return: sorted list of ports
+    """
+    return [
+        port
+        for from_port, to_port in merge_port_ranges(ports.split(","))
+        for port in range(from_port, to_port + 1)
+    ]
+
+
+def fetch_default_ports(ec2_client, vpc_name: str) -> List[int]:
+    """
+    Fetch ports to probe when they are not given, which are TCP ports open to any address in security group of VPC
+    (ex. '22,8888' of `vpc create --ports`), since instances are only reachable through them
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :return: sorted list of ports
+    """
+    ports = [
+        port
+        for from_port, to_port in fetch_vpc_ingress_ports(ec2_client, vpc_name)
+        for port in range(from_port, to_port + 1)
+    ]
+    if not ports:
+        raise ValueError(f"Security group of VPC '{vpc_name}' opens no TCP port; ports to probe must be given")
+    if len(ports) > MAX_DEFAULT_PORTS:
+        raise ValueError(
+            f"Security group of VPC '{vpc_name}' opens {len(ports)} TCP ports, more than {MAX_DEFAULT_PORTS} to probe "
+            f"by default; ports to probe must be given"
+        )
+    return ports
+
+
+def wait_until_usable(
+        ec2_client,
+        instance_ids: List[str],
+        ports: List[int],
+        schedule: Schedule = Schedule(),
+        connect_timeout: float = 3.0,
+) -> List[dict]:
+    """
+    Wait until running instances are actually usable. Every port of every instance is probed concurrently on event
+    loop until it accepts TCP connection(SSH port must also send its banner), while status checks are polled alongside
+    to give up as soon as any instance is impaired. Each instance is reported as soon as all of its ports are open, and
+    TimeoutError is raised for the first instance that misses deadline of the schedule.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of IDs of running instances
+    :param ports: ports that have to accept connection
+    :param schedule: polling schedule of status checks, whose timeout is deadline of each instance
+    :param connect_timeout: seconds to wait for each connection attempt
+    :return: list of readiness of instances in the order they became usable, each as dictionary of InstanceId, Host
+        and Elapsed seconds
+    """
+    hosts = fetch_hosts(ec2_client, instance_ids)
+    return asyncio.run(_wait_until_usable(ec2_client, hosts, ports, schedule, connect_timeout))
+
+
+def fetch_hosts(ec2_client, instance_ids: List[str]) -> Dict[str, str]:
+    """
+    Fetch address to probe each instance, which is public IP(elastic IP if associated), public DNS name or private IP
+    in order of preference
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :return: dictionary of instance ID to its address
+    """
+    hosts = {}
+    for index in range(0, len(instance_ids), MAX_IDS_PER_CALL["describe"]):
+        for instance in iter_resources(
+            ec2_client, "describe_instances", InstanceIds=instance_ids[index:index + MAX_IDS_PER_CALL["describe"]]
+        ):
+            host = instance.get("PublicIpAddress") or instance.get("PublicDnsName") or instance.get("PrivateIpAddress")
+            if not host:
+                raise ValueError(f"Instance '{instance['InstanceId']}' has no address to probe")
+            hosts[instance["InstanceId"]] = host
+    return hosts
+
+
+async def _wait_until_usable(
+        ec2_client,
+        hosts: Dict[str, str],
+        ports: List[int],
+        schedule: Schedule,
+        connect_timeout: float,
+) -> List[dict]:
+    started_at = time.monotonic()
+    deadline = started_at + schedule.timeout
+    probes = {
+        asyncio.ensure_future(_probe_host(instance_id, host, ports, started_at, deadline, connect_timeout))
+        for instance_id, host in hosts.items()
+    }
+    status_checks = {asyncio.ensure_future(_check_status(ec2_client, list(hosts), schedule, deadline))}
+    readiness = []
+    try:
+        while probes:
+            done, _ = await asyncio.wait(probes | status_checks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()  # raises error of failed probe or impaired status check
+                if task in probes:
+                    probes.discard(task)
+                    readiness.append(result)
+                else:
+                    status_checks.discard(task)
+    finally:
+        for task in probes | status_checks:
+            task.cancel()
+    return readiness
+
+
+async def _probe_host(
+        instance_id: str,
+        host: str,
+        ports: List[int],
+        started_at: float,
+        deadline: float,
+        connect_timeout: float,
+) -> dict:
+    """
+    Probe ports of host until every port is open
+    :param instance_id: ID of instance
+    :param host: address of instance
+    :param ports: ports to probe
+    :param started_at: monotonic time when waiting started
+    :param deadline: monotonic time to give up
+    :param connect_timeout: seconds to wait for each connection attempt
+    :return: dictionary of InstanceId, Host and Elapsed seconds
+    """
+    closed_ports = list(ports)
+    while True:
+        is_open = await asyncio.gather(*(_is_open(host, port, connect_timeout) for port in closed_ports))
+        closed_ports = [port for port, port_is_open in zip(closed_ports, is_open) if not port_is_open]
+        if not closed_ports:
+            return {"InstanceId": instance_id, "Host": host, "Elapsed": round(time.monotonic() - started_at, 2)}
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Instance '{instance_id}' at {host} did not accept connection on ports {closed_ports} within "
+                f"{round(deadline - started_at, 2)} seconds"
+            )
+        await asyncio.sleep(min(PROBE_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+
+async def _is_open(host: str, port: int, connect_timeout: float) -> bool:
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=connect_timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        if port == SSH_PORT:  # sshd may accept connection before it is able to serve, so its banner is awaited
+            banner = await asyncio.wait_for(reader.readline(), timeout=connect_timeout)
+            return banner.startswith(b"SSH-")
+        return True
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+
+async def _check_status(ec2_client, instance_ids: List[str], schedule: Schedule, deadline: float):
+    """
+    Poll status checks until every instance passes them, and raise RuntimeError once any instance is impaired
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :param schedule: polling schedule
+    :param deadline: monotonic time to stop polling
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    for delay in schedule.delays():
+        await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        statuses = await loop.run_in_executor(None, _fetch_statuses, ec2_client, instance_ids)
+        impaired = sorted(instance_id for instance_id, status in statuses.items() if "impaired" in status)
+        if impaired:
+            raise RuntimeError(f"Status checks of instances {impaired} are impaired")
+        if len(statuses) == len(instance_ids) and all(status == ("ok", "ok") for status in statuses.values()):
+            return
+        if time.monotonic() >= deadline:  # timeout is reported by probes
+            return
+
+
+def _fetch_statuses(ec2_client, instance_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    Fetch results of instance and system status checks by batched describe_instance_status calls
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :return: dictionary of instance ID to tuple of instance status and system status
+    """
+    statuses = {}
+    with polling():  # called on thread of executor, so calls are marked as polling here
+        for index in range(0, len(instance_ids), MAX_IDS_PER_CALL["status"]):
+            for status in iter_resources(
+                ec2_client,
+                "describe_instance_status",
+                InstanceIds=instance_ids[index:index + MAX_IDS_PER_CALL["status"]],
+                IncludeAllInstances=True,
+            ):
+                statuses[status["InstanceId"]] = (status["InstanceStatus"]["Status"], status["SystemStatus"]["Status"])
+    return statuses
@@ -0,0 +1,42 @@
+import concurrent.futures
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from commands.dag import DEFAULT_MAX_WORKERS
+
+ALL_REGIONS = "all"
+
+
+def parse_region_names(ec2_client, regions: str) -> List[str]:
+    """
+    Parse comma separated region names. If 'all' is given, every region enabled for the account is listed by single
+    describe_regions call.
+    :param ec2_client: EC2 client created by boto3 session, which is required only when 'all' is given
+    :param regions: comma separated region names(ex. 'ap-northeast-2,us-east-1') or 'all'
+    :return: list of region names
+    """
+    if regions.strip().lower() == ALL_REGIONS:
+        return sorted(region["RegionName"] for region in ec2_client.describe_regions()["Regions"])
+    region_names = [region_name.strip() for region_name in regions.split(",") if region_name.strip()]
+    if not region_names:
+        raise ValueError(f"regions must be comma separated region names or '{ALL_REGIONS}'; got: '{regions}'")
+    return list(dict.fromkeys(region_names))
+
+
+def fan_out(
+        function: Callable[[str], Any],
+        region_names: List[str],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+    """
+    Run function for every region on thread pool, and yield result of each region as soon as it is finished. Failure
+    of a region does not stop the others, so its error is yielded in place of result.
+    :param function: function that takes region name and returns result of the region
+    :param region_names: list of region names
+    :param max_workers: maximum number of regions processed at the same time
+    :return: iterator of tuple of region name, result(None if failed) and error(None if succeeded)
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, region_name): region_name for region_name in region_names}
+        for future in concurrent.futures.as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error is not None else future.result(), error
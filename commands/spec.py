@@ -0,0 +1,385 @@
+import functools
+import pathlib
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from commands import ec2, topology, vpc
+from commands.dag import run_steps
+from commands.handles import Eip, Instance
+from commands.listing import list_resources
+
+Step = Tuple[str, Callable[[], Any], Sequence[str]]
+
+
+def load_spec(spec_path: str) -> dict:
+    """
+    Load workspace spec written in TOML(.toml) or YAML(.yaml, .yml). Example of spec in TOML:
+        [vpc]
+        name = "workspace"
+        cidr = "172.40.0.0/16"
+        ports = "22,80,8888-8890"
+
+        [[subnets]]
+        name = "pub-a"
+        cidr_substitute = "11"
+        az_postfix = "a"
+        route_table_name = "rt-pub"
+        is_public = true
+
+        [key_pair]
+        name = "workspace"
+
+        [[instances]]
+        name = "workspace-ubuntu"
+        subnet_name = "pub-a"
+        image_id = "ami-04341a215040f91bb"
+        instance_type = "t2.medium"
+        key_name = "workspace"
+
+        [[elastic_ips]]
+        name = "workspace-ip"
+        instance_name = "workspace-ubuntu"
+    :param spec_path: path to spec file
+    :return: dictionary of spec
+    """
+    path = pathlib.Path(spec_path)
+    if path.suffix == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # tomllib is added to standard library from python 3.11
+            import tomli as tomllib
+        with open(path, "rb") as file:
+            spec = tomllib.load(file)
+    elif path.suffix in (".yaml", ".yml"):
+        import yaml
+        with open(path) as file:
+            spec = yaml.safe_load(file)
+    else:
+        raise ValueError(f"spec file must be one of ('.toml', '.yaml', '.yml'); got: '{path.suffix}'")
+    assert "vpc" in spec, "spec must define 'vpc' table"
+    return spec
+
+
+def read_current_state(ec2_client, spec: dict, region_name: str) -> dict:
+    """
+    Read current state of every resource in spec in one concurrent round of describe calls. ID of VPC is not known
+    before the round, so resources within VPC are selected by names given in spec(security group and internet gateway
+    by names derived from VPC name), and those of other VPCs are dropped afterward.
+    :param ec2_client: EC2 client created by boto3 session
+    :param spec: dictionary of spec
+    :param region_name: name of region
+    :return: dictionary of topology(None if VPC does not exist), names of key pairs and elastic IPs by name
+    """
+    vpc_name = spec["vpc"]["name"]
+    key_names = [spec["key_pair"]["name"]] if "key_pair" in spec else []
+    eip_names = [eip_spec["name"] for eip_spec in spec.get("elastic_ips", [])]
+    subnet_names = [subnet_spec["name"] for subnet_spec in spec.get("subnets", [])]
+    rt_names = [subnet_spec["route_table_name"] for subnet_spec in spec.get("subnets", [])]
+    instance_names = [instance_spec["name"] for instance_spec in spec.get("instances", [])]
+
+    def select(operation_name: str, names: List[str], *filters: dict) -> List[dict]:
+        return list_resources(ec2_client, operation_name, Filters=list(filters)) if names else []
+
+    results = run_steps({
+        "vpcs": (
+            lambda: list_resources(
+                ec2_client, "describe_vpcs", limit=2, Filters=[{"Name": "tag:Name", "Values": [vpc_name]}]
+            ),
+            [],
+        ),
+        "subnets": (
+            functools.partial(select, "describe_subnets", subnet_names, {"Name": "tag:Name", "Values": subnet_names}),
+            [],
+        ),
+        "route_tables": (
+            functools.partial(select, "describe_route_tables", rt_names, {"Name": "tag:Name", "Values": rt_names}),
+            [],
+        ),
+        "security_groups": (
+            lambda: list_resources(ec2_client, "describe_security_groups", Filters=[
+                {"Name": "group-name", "Values": [f"{vpc_name.replace('_', '-')}-sg"]},
+            ]),
+            [],
+        ),
+        "internet_gateways": (
+            lambda: list_resources(ec2_client, "describe_internet_gateways", Filters=[
+                {"Name": "tag:Name", "Values": [vpc.internet_gateway_name(vpc_name)]},
+                {"Name": "attachment.state", "Values": ["available"]},
+            ]),
+            [],
+        ),
+        "instances": (
+            functools.partial(
+                select,
+                "describe_instances",
+                instance_names,
+                {"Name": "tag:Name", "Values": instance_names},
+                {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+            ),
+            [],
+        ),
+        "key_pairs": (
+            functools.partial(select, "describe_key_pairs", key_names, {"Name": "key-name", "Values": key_names}),
+            [],
+        ),
+        "addresses": (
+            functools.partial(
+                select,
+                "describe_addresses",
+                eip_names,
+                {"Name": "tag:Name", "Values": eip_names},
+                {"Name": "network-border-group", "Values": [region_name]},
+            ),
+            [],
+        ),
+    })
+    if len(results["vpcs"]) > 1:
+        raise ValueError(f"VPC whose name tag value is '{vpc_name}' is ambiguous")
+    return {
+        "topology": topology.build_topology(
+            ec2_client,
+            vpc_name,
+            results["vpcs"][0],
+            subnets=results["subnets"],
+            route_tables=results["route_tables"],
+            security_groups=results["security_groups"],
+            internet_gateways=results["internet_gateways"],
+            instances=results["instances"],
+        ) if results["vpcs"] else None,
+        "key_names": {key_pair["KeyName"] for key_pair in results["key_pairs"]},
+        "addresses": {topology.name_of(address): address for address in results["addresses"]},
+    }
+
+
+def plan(ec2_client, spec: dict, current: dict, region_name: str) -> List[Step]:
+    """
+    Compute steps required to make current state match the spec. Each step reuses create/modify function of commands,
+    and depends only on other steps that create resources it needs.
+    :param ec2_client: EC2 client created by boto3 session
+    :param spec: dictionary of spec
+    :param current: current state read by `read_current_state`
+    :param region_name: name of region
+    :return: list of tuple of step name, function without argument and names of steps it depends on
+    """
+    vpc_spec = spec["vpc"]
+    vpc_name = vpc_spec["name"]
+    current_topology: Optional[topology.Topology] = current["topology"]
+    steps: List[Step] = []
+
+    def add(name: str, function: Callable, dependencies: Sequence[str] = (), **kwargs):
+        steps.append((name, functools.partial(function, ec2_client=ec2_client, **kwargs), dependencies))
+
+    if current_topology is None:
+        add("vpc", vpc.create_vpc, vpc_name=vpc_name, vpc_cidr=vpc_spec["cidr"])
+    security_group = None if current_topology is None else current_topology.security_groups.get(
+        f"{vpc_name.replace('_', '-')}-sg"
+    )
+    if security_group is None:
+        add(
+            "security-group",
+            vpc.create_vpc_security_group,
+            ["vpc"],
+            vpc_name=vpc_name,
+            ingress_ports=vpc_spec["ports"].split(","),
+        )
+    elif any(vpc.diff_security_group_ports(security_group, vpc_spec["ports"].split(","))):
+        add(
+            "security-group",
+            vpc.sync_vpc_security_group_ports,
+            vpc_name=vpc_name,
+            ingress_ports=vpc_spec["ports"].split(","),
+            security_group=security_group,
+        )
+    if current_topology is None or not current_topology.internet_gateways:
+        add("internet-gateway", vpc.create_vpc_internet_gateway, ["vpc"], vpc_name=vpc_name)
+
+    for subnet_spec in spec.get("subnets", []):
+        subnet_name, rt_name = subnet_spec["name"], subnet_spec["route_table_name"]
+        is_public = subnet_spec.get("is_public", False)
+        subnets = [] if current_topology is None else current_topology.subnets_by_name.get(subnet_name, [])
+        route_tables = [] if current_topology is None else current_topology.route_tables_by_name.get(rt_name, [])
+        if not subnets:
+            add(
+                f"subnet:{subnet_name}",
+                vpc.create_subnet,
+                ["vpc"],
+                vpc_name=vpc_name,
+                subnet_name=subnet_name,
+                cidr_substitute=str(subnet_spec["cidr_substitute"]),
+                region_name=region_name,
+                az_postfix=subnet_spec["az_postfix"],
+                is_public=is_public,
+            )
+        elif subnets[0]["MapPublicIpOnLaunch"] != is_public:
+            add(
+                f"subnet:{subnet_name}",
+                _modify_public_ip_mapping,
+                subnet_id=subnets[0]["SubnetId"],
+                is_public=is_public,
+            )
+        if not route_tables:
+            add(
+                f"route-table:{rt_name}",
+                vpc.create_route_table,
+                ["vpc", "internet-gateway"] if is_public else ["vpc"],
+                vpc_name=vpc_name,
+                rt_name=rt_name,
+                is_public=is_public,
+            )
+        elif is_public and not any(
+            route.get("DestinationCidrBlock") == "0.0.0.0/0" for route in route_tables[0].get("Routes", [])
+        ):
+            add(
+                f"route:{rt_name}",
+                vpc.create_internet_route,
+                ["internet-gateway"],
+                vpc_name=vpc_name,
+                rt_id=route_tables[0]["RouteTableId"],
+            )
+        is_associated = bool(subnets) and bool(route_tables) and any(
+            association.get("SubnetId") == subnets[0]["SubnetId"]
+            for association in route_tables[0].get("Associations", [])
+        )
+        if not is_associated:
+            add(
+                f"association:{subnet_name}",
+                vpc.create_route_table_subnet_association,
+                [f"subnet:{subnet_name}", f"route-table:{rt_name}"],
+                vpc_name=vpc_name,
+                subnet_name=subnet_name,
+                rt_name=rt_name,
+            )
+
+    if "key_pair" in spec and spec["key_pair"]["name"] not in current["key_names"]:
+        local_dir = pathlib.Path(spec["key_pair"].get("key_dir", ".")).resolve()
+        add("key-pair", ec2.create_key_pair, key_name=spec["key_pair"]["name"], local_dir=local_dir)
+
+    instance_ids, instance_subnet_names = {}, {}
+    for instance_spec in spec.get("instances", []):
+        instance_name, subnet_name = instance_spec["name"], instance_spec["subnet_name"]
+        instance_ids[instance_name] = _find_instance_id(current_topology, subnet_name, instance_name)
+        instance_subnet_names[instance_name] = subnet_name
+        if instance_ids[instance_name] is None:
+            add(
+                f"instance:{instance_name}",
+                ec2.run_instance,
+                ["security-group", f"subnet:{subnet_name}", f"association:{subnet_name}", "key-pair"],
+                image_id=instance_spec["image_id"],
+                instance_type=instance_spec["instance_type"],
+                key_name=instance_spec["key_name"],
+                vpc_name=vpc_name,
+                subnet_name=subnet_name,
+                instance_name=instance_name,
+            )
+
+    for eip_spec in spec.get("elastic_ips", []):
+        eip_name, instance_name = eip_spec["name"], eip_spec.get("instance_name")
+        address = current["addresses"].get(eip_name)
+        if address is None:
+            add(f"elastic-ip:{eip_name}", ec2.allocate_elastic_ip, region_name=region_name, eip_name=eip_name)
+        is_associated = address is not None and instance_ids.get(instance_name) is not None and (
+            address.get("InstanceId") == instance_ids[instance_name]
+        )
+        if instance_name in instance_subnet_names and not is_associated:
+            add(
+                f"elastic-ip-association:{eip_name}",
+                _associate_elastic_ip,
+                [f"elastic-ip:{eip_name}", f"instance:{instance_name}"],
+                region_name=region_name,
+                vpc_name=vpc_name,
+                subnet_name=instance_subnet_names[instance_name],
+                instance_name=instance_name,
+                instance_id=instance_ids[instance_name],
+                eip_name=eip_name,
+                allocation_id=None if address is None else address["AllocationId"],
+            )
+        elif instance_name is not None and not is_associated:
+            add(
+                f"elastic-ip-association:{eip_name}",
+                ec2.associate_instance_to_elastic_ip,
+                [f"elastic-ip:{eip_name}", f"instance:{instance_name}"],
+                region_name=region_name,
+                instance_name=instance_name,
+                eip_name=eip_name,
+            )
+
+    planned = {name for name, _, _ in steps}
+    return [(name, function, [dep for dep in deps if dep in planned]) for name, function, deps in steps]
+
+
+def apply_spec(ec2_client, spec: dict, region_name: str, dry_run: bool = False) -> List[str]:
+    """
+    Make workspace match the spec by issuing only missing create/modify calls. Workspace that already matches the spec
+    is checked by reading current state only, without any mutating call.
+    :param ec2_client: EC2 client created by boto3 session
+    :param spec: dictionary of spec
+    :param region_name: name of region
+    :param dry_run: whether to compute steps without running them
+    :return: names of steps that are(or would be) run
+    """
+    current = read_current_state(ec2_client, spec, region_name)
+    steps = plan(ec2_client, spec, current, region_name)
+    if not dry_run and steps:
+        run_steps({name: (function, deps) for name, function, deps in steps})
+    return [name for name, _, _ in steps]
+
+
+def _modify_public_ip_mapping(ec2_client, subnet_id: str, is_public: bool):
+    """
+    Change whether public IPv4 address is assigned to instance created within the subnet
+    :param ec2_client: EC2 client created by boto3 session
+    :param subnet_id: ID of subnet
+    :param is_public: whether subnet has to be connected to internet
+    :return: None
+    """
+    ec2_client.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={"Value": is_public})
+
+
+def _associate_elastic_ip(
+        ec2_client,
+        region_name: str,
+        vpc_name: str,
+        subnet_name: str,
+        instance_name: str,
+        instance_id: Optional[str],
+        eip_name: str,
+        allocation_id: Optional[str],
+):
+    """
+    Associate elastic IP with instance of the spec by their handles. Handles of resources created by previous steps are
+    resolved from cache, so no describe call is made for them.
+    :param ec2_client: EC2 client created by boto3 session
+    :param region_name: name of region
+    :param vpc_name: name of VPC
+    :param subnet_name: name of subnet where instance is created
+    :param instance_name: name of instance
+    :param instance_id: ID of instance found in current state, or None if it is created by previous step
+    :param eip_name: name of elastic IP
+    :param allocation_id: allocation ID of elastic IP found in current state, or None if allocated by previous step
+    :return: None
+    """
+    if allocation_id is None:
+        eip = ec2.fetch_elastic_ip(ec2_client, region_name, eip_name)
+    else:
+        eip = Eip(eip_name, allocation_id)
+    if instance_id is None:
+        instance = ec2.fetch_instance(ec2_client, vpc_name, subnet_name, instance_name)
+    else:
+        instance = Instance(vpc_name, subnet_name, instance_name, instance_id)
+    ec2.associate_elastic_ip(ec2_client, eip, instance)
+
+
+def _find_instance_id(current_topology: Optional[topology.Topology], subnet_name: str, instance_name: str):
+    """
+    Find ID of instance that is not terminated within subnet of the topology
+    :param current_topology: snapshot of VPC topology, or None if VPC does not exist
+    :param subnet_name: name of subnet where instance is created
+    :param instance_name: name of instance
+    :return: InstanceId, or None if instance does not exist
+    """
+    if current_topology is None or len(current_topology.subnets_by_name.get(subnet_name, [])) != 1:
+        return None
+    subnet_id = current_topology.subnet(subnet_name)["SubnetId"]
+    for instance_info in current_topology.instances_of_subnet.get(subnet_id, []):
+        if topology.name_of(instance_info) == instance_name:
+            return instance_info["InstanceId"]
+    return None
@@ -0,0 +1,215 @@
+import json
+import os
+import pathlib
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from commands import clients
+from commands.listing import iter_resources
+
+# resource types whose IDs are saved, with function that returns value of name tag expected for the saved name
+EXPECTED_NAME_TAGS = {
+    "vpc": lambda name: name,
+    "subnet": lambda name: name.split("/")[-1],
+    "route-table": lambda name: name.split("/")[-1],
+    "security-group": lambda name: f"{name.replace('_', '-')}-sg",
+    "internet-gateway": lambda name: f"{name.replace('_', '-')}-igw",
+    "instance": lambda name: name.split("/")[-1],
+}
+MAX_FILTER_VALUES = 200  # number of values of a filter is limited to 200
+VERSION = 2  # entries are grouped by profile and region since version 2
+
+_path: Optional[pathlib.Path] = None
+_resources: Dict[str, Dict[str, Dict[str, Dict[str, dict]]]] = {}  # profile -> region -> type -> name -> entry
+_verified_scopes: Set[Tuple[str, str]] = set()
+_lock = threading.RLock()
+
+
+def configure(path: Optional[str]):
+    """
+    Enable local state store saved as JSON file in given path, or disable it if path is None. IDs of resources created
+    by this project are recorded in the file, so following runs skip describe calls to resolve them by name. Files of
+    older version are ignored, since their entries are not bound to profile and may belong to another account.
+    :param path: path to JSON file of state store
+    :return: None
+    """
+    global _path, _resources
+    with _lock:
+        if (None if path is None else pathlib.Path(path).resolve()) == _path:
+            return  # entries in memory are already up to date with the file
+        _verified_scopes.clear()
+        if path is None:
+            _path, _resources = None, {}
+            return
+        _path = pathlib.Path(path).resolve()
+        _resources = {}
+        if _path.exists():
+            with open(_path) as file:
+                content = json.load(file)
+            if content.get("version") == VERSION:
+                _resources = content.get("resources", {})
+
+
+def lookup(ec2_client, resource_type: str, name: str) -> Optional[str]:
+    """
+    Find ID of resource recorded in state store. Recorded entries of the profile and region are verified before their
+    first use in the process, so stale entries are never returned.
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, in the form used as key of cache
+    :return: ID of resource, or None if state store is disabled or the entry is missing
+    """
+    scope = _scope(ec2_client)
+    with _lock:
+        if _path is None or resource_type not in EXPECTED_NAME_TAGS:
+            return None
+        if scope not in _verified_scopes:
+            _verify(ec2_client)
+            _verified_scopes.add(scope)
+        entry = _scope_entries(ec2_client).get(resource_type, {}).get(name)
+    return None if entry is None else entry["id"]
+
+
+def record(ec2_client, resource_type: str, name: str, resource_id: str, arn: Optional[str] = None):
+    """
+    Record ID(and ARN if known) of resource in state store
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, in the form used as key of cache
+    :param resource_id: ID of resource
+    :param arn: ARN of resource
+    :return: None
+    """
+    with _lock:
+        if _path is None or resource_type not in EXPECTED_NAME_TAGS:
+            return
+        profile_name, region_name = _scope(ec2_client)
+        entries = _resources.setdefault(profile_name, {}).setdefault(region_name, {}).setdefault(resource_type, {})
+        entry = {"id": resource_id, "arn": arn or entries.get(name, {}).get("arn")}
+        if entries.get(name) != entry:
+            entries[name] = entry
+            _save()
+
+
+def forget(ec2_client, resource_type: str, name: str):
+    """
+    Remove entry of resource from state store
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param name: name of resource, in the form used as key of cache
+    :return: None
+    """
+    with _lock:
+        if _path is None:
+            return
+        entries = _scope_entries(ec2_client).get(resource_type, {})
+        if entries.pop(name, None) is not None:
+            _save()
+
+
+def forget_ids(ec2_client, resource_type: str, resource_ids: Set[str]):
+    """
+    Remove entries of resources from state store by their IDs, whatever names they are recorded with
+    :param ec2_client: EC2 client created by boto3 session
+    :param resource_type: type of resource(ex. 'vpc', 'subnet', 'route-table')
+    :param resource_ids: IDs of resources
+    :return: None
+    """
+    with _lock:
+        if _path is None:
+            return
+        entries = _scope_entries(ec2_client).get(resource_type, {})
+        names = [name for name, entry in entries.items() if entry["id"] in resource_ids]
+        for name in names:
+            del entries[name]
+        if names:
+            _save()
+
+
+def build_arn(ec2_client, owner_id: str, resource_type: str, resource_id: str) -> str:
+    """
+    Build ARN of EC2 resource
+    :param ec2_client: EC2 client created by boto3 session
+    :param owner_id: ID of AWS account that owns the resource
+    :param resource_type: type of resource in ARN(ex. 'vpc', 'route-table')
+    :param resource_id: ID of resource
+    :return: ARN of resource
+    """
+    return f"arn:aws:ec2:{ec2_client.meta.region_name}:{owner_id}:{resource_type}/{resource_id}"
+
+
+def _verify(ec2_client):
+    """
+    Drop entries of profile and region of the client whose resource no longer exists or is renamed. Every entry is
+    checked by value of its name tag fetched with single paginated describe_tags call, and instances are additionally
+    checked not to be terminated with single describe_instances call.
+    :param ec2_client: EC2 client created by boto3 session
+    :return: None
+    """
+    region_entries = _scope_entries(ec2_client)
+    resource_ids = [entry["id"] for entries in region_entries.values() for entry in entries.values()]
+    if not resource_ids:
+        return
+    name_tags = {}
+    for index in range(0, len(resource_ids), MAX_FILTER_VALUES):
+        name_tags.update({
+            tag["ResourceId"]: tag["Value"]
+            for tag in iter_resources(ec2_client, "describe_tags", Filters=[
+                {"Name": "resource-id", "Values": resource_ids[index:index + MAX_FILTER_VALUES]},
+                {"Name": "key", "Values": ["Name"]},
+            ])
+        })
+    instance_ids = [entry["id"] for entry in region_entries.get("instance", {}).values()]
+    if instance_ids:
+        live_instance_ids = {
+            instance["InstanceId"]
+            for index in range(0, len(instance_ids), MAX_FILTER_VALUES)
+            for instance in iter_resources(ec2_client, "describe_instances", Filters=[
+                {"Name": "instance-id", "Values": instance_ids[index:index + MAX_FILTER_VALUES]},
+                {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+            ])
+        }
+        name_tags = {
+            resource_id: name for resource_id, name in name_tags.items()
+            if not resource_id.startswith("i-") or resource_id in live_instance_ids
+        }
+    is_changed = False
+    for resource_type, entries in region_entries.items():
+        for name in list(entries):
+            if name_tags.get(entries[name]["id"]) != EXPECTED_NAME_TAGS[resource_type](name):
+                del entries[name]
+                is_changed = True
+    if is_changed:
+        _save()
+
+
+def _scope(ec2_client) -> Tuple[str, str]:
+    """
+    Get profile and region that entries recorded through the client belong to. Same names may refer to resources of
+    different accounts when commands of several profiles share the process(ex. in shell), as in keys of cache.
+    :param ec2_client: EC2 client created by boto3 session
+    :return: tuple of profile name(empty string for default credentials) and region name
+    """
+    return clients.profile_of(ec2_client) or "", ec2_client.meta.region_name
+
+
+def _scope_entries(ec2_client) -> Dict[str, Dict[str, dict]]:
+    """
+    Get entries recorded in profile and region of the client
+    :param ec2_client: EC2 client created by boto3 session
+    :return: dictionary of resource type to dictionary of name to entry
+    """
+    profile_name, region_name = _scope(ec2_client)
+    return _resources.get(profile_name, {}).get(region_name, {})
+
+
+def _save():
+    """
+    Write state store into its file. File is replaced at once to keep it intact even if process is interrupted.
+    :return: None
+    """
+    _path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = _path.with_name(f"{_path.name}.tmp")
+    with open(temp_path, "w") as file:
+        json.dump({"version": VERSION, "resources": _resources}, file, indent=2, sort_keys=True)
+    os.replace(temp_path, _path)
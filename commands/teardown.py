@@ -0,0 +1,209 @@
+import functools
+from typing import Any, Callable, List, Sequence, Tuple
+
+from commands import cache, topology
+from commands.dag import run_steps
+from commands.listing import list_resources
+from commands.waiter import Schedule, wait_for_instance_state
+
+Step = Tuple[str, Callable[[], Any], Sequence[str]]
+
+
+def plan_destroy(
+        ec2_client,
+        current_topology: topology.Topology,
+        addresses: List[dict],
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+) -> List[Step]:
+    """
+    Compute steps to delete every resource within VPC. Steps form a graph ordered as
+    instances -> elastic IPs -> route table associations -> route tables -> subnets -> security groups -> internet
+    gateways -> VPC, where each step depends only on steps that delete resources it is actually blocked by. Therefore,
+    waiting for termination of instances in a subnet blocks deletion of that subnet only, not of other subnets.
+    :param ec2_client: EC2 client created by boto3 session
+    :param current_topology: snapshot of VPC topology
+    :param addresses: elastic IPs associated with instances within the VPC
+    :param schedule: polling schedule to wait for termination of instances
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of tuple of step name, function without argument and names of steps it depends on
+    """
+    steps: List[Step] = []
+    instance_step_of, instances_step_of_subnet = {}, {}
+    for subnet_id, instances in current_topology.instances_of_subnet.items():
+        step_name = f"instances:{topology.name_of(current_topology.subnets.get(subnet_id, {})) or subnet_id}"
+        instance_ids = [instance["InstanceId"] for instance in instances]
+        steps.append((
+            step_name,
+            functools.partial(_terminate_instances, ec2_client, instance_ids, schedule, wait_mode),
+            [],
+        ))
+        instance_step_of.update({instance_id: step_name for instance_id in instance_ids})
+        instances_step_of_subnet[subnet_id] = step_name
+    instance_steps = list(instances_step_of_subnet.values())
+
+    address_steps = []
+    for address in addresses:
+        step_name = f"elastic-ip:{topology.name_of(address) or address['PublicIp']}"
+        steps.append((
+            step_name,
+            functools.partial(ec2_client.release_address, AllocationId=address["AllocationId"]),
+            [instance_step_of[address["InstanceId"]]] if address.get("InstanceId") in instance_step_of else [],
+        ))
+        address_steps.append(step_name)
+
+    association_step_of = {}
+    route_table_steps = []
+    for rt_id, rt_info in current_topology.route_tables.items():
+        associations = rt_info.get("Associations", [])
+        if any(association.get("Main") for association in associations):
+            continue  # main route table is deleted along with VPC
+        association_steps = []
+        for association in associations:
+            if "SubnetId" not in association:
+                continue
+            subnet_info = current_topology.subnets.get(association["SubnetId"], {})
+            subnet_label = topology.name_of(subnet_info) or association["SubnetId"]
+            step_name = f"association:{subnet_label}"
+            steps.append((
+                step_name,
+                functools.partial(
+                    ec2_client.disassociate_route_table,
+                    AssociationId=association["RouteTableAssociationId"],
+                ),
+                [],
+            ))
+            association_step_of[association["SubnetId"]] = step_name
+            association_steps.append(step_name)
+        step_name = f"route-table:{topology.name_of(rt_info) or rt_id}"
+        steps.append((
+            step_name,
+            functools.partial(ec2_client.delete_route_table, RouteTableId=rt_id),
+            association_steps,
+        ))
+        route_table_steps.append(step_name)
+
+    subnet_steps = []
+    for subnet_id, subnet_info in current_topology.subnets.items():
+        step_name = f"subnet:{topology.name_of(subnet_info) or subnet_id}"
+        dependencies = [
+            step_of[subnet_id] for step_of in (instances_step_of_subnet, association_step_of) if subnet_id in step_of
+        ]
+        steps.append((step_name, functools.partial(ec2_client.delete_subnet, SubnetId=subnet_id), dependencies))
+        subnet_steps.append(step_name)
+
+    security_group_steps = []
+    for group_name, sg_info in current_topology.security_groups.items():
+        if group_name == "default":
+            continue  # default security group is deleted along with VPC
+        step_name = f"security-group:{group_name}"
+        steps.append((
+            step_name,
+            functools.partial(ec2_client.delete_security_group, GroupId=sg_info["GroupId"]),
+            instance_steps,
+        ))
+        security_group_steps.append(step_name)
+
+    igw_steps = []
+    for igw_info in current_topology.internet_gateways:
+        step_name = f"internet-gateway:{topology.name_of(igw_info) or igw_info['InternetGatewayId']}"
+        steps.append((
+            step_name,
+            functools.partial(
+                _delete_internet_gateway,
+                ec2_client,
+                igw_info["InternetGatewayId"],
+                current_topology.vpc_id,
+            ),
+            instance_steps + address_steps,
+        ))
+        igw_steps.append(step_name)
+
+    steps.append((
+        "vpc",
+        functools.partial(ec2_client.delete_vpc, VpcId=current_topology.vpc_id),
+        route_table_steps + subnet_steps + security_group_steps + igw_steps,
+    ))
+    step_names = [name for name, _, _ in steps]
+    duplicate_names = sorted({name for name in step_names if step_names.count(name) > 1})
+    if duplicate_names:
+        raise ValueError(f"Resources of steps {duplicate_names} are ambiguous by their name tag value")
+    return steps
+
+
+def destroy_workspace(
+        ec2_client,
+        vpc_name: str,
+        schedule: Schedule = Schedule(),
+        wait_mode: str = "describe",
+        dry_run: bool = False,
+) -> List[str]:
+    """
+    Delete VPC and every resource that depends on it. Resources are discovered by one concurrent round of describe calls
+    and deleted as a graph, so independent branches(ex. subnets) are deleted in parallel.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC to destroy
+    :param schedule: polling schedule to wait for termination of instances
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :param dry_run: whether to compute steps without running them
+    :return: names of steps that are(or would be) run
+    """
+    # instances still shutting down block deletion of their subnets as well, so they are waited for like the others
+    current_topology = topology.load_topology(
+        ec2_client, vpc_name, instance_states=topology.LIVE_INSTANCE_STATES + ("shutting-down",)
+    )
+    instance_ids = [instance["InstanceId"] for instance in current_topology.instances]
+    addresses = list_resources(
+        ec2_client, "describe_addresses", Filters=[{"Name": "instance-id", "Values": instance_ids}]
+    ) if instance_ids else []
+    steps = plan_destroy(ec2_client, current_topology, addresses, schedule, wait_mode)
+    if not dry_run:
+        run_steps({name: (function, deps) for name, function, deps in steps})
+        _forget_resolutions(ec2_client, vpc_name, current_topology, addresses)
+    return [name for name, _, _ in steps]
+
+
+def _terminate_instances(ec2_client, instance_ids: List[str], schedule: Schedule, wait_mode: str) -> List[dict]:
+    """
+    Terminate instances with single TerminateInstances call and wait until every one of them is terminated
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of InstanceId
+    :param schedule: polling schedule to wait for state change
+    :param wait_mode: one of ('describe', 'status', 'botocore') to choose how state is polled
+    :return: list of state transitions observed while waiting
+    """
+    ec2_client.terminate_instances(InstanceIds=instance_ids)
+    return wait_for_instance_state(ec2_client, instance_ids, "terminated", schedule, wait_mode)
+
+
+def _delete_internet_gateway(ec2_client, igw_id: str, vpc_id: str):
+    """
+    Detach internet gateway from VPC and delete it
+    :param ec2_client: EC2 client created by boto3 session
+    :param igw_id: InternetGatewayId
+    :param vpc_id: VpcId
+    :return: None
+    """
+    ec2_client.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+    ec2_client.delete_internet_gateway(InternetGatewayId=igw_id)
+
+
+def _forget_resolutions(ec2_client, vpc_name: str, current_topology: topology.Topology, addresses: Sequence[dict]):
+    """
+    Remove name-to-ID resolutions of destroyed resources from cache
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of destroyed VPC
+    :param current_topology: snapshot of destroyed VPC topology
+    :param addresses: released elastic IPs
+    :return: None
+    """
+    for resource_type in ("vpc", "vpc-cidr", "security-group", "internet-gateway"):
+        cache.invalidate(ec2_client, resource_type, vpc_name)
+    for subnet_name in current_topology.subnets_by_name:
+        cache.invalidate(ec2_client, "subnet", f"{vpc_name}/{subnet_name}")
+    cache.invalidate_ids(ec2_client, "instance", [instance["InstanceId"] for instance in current_topology.instances])
+    for rt_name in current_topology.route_tables_by_name:
+        cache.invalidate(ec2_client, "route-table", f"{vpc_name}/{rt_name}")
+    for address in addresses:
+        if topology.name_of(address) is not None:
+            cache.invalidate(ec2_client, "elastic-ip", topology.name_of(address))
@@ -0,0 +1,230 @@
+import collections
+import dataclasses
+import functools
+from typing import Dict, List, Optional, Sequence
+
+from commands import cache
+from commands.dag import run_steps
+from commands.listing import list_resources
+
+LIVE_INSTANCE_STATES = ("pending", "running", "stopping", "stopped")  # instances that are not terminated
+
+
+@dataclasses.dataclass
+class Topology:
+    """
+    Snapshot of every resource within a VPC, indexed by name tag, ID and association between resources
+    """
+    vpc: dict
+    subnets: Dict[str, dict]
+    route_tables: Dict[str, dict]
+    security_groups: Dict[str, dict]
+    internet_gateways: List[dict]
+    instances: List[dict]
+    subnets_by_name: Dict[str, List[dict]] = dataclasses.field(default_factory=dict)
+    route_tables_by_name: Dict[str, List[dict]] = dataclasses.field(default_factory=dict)
+    route_table_of_subnet: Dict[str, dict] = dataclasses.field(default_factory=dict)
+    instances_of_subnet: Dict[str, List[dict]] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self):
+        self.subnets_by_name = _group_by_name(self.subnets.values())
+        self.route_tables_by_name = _group_by_name(self.route_tables.values())
+        for rt_info in self.route_tables.values():
+            for association in rt_info.get("Associations", []):
+                if "SubnetId" in association:
+                    self.route_table_of_subnet[association["SubnetId"]] = rt_info
+        instances_of_subnet = collections.defaultdict(list)
+        for instance_info in self.instances:
+            instances_of_subnet[instance_info.get("SubnetId")].append(instance_info)
+        self.instances_of_subnet = dict(instances_of_subnet)
+
+    @property
+    def vpc_id(self) -> str:
+        return self.vpc["VpcId"]
+
+    def subnet(self, subnet_name: str) -> dict:
+        return _only(self.subnets_by_name.get(subnet_name, []), "Subnet", subnet_name)
+
+    def route_table(self, rt_name: str) -> dict:
+        return _only(self.route_tables_by_name.get(rt_name, []), "Route table", rt_name)
+
+    def security_group(self, sg_name: str) -> dict:
+        if sg_name not in self.security_groups:
+            raise ValueError(f"Security group with GroupName '{sg_name}' does not exists")
+        return self.security_groups[sg_name]
+
+    def internet_gateway_id(self) -> str:
+        if not self.internet_gateways:
+            raise ValueError(f"Internet gateway attached to VPC '{self.vpc_id}' is not generated")
+        return self.internet_gateways[0]["InternetGatewayId"]
+
+    def association_id(self, subnet_name: str, rt_name: str) -> str:
+        """
+        Find ID of association between route table and subnet
+        :param subnet_name: name of subnet
+        :param rt_name: name of route table
+        :return: RouteTableAssociationId
+        """
+        subnet_id = self.subnet(subnet_name)["SubnetId"]
+        for association in self.route_table(rt_name).get("Associations", []):
+            if association.get("SubnetId") == subnet_id:
+                return association["RouteTableAssociationId"]
+        raise ValueError(f"Route table '{rt_name}' is not associated with subnet '{subnet_name}'")
+
+
+def load_topology(
+        ec2_client,
+        vpc_name: str,
+        vpc_info: Optional[dict] = None,
+        instance_states: Sequence[str] = LIVE_INSTANCE_STATES,
+) -> Topology:
+    """
+    Fetch every subnet, route table, security group, internet gateway and instance within VPC in one concurrent round of
+    describe calls. Name-to-ID resolutions found in the snapshot are saved in cache, so following fetch_* calls of
+    commands are answered without describe call.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC to load
+    :param vpc_info: description of the VPC if it is already fetched
+    :param instance_states: states of instances to include in the snapshot
+    :return: snapshot of VPC topology
+    """
+    if vpc_info is None:
+        vpc_info = _only(
+            list_resources(ec2_client, "describe_vpcs", limit=2, Filters=[{"Name": "tag:Name", "Values": [vpc_name]}]),
+            "VPC",
+            vpc_name,
+        )
+    vpc_filter = [{"Name": "vpc-id", "Values": [vpc_info["VpcId"]]}]
+    fetch = functools.partial(list_resources, ec2_client)
+    results = run_steps({
+        "subnets": (functools.partial(fetch, "describe_subnets", Filters=vpc_filter), []),
+        "route_tables": (functools.partial(fetch, "describe_route_tables", Filters=vpc_filter), []),
+        "security_groups": (functools.partial(fetch, "describe_security_groups", Filters=vpc_filter), []),
+        "internet_gateways": (
+            functools.partial(
+                fetch,
+                "describe_internet_gateways",
+                Filters=[{"Name": "attachment.vpc-id", "Values": [vpc_info["VpcId"]]}],
+            ),
+            [],
+        ),
+        "instances": (
+            functools.partial(
+                fetch,
+                "describe_instances",
+                Filters=vpc_filter + [{"Name": "instance-state-name", "Values": list(instance_states)}],
+            ),
+            [],
+        ),
+    })
+    return build_topology(ec2_client, vpc_name, vpc_info, **results)
+
+
+def build_topology(
+        ec2_client,
+        vpc_name: str,
+        vpc_info: dict,
+        subnets: List[dict],
+        route_tables: List[dict],
+        security_groups: List[dict],
+        internet_gateways: List[dict],
+        instances: List[dict],
+) -> Topology:
+    """
+    Build snapshot of VPC from descriptions of resources that are already fetched(ex. selected by names in the same
+    round of describe calls as the VPC itself). Resources of other VPCs are dropped, and name-to-ID resolutions found in
+    the snapshot are saved in cache.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC
+    :param vpc_info: description of the VPC
+    :param subnets: descriptions of subnets
+    :param route_tables: descriptions of route tables
+    :param security_groups: descriptions of security groups
+    :param internet_gateways: descriptions of internet gateways
+    :param instances: descriptions of instances that are not terminated
+    :return: snapshot of VPC topology
+    """
+    vpc_id = vpc_info["VpcId"]
+    topology = Topology(
+        vpc=vpc_info,
+        subnets={info["SubnetId"]: info for info in subnets if info["VpcId"] == vpc_id},
+        route_tables={info["RouteTableId"]: info for info in route_tables if info["VpcId"] == vpc_id},
+        security_groups={info["GroupName"]: info for info in security_groups if info["VpcId"] == vpc_id},
+        internet_gateways=[
+            info for info in internet_gateways
+            if any(attachment["VpcId"] == vpc_id for attachment in info.get("Attachments", []))
+        ],
+        instances=[info for info in instances if info.get("VpcId") == vpc_id],
+    )
+    _store_resolutions(ec2_client, vpc_name, topology)
+    return topology
+
+
+def _store_resolutions(ec2_client, vpc_name: str, topology: Topology):
+    """
+    Save name-to-ID resolutions of topology in cache. Ambiguous names are skipped to let fetch_* methods report them.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC that topology describes
+    :param topology: snapshot of VPC topology
+    :return: None
+    """
+    cache.store(ec2_client, "vpc", vpc_name, topology.vpc_id)
+    cache.store(ec2_client, "vpc-cidr", vpc_name, topology.vpc["CidrBlock"])
+    sg_info = topology.security_groups.get(f"{vpc_name.replace('_', '-')}-sg")
+    if sg_info is not None:
+        cache.store(ec2_client, "security-group", vpc_name, sg_info["GroupId"])
+    if topology.internet_gateways:
+        cache.store(ec2_client, "internet-gateway", vpc_name, topology.internet_gateways[0]["InternetGatewayId"])
+    for subnet_name, subnets in topology.subnets_by_name.items():
+        if len(subnets) == 1:
+            cache.store(ec2_client, "subnet", f"{vpc_name}/{subnet_name}", subnets[0]["SubnetId"])
+            instances_by_name = _group_by_name(topology.instances_of_subnet.get(subnets[0]["SubnetId"], []))
+            for instance_name, instances in instances_by_name.items():
+                cache.store(
+                    ec2_client, "instance", f"{vpc_name}/{subnet_name}/{instance_name}", instances[0]["InstanceId"]
+                )
+    for rt_name, route_tables in topology.route_tables_by_name.items():
+        if len(route_tables) == 1:
+            cache.store(ec2_client, "route-table", f"{vpc_name}/{rt_name}", route_tables[0]["RouteTableId"])
+
+
+def _group_by_name(resources) -> Dict[str, List[dict]]:
+    """
+    Group resources by value of their name tag
+    :param resources: iterable of resource information that may contain 'Tags'
+    :return: dictionary of name to list of resources with the name
+    """
+    groups = collections.defaultdict(list)
+    for resource in resources:
+        name = name_of(resource)
+        if name is not None:
+            groups[name].append(resource)
+    return dict(groups)
+
+
+def name_of(resource: dict) -> Optional[str]:
+    """
+    Get value of name tag of resource
+    :param resource: resource information that may contain 'Tags'
+    :return: name of resource, or None if it is not named
+    """
+    for tag in resource.get("Tags", []):
+        if tag["Key"] == "Name":
+            return tag["Value"]
+    return None
+
+
+def _only(resources: List[dict], resource_label: str, name: str) -> dict:
+    """
+    Check one-to-one correspondence between resource and its name, as explained in `fetch_vpc_id` method
+    :param resources: list of resources that have given name
+    :param resource_label: label of resource type used in error message
+    :param name: name of resource
+    :return: the only resource with the name
+    """
+    if len(resources) == 1:
+        return resources[0]
+    elif len(resources) == 0:
+        raise ValueError(f"{resource_label} with name '{name}' does not exists")
+    else:
+        raise ValueError(f"{resource_label} whose name tag value is '{name}' is ambiguous")
@@ -1,14 +1,19 @@
-from typing import List
+from typing import List, Optional, Tuple
 
+from commands import cache, state
+from commands.handles import InternetGateway, RouteTable, SecurityGroup, Subnet, Vpc
+from commands.listing import iter_resources, list_resources
+from commands.topology import Topology
 
-def create_vpc(ec2_client, vpc_name: str, vpc_cidr: str):
+
+def create_vpc(ec2_client, vpc_name: str, vpc_cidr: str) -> Vpc:
     """
     Create VPC whose value for name tag is vpc_name and covers IP range defined as vpc_cidr(subnet mask: 255.255.0.0).
     Region and account credential is predefined by ec2_client.
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC to be created
     :param vpc_cidr: CIDR notation of IP range with subnet mask 255.255.0.0
-    :return: None
+    :return: handle of created VPC
     """
     response = ec2_client.create_vpc(
         CidrBlock=vpc_cidr,
@@ -20,67 +25,183 @@ def create_vpc(ec2_client, vpc_name: str, vpc_cidr: str):
         ]
     )
     vpc_id = response["Vpc"]["VpcId"]
+    cache.store(
+        ec2_client, "vpc", vpc_name, vpc_id, arn=state.build_arn(ec2_client, response["Vpc"]["OwnerId"], "vpc", vpc_id)
+    )
+    cache.store(ec2_client, "vpc-cidr", vpc_name, response["Vpc"]["CidrBlock"])
     ec2_client.modify_vpc_attribute(
         EnableDnsHostnames={"Value": True},
         VpcId=vpc_id
     )
+    return Vpc(vpc_name, vpc_id)
 
 
 def create_vpc_security_group(
         ec2_client,
         vpc_name: str,
         ingress_ports: List[str],
-):
+) -> SecurityGroup:
     """
     Create default security group within VPC and authorize connections to ingress ports
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC to create security group
     :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
-    :return: ID of security group
+    :return: handle of created security group
     """
     vpc_id = fetch_vpc_id(ec2_client, vpc_name)
     response = ec2_client.create_security_group(
         GroupName=f"{vpc_name.replace('_', '-')}-sg",
         Description="traffic rules over EC2 workspace",
         VpcId=vpc_id,
+        TagSpecifications=[
+            {
+                "ResourceType": "security-group",
+                "Tags": [{"Key": "Name", "Value": f"{vpc_name.replace('_', '-')}-sg"}]
+            }
+        ]
     )
     sg_id = response["GroupId"]
+    cache.store(ec2_client, "security-group", vpc_name, sg_id)
     ec2_client.authorize_security_group_ingress(
         GroupId=sg_id,
         IpPermissions=_parse_ip_permissions(ingress_ports)
     )
+    return SecurityGroup(vpc_name, sg_id)
+
+
+def sync_vpc_security_group_ports(
+        ec2_client,
+        vpc_name: str,
+        ingress_ports: List[str],
+        security_group: Optional[dict] = None,
+) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Make ingress rules of security group within VPC match ingress ports. Rules of the group are read by single describe
+    call, and only the difference is authorized and revoked by single call each. Rules that are not created by this
+    project(ex. other protocol or source) are left untouched.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC of the security group
+    :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
+    :param security_group: description of the security group if it is already read(ex. by `load_topology`)
+    :return: tuple of authorized port ranges and revoked port ranges
+    """
+    if security_group is None:
+        security_group = _describe_vpc_security_group(ec2_client, vpc_name)
+        cache.store(ec2_client, "security-group", vpc_name, security_group["GroupId"])
+    authorized, revoked = diff_security_group_ports(security_group, ingress_ports)
+    if authorized:  # authorized ahead of revoke, so ports kept open in a wider range are never closed in between
+        ec2_client.authorize_security_group_ingress(
+            GroupId=security_group["GroupId"],
+            IpPermissions=[_build_ip_permission(from_port, to_port) for from_port, to_port in authorized],
+        )
+    if revoked:
+        ec2_client.revoke_security_group_ingress(
+            GroupId=security_group["GroupId"],
+            IpPermissions=[
+                {"FromPort": from_port, "ToPort": to_port, "IpProtocol": "tcp", "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+                for from_port, to_port in revoked
+            ],
+        )
+    return authorized, revoked
+
+
+def diff_security_group_ports(
+        security_group: dict,
+        ingress_ports: List[str],
+) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Compare port ranges open to any address in security group with ingress ports merged into disjoint ranges
+    :param security_group: description of security group
+    :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
+    :return: tuple of port ranges to be authorized and port ranges to be revoked
+    """
+    current = set(_open_port_ranges(security_group))
+    requested = merge_port_ranges(ingress_ports)
+    return [port_range for port_range in requested if port_range not in current], sorted(current - set(requested))
+
+
+def fetch_vpc_ingress_ports(ec2_client, vpc_name: str) -> List[Tuple[int, int]]:
+    """
+    Fetch port ranges open to any address in security group of VPC
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC for the security group
+    :return: sorted list of (FromPort, ToPort) ranges
+    """
+    return sorted(_open_port_ranges(_describe_vpc_security_group(ec2_client, vpc_name)))
+
+
+def merge_port_ranges(ingress_ports: List[str]) -> List[Tuple[int, int]]:
+    """
+    Parse ingress ports and merge overlapping or adjacent ranges(ex. ['22', '20-25', '26'] -> [(20, 26)]). If ingress
+    port string is:
+        * single integer, both FromPort and ToPort
+        * string that contains hyphen between two integers,
+        * otherwise, return error since the value is not in expected format
+    :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
+    :return: sorted list of disjoint (FromPort, ToPort) ranges
+    """
+    port_ranges = []
+    for ingress_port in ingress_ports:
+        ingress_port = ingress_port.strip()
+        try:
+            from_port = int(ingress_port)
+            to_port = int(ingress_port)
+        except ValueError:  # ValueError with message 'invalid literal for int() with base 10'
+            if "-" in ingress_port:
+                from_port, to_port = map(int, ingress_port.split("-"))
+            else:
+                raise ValueError(
+                    f"ingress_port should be either integer or contains '-' as separator; got {ingress_port}"
+                )
+        if not 0 <= from_port <= to_port <= 65535:
+            raise ValueError(f"ingress_port should be ascending range of ports within 0 to 65535; got {ingress_port}")
+        port_ranges.append((from_port, to_port))
+    merged = []
+    for from_port, to_port in sorted(port_ranges):
+        if merged and from_port <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], to_port))
+        else:
+            merged.append((from_port, to_port))
+    return merged
 
 
-def create_vpc_internet_gateway(ec2_client, vpc_name: str):
+def internet_gateway_name(vpc_name: str) -> str:
+    """
+    Get name of internet gateway created for VPC
+    :param vpc_name: name of VPC
+    :return: value of name tag of internet gateway
+    """
+    return f"{vpc_name.replace('_', '-')}-igw"
+
+
+def create_vpc_internet_gateway(ec2_client, vpc_name: str) -> InternetGateway:
     """
     Create internet gateway and attach it to a VPC
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC to attach created internet gateway
-    :return: None
+    :return: handle of created internet gateway
     """
-    igw_id = ec2_client.create_internet_gateway(
+    igw_info = ec2_client.create_internet_gateway(
         TagSpecifications=[
             {
                 "ResourceType": "internet-gateway",
-                "Tags": [{"Key": "Name", "Value": f"{vpc_name.replace('_', '-')}-igw"}]
+                "Tags": [{"Key": "Name", "Value": internet_gateway_name(vpc_name)}]
             }
         ]
-    )["InternetGateway"]["InternetGatewayId"]
-    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
-    ec2_client.attach_internet_gateway(
-        InternetGatewayId=igw_id, VpcId=vpc_id
-    )
+    )["InternetGateway"]
+    return _attach_internet_gateway(ec2_client, vpc_name, igw_info)
 
 
 def create_subnet(
         ec2_client,
         vpc_name: str,
         subnet_name: str,
-        cidr_substitute: str,
+        cidr_substitute: Optional[str],
         region_name: str,
         az_postfix: str,
         is_public: bool,
-):
+        subnet_cidr: Optional[str] = None,
+) -> Subnet:
     """
     Create a subnet within a VPC. If is_public is set to True, then subnet attribute 'MapPubilcIpOnLaunch' is modified
     to True to assign public IPv4 address to instance created within the subnet.
@@ -91,15 +212,16 @@ def create_subnet(
     :param region_name: name of region
     :param az_postfix: one of ('a', 'b', 'c', 'd') used to specify availability zone within current region
     :param is_public: whether subnet has to be connected to internet
-    :return: None
+    :param subnet_cidr: CIDR block of subnet(ex. assigned by CidrAllocator), used instead of cidr_substitute if given
+    :return: handle of created subnet
     """
     vpc_id = fetch_vpc_id(ec2_client, vpc_name)
-    vpc_info = ec2_client.describe_vpcs(
-        Filters=[{"Name": "vpc-id", "Values": [vpc_id]}]
-    )["Vpcs"][0]
-    subnet_cidr = vpc_info["CidrBlock"].split(".")[:-1]  # ex. '172.50.0.0/16' -> ['172', '50', '0']
-    subnet_cidr[2] = cidr_substitute  # ex. ['172', '50', '0'] -> ['172', '50', '100']
-    subnet_cidr = f"{'.'.join(subnet_cidr)}.0/24"  # ex. ['172', '50', '100'] -> '172.50.100.0/24'
+    if subnet_cidr is None:
+        if cidr_substitute is None:
+            raise ValueError("Either cidr_substitute or subnet_cidr must be given")
+        subnet_cidr = fetch_vpc_cidr(ec2_client, vpc_name).split(".")[:-1]  # ex. '172.50.0.0/16' -> ['172', '50', '0']
+        subnet_cidr[2] = cidr_substitute  # ex. ['172', '50', '0'] -> ['172', '50', '100']
+        subnet_cidr = f"{'.'.join(subnet_cidr)}.0/24"  # ex. ['172', '50', '100'] -> '172.50.100.0/24'
     response = ec2_client.create_subnet(
         CidrBlock=subnet_cidr,
         VpcId=vpc_id,
@@ -112,6 +234,7 @@ def create_subnet(
         ]
     )
     subnet_id = response["Subnet"]["SubnetId"]
+    cache.store(ec2_client, "subnet", f"{vpc_name}/{subnet_name}", subnet_id, arn=response["Subnet"]["SubnetArn"])
     if is_public:
         ec2_client.modify_subnet_attribute(
             SubnetId=subnet_id,
@@ -122,6 +245,7 @@ def create_subnet(
             SubnetId=subnet_id,
             MapPublicIpOnLaunch={"Value": False},
         )
+    return Subnet(vpc_name, subnet_name, subnet_id)
 
 
 def create_route_table(
@@ -129,14 +253,14 @@ def create_route_table(
         vpc_name: str,
         rt_name: str,
         is_public: bool,
-):
+) -> RouteTable:
     """
     Create basic route table that allows traffic from VPC. If `is_public` is set to True, add route to internet gateway
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC to create route table
     :param rt_name: name of route table to be created
     :param is_public: whether route to VPC internet gateway has to be added in the table
-    :return: None
+    :return: handle of created route table
     """
     vpc_id = fetch_vpc_id(ec2_client, vpc_name)
     response = ec2_client.create_route_table(
@@ -148,16 +272,17 @@ def create_route_table(
             }
         ]
     )
+    rt_id = response["RouteTable"]["RouteTableId"]
+    cache.store(
+        ec2_client,
+        "route-table",
+        f"{vpc_name}/{rt_name}",
+        rt_id,
+        arn=state.build_arn(ec2_client, response["RouteTable"]["OwnerId"], "route-table", rt_id),
+    )
     if is_public:
-        igw_info = ec2_client.describe_internet_gateways(
-            Filters=[{"Name": "attachment.vpc-id", "Values": [vpc_id]}]
-        )["InternetGateways"]
-        assert len(igw_info) > 0, f"Internet gateway attached to VPC '{vpc_name}' is not generated"
-        ec2_client.create_route(
-            DestinationCidrBlock="0.0.0.0/0",
-            GatewayId=igw_info[0]["InternetGatewayId"],
-            RouteTableId=response["RouteTable"]["RouteTableId"],
-        )
+        create_internet_route(ec2_client, vpc_name, rt_id)
+    return RouteTable(vpc_name, rt_name, rt_id)
 
 
 def create_route_table_subnet_association(
@@ -172,16 +297,147 @@ def create_route_table_subnet_association(
     :param vpc_name: name of VPC where route table is created
     :param subnet_name: name of subnet
     :param rt_name: name of route table
-    :return:
+    :return: None
+    """
+    associate_route_table(
+        ec2_client, fetch_route_table(ec2_client, vpc_name, rt_name), fetch_subnet(ec2_client, vpc_name, subnet_name)
+    )
+
+
+def associate_route_table(ec2_client, route_table: RouteTable, subnet: Subnet):
+    """
+    Associate route table to subnet given as handles(ex. returned by create functions), without any lookup
+    :param ec2_client: EC2 client created by boto3 session
+    :param route_table: handle of route table
+    :param subnet: handle of subnet
+    :return: None
+    """
+    ec2_client.associate_route_table(RouteTableId=route_table.route_table_id, SubnetId=subnet.subnet_id)
+
+
+def create_internet_route(ec2_client, vpc_name: str, rt_id: str):
+    """
+    Add route to internet gateway of VPC into route table
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where internet gateway is attached
+    :param rt_id: ID of route table
+    :return: None
+    """
+    ec2_client.create_route(
+        DestinationCidrBlock="0.0.0.0/0",
+        GatewayId=_fetch_internet_gateway_id(ec2_client, vpc_name),
+        RouteTableId=rt_id,
+    )
+
+
+def recover_vpc_security_group(ec2_client, vpc_name: str, ingress_ports: List[str]) -> SecurityGroup:
+    """
+    Find security group whose creation was interrupted, and authorize ingress ports it may have missed
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC of the security group
+    :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
+    :return: handle of security group
+    """
+    sync_vpc_security_group_ports(ec2_client, vpc_name, ingress_ports)  # ValueError if it is missing
+    return fetch_vpc_security_group(ec2_client, vpc_name)
+
+
+def recover_vpc_internet_gateway(ec2_client, vpc_name: str) -> InternetGateway:
+    """
+    Find internet gateway whose creation was interrupted, and attach it to VPC if it was created but not attached
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC of the internet gateway
+    :return: handle of internet gateway
+    """
+    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
+    igw_info = list_resources(
+        ec2_client,
+        "describe_internet_gateways",
+        Filters=[{"Name": "tag:Name", "Values": [internet_gateway_name(vpc_name)]}],
+    )
+    for igw in igw_info:
+        if any(attachment["VpcId"] == vpc_id for attachment in igw.get("Attachments", [])):
+            cache.store(ec2_client, "internet-gateway", vpc_name, igw["InternetGatewayId"])
+            return InternetGateway(vpc_name, igw["InternetGatewayId"])
+    detached = [igw for igw in igw_info if not igw.get("Attachments")]
+    if len(detached) == 0:
+        raise ValueError(f"Internet gateway of VPC '{vpc_name}' is not created")
+    return _attach_internet_gateway(ec2_client, vpc_name, detached[0])
+
+
+def recover_subnet(ec2_client, vpc_name: str, subnet_name: str, is_public: bool) -> Subnet:
+    """
+    Find subnet whose creation was interrupted, and set attribute 'MapPublicIpOnLaunch' it may have missed
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC of the subnet
+    :param subnet_name: name of subnet
+    :param is_public: whether subnet has to be connected to internet
+    :return: handle of subnet
+    """
+    subnet = fetch_subnet(ec2_client, vpc_name, subnet_name)  # ValueError if it is missing
+    ec2_client.modify_subnet_attribute(
+        SubnetId=subnet.subnet_id,
+        MapPublicIpOnLaunch={"Value": bool(is_public)},
+    )
+    return subnet
+
+
+def recover_route_table(ec2_client, vpc_name: str, rt_name: str, is_public: bool) -> RouteTable:
+    """
+    Find route table whose creation was interrupted, and add route to internet gateway if it is missing
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC of the route table
+    :param rt_name: name of route table
+    :param is_public: whether route to VPC internet gateway has to be added in the table
+    :return: handle of route table
+    """
+    route_table = fetch_route_table(ec2_client, vpc_name, rt_name)  # ValueError if it is missing
+    if is_public:
+        rt_info = list_resources(
+            ec2_client,
+            "describe_route_tables",
+            limit=1,
+            Filters=[{"Name": "route-table-id", "Values": [route_table.route_table_id]}],
+        )[0]
+        if not any(route.get("DestinationCidrBlock") == "0.0.0.0/0" for route in rt_info.get("Routes", [])):
+            create_internet_route(ec2_client, vpc_name, route_table.route_table_id)
+    return route_table
+
+
+def recover_route_table_subnet_association(ec2_client, vpc_name: str, subnet_name: str, rt_name: str):
+    """
+    Check whether association of route table to subnet was made before interruption
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where route table is created
+    :param subnet_name: name of subnet
+    :param rt_name: name of route table
+    :return: None, or raise ValueError if subnet is not associated to the route table
     """
     subnet_id = fetch_subnet_id(ec2_client, vpc_name, subnet_name)
-    rt_id = ec2_client.describe_route_tables(
+    rt_info = list_resources(
+        ec2_client,
+        "describe_route_tables",
+        limit=1,
         Filters=[
-            {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
-            {"Name": "tag:Name", "Values": [rt_name]}
-        ]
-    )["RouteTables"][0]["RouteTableId"]
-    ec2_client.associate_route_table(RouteTableId=rt_id, SubnetId=subnet_id)
+            {"Name": "route-table-id", "Values": [fetch_route_table_id(ec2_client, vpc_name, rt_name)]},
+            {"Name": "association.subnet-id", "Values": [subnet_id]},
+        ],
+    )
+    if len(rt_info) == 0:
+        raise ValueError(f"Subnet '{subnet_name}' is not associated to route table '{rt_name}'")
+
+
+def fetch_availability_zone_postfixes(ec2_client, region_name: str) -> List[str]:
+    """
+    Fetch postfixes of availability zones that are available in current region
+    :param ec2_client: EC2 client created by boto3 session
+    :param region_name: name of region
+    :return: list of postfixes(ex. ['a', 'b', 'c'])
+    """
+    zones = iter_resources(
+        ec2_client, "describe_availability_zones", Filters=[{"Name": "state", "Values": ["available"]}]
+    )
+    return sorted(zone["ZoneName"][len(region_name):] for zone in zones if zone["ZoneName"].startswith(region_name))
 
 
 def fetch_vpc_id(ec2_client, vpc_name: str) -> str:
@@ -193,15 +449,58 @@ def fetch_vpc_id(ec2_client, vpc_name: str) -> str:
     :param vpc_name: name of VPC to fetch corresponding ID
     :return: VpcId
     """
-    vpc_info = ec2_client.describe_vpcs(
-        Filters=[{"Name": "tag:Name", "Values": [vpc_name]}]
-    )["Vpcs"]
-    if len(vpc_info) == 1:
-        return vpc_info[0]["VpcId"]
-    elif len(vpc_info) == 0:
-        raise ValueError(f"VPC with name '{vpc_name}' does not exists")
-    else:
-        raise ValueError(f"VPC whose name tag value is '{vpc_name}' is ambiguous")
+    def lookup():
+        vpc_info = list_resources(
+            ec2_client, "describe_vpcs", limit=2, Filters=[{"Name": "tag:Name", "Values": [vpc_name]}]
+        )
+        if len(vpc_info) == 1:
+            cache.store(ec2_client, "vpc-cidr", vpc_name, vpc_info[0]["CidrBlock"])
+            return vpc_info[0]["VpcId"]
+        elif len(vpc_info) == 0:
+            raise ValueError(f"VPC with name '{vpc_name}' does not exists")
+        else:
+            raise ValueError(f"VPC whose name tag value is '{vpc_name}' is ambiguous")
+
+    return cache.resolve(ec2_client, "vpc", vpc_name, lookup)
+
+
+def fetch_vpc(ec2_client, vpc_name: str) -> Vpc:
+    """
+    Fetch handle of VPC, whose ID is resolved as explained in `fetch_vpc_id` method
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC
+    :return: handle of VPC
+    """
+    return Vpc(vpc_name, fetch_vpc_id(ec2_client, vpc_name))
+
+
+def fetch_vpc_cidr(ec2_client, vpc_name: str) -> str:
+    """
+    Fetch CIDR block of VPC. It is usually resolved together with VPC ID, so describe call is made only when VPC ID was
+    resolved without it.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC to fetch CIDR block
+    :return: CidrBlock
+    """
+    def lookup():
+        return list_resources(
+            ec2_client,
+            "describe_vpcs",
+            limit=1,
+            Filters=[{"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]}],
+        )[0]["CidrBlock"]
+
+    return cache.resolve(ec2_client, "vpc-cidr", vpc_name, lookup)
+
+
+def fetch_vpc_security_group(ec2_client, vpc_name: str) -> SecurityGroup:
+    """
+    Fetch handle of default security group of VPC
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC for the security group
+    :return: handle of security group
+    """
+    return SecurityGroup(vpc_name, fetch_vpc_security_group_id(ec2_client, vpc_name))
 
 
 def fetch_vpc_security_group_id(ec2_client, vpc_name: str) -> str:
@@ -211,19 +510,23 @@ def fetch_vpc_security_group_id(ec2_client, vpc_name: str) -> str:
     :param vpc_name: name of VPC for the security group
     :return: GroupId
     """
-    sg_name = f"{vpc_name.replace('_', '-')}-sg"
-    sg_info = ec2_client.describe_security_groups(
-        Filters=[
-            {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
-            {"Name": "group-name", "Values": [sg_name]},
-        ]
-    )["SecurityGroups"]
-    if len(sg_info) == 1:
-        return sg_info[0]["GroupId"]
-    elif len(sg_info) == 0:
-        raise ValueError(f"Security group with GroupName '{sg_name}' does not exists")
-    else:
-        raise ValueError(f"Security group with GroupName '{sg_name}' is ambiguous")
+    return cache.resolve(
+        ec2_client,
+        "security-group",
+        vpc_name,
+        lambda: _describe_vpc_security_group(ec2_client, vpc_name)["GroupId"],
+    )
+
+
+def fetch_subnet(ec2_client, vpc_name: str, subnet_name: str) -> Subnet:
+    """
+    Fetch handle of subnet, whose ID is resolved as explained in `fetch_subnet_id` method
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC that subnet is defined
+    :param subnet_name: name of subnet
+    :return: handle of subnet
+    """
+    return Subnet(vpc_name, subnet_name, fetch_subnet_id(ec2_client, vpc_name, subnet_name))
 
 
 def fetch_subnet_id(ec2_client, vpc_name: str, subnet_name: str) -> str:
@@ -234,18 +537,63 @@ def fetch_subnet_id(ec2_client, vpc_name: str, subnet_name: str) -> str:
     :param subnet_name: name of subnet to fetch ID
     :return: SubnetId
     """
-    subnet_info = ec2_client.describe_subnets(
-        Filters=[
-            {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
-            {"Name": "tag:Name", "Values": [subnet_name]}
-        ]
-    )["Subnets"]
-    if len(subnet_info) == 1:
-        return subnet_info[0]["SubnetId"]
-    elif len(subnet_info) == 0:
-        raise ValueError(f"Subnet with name '{subnet_name}' does not exists")
-    else:
-        raise ValueError(f"Subnet whose name tag value is '{subnet_name}' is ambiguous")
+    def lookup():
+        subnet_info = list_resources(
+            ec2_client,
+            "describe_subnets",
+            limit=2,
+            Filters=[
+                {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
+                {"Name": "tag:Name", "Values": [subnet_name]}
+            ]
+        )
+        if len(subnet_info) == 1:
+            return subnet_info[0]["SubnetId"]
+        elif len(subnet_info) == 0:
+            raise ValueError(f"Subnet with name '{subnet_name}' does not exists")
+        else:
+            raise ValueError(f"Subnet whose name tag value is '{subnet_name}' is ambiguous")
+
+    return cache.resolve(ec2_client, "subnet", f"{vpc_name}/{subnet_name}", lookup)
+
+
+def fetch_route_table(ec2_client, vpc_name: str, rt_name: str) -> RouteTable:
+    """
+    Fetch handle of route table, whose ID is resolved as explained in `fetch_route_table_id` method
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC that route table is defined
+    :param rt_name: name of route table
+    :return: handle of route table
+    """
+    return RouteTable(vpc_name, rt_name, fetch_route_table_id(ec2_client, vpc_name, rt_name))
+
+
+def fetch_route_table_id(ec2_client, vpc_name: str, rt_name: str) -> str:
+    """
+    One-to-one correspondence between route table and rt_name is checked as explained in `fetch_vpc_id` method.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC that route table is defined
+    :param rt_name: name of route table to fetch ID
+    :return: RouteTableId
+    """
+    def lookup():
+        rt_info = list_resources(
+            ec2_client,
+            "describe_route_tables",
+            limit=2,
+            Filters=[
+                {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
+                {"Name": "tag:Name", "Values": [rt_name]}
+            ]
+        )
+        if len(rt_info) == 1:
+            return rt_info[0]["RouteTableId"]
+        elif len(rt_info) == 0:
+            raise ValueError(f"Route table with name '{rt_name}' does not exists")
+        else:
+            raise ValueError(f"Route table whose name tag value is '{rt_name}' is ambiguous")
+
+    return cache.resolve(ec2_client, "route-table", f"{vpc_name}/{rt_name}", lookup)
 
 
 def delete_route_table_subnet_association(
@@ -253,6 +601,7 @@ def delete_route_table_subnet_association(
         vpc_name: str,
         subnet_name: str,
         rt_name: str,
+        topology: Optional[Topology] = None,
 ):
     """
     Delete association between route table and subnet
@@ -260,19 +609,33 @@ def delete_route_table_subnet_association(
     :param vpc_name: name of VPC where route table and subnet are defined
     :param subnet_name: name of subnet
     :param rt_name: name of route table
+    :param topology: snapshot of VPC loaded by `load_topology`, to find association without describe call
     :return: None
     """
+    if topology is not None:
+        ec2_client.disassociate_route_table(AssociationId=topology.association_id(subnet_name, rt_name))
+        return
     vpc_id = fetch_vpc_id(ec2_client, vpc_name)
     associated_subnet_id = fetch_subnet_id(ec2_client, vpc_name, subnet_name)
-    rt_info = ec2_client.describe_route_tables(
+    rt_info = list_resources(
+        ec2_client,
+        "describe_route_tables",
+        limit=1,
         Filters=[
             {"Name": "vpc-id", "Values": [vpc_id]},
             {"Name": "association.subnet-id", "Values": [associated_subnet_id]},
             {"Name": "tag:Name", "Values": [rt_name]},
         ]
-    )["RouteTables"][0]
+    )
+    if len(rt_info) == 0:
+        raise ValueError(f"Route table with name '{rt_name}' is not associated with subnet '{subnet_name}'")
+    association_ids = [
+        association["RouteTableAssociationId"]
+        for association in rt_info[0]["Associations"]
+        if association.get("SubnetId") == associated_subnet_id
+    ]
     ec2_client.disassociate_route_table(
-        AssociationId=rt_info["Associations"][0]["RouteTableAssociationId"]
+        AssociationId=association_ids[0]
     )
 
 
@@ -284,14 +647,9 @@ def delete_route_table(ec2_client, vpc_name: str, rt_name: str):
     :param rt_name: name of route table to delete
     :return: None
     """
-    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
-    rt_info = ec2_client.describe_route_tables(
-        Filters=[
-            {"Name": "vpc-id", "Values": [vpc_id]},
-            {"Name": "tag:Name", "Values": [rt_name]},
-        ]
-    )["RouteTables"][0]
-    ec2_client.delete_route_table(RouteTableId=rt_info["RouteTableId"])
+    rt_id = fetch_route_table_id(ec2_client, vpc_name, rt_name)
+    ec2_client.delete_route_table(RouteTableId=rt_id)
+    cache.invalidate(ec2_client, "route-table", f"{vpc_name}/{rt_name}")
 
 
 def delete_subnet(ec2_client, vpc_name: str, subnet_name: str):
@@ -304,81 +662,164 @@ def delete_subnet(ec2_client, vpc_name: str, subnet_name: str):
     """
     subnet_id = fetch_subnet_id(ec2_client, vpc_name, subnet_name)
     ec2_client.delete_subnet(SubnetId=subnet_id)
+    cache.invalidate(ec2_client, "subnet", f"{vpc_name}/{subnet_name}")
 
 
-def delete_vpc_security_group(ec2_client, vpc_name: str):
+def delete_vpc_security_group(ec2_client, vpc_name: str, topology: Optional[Topology] = None):
     """
     Delete default security group of VPC
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC where security group is defined
+    :param topology: snapshot of VPC loaded by `load_topology`, to find security group without describe call
     :return: None
     """
-    security_group_id = fetch_vpc_security_group_id(ec2_client, vpc_name)
+    if topology is not None:
+        security_group_id = topology.security_group(f"{vpc_name.replace('_', '-')}-sg")["GroupId"]
+    else:
+        security_group_id = fetch_vpc_security_group_id(ec2_client, vpc_name)
     ec2_client.delete_security_group(GroupId=security_group_id)
+    cache.invalidate(ec2_client, "security-group", vpc_name)
 
 
-def delete_vpc_internet_gateway(ec2_client, vpc_name: str):
+def delete_vpc_internet_gateway(ec2_client, vpc_name: str, topology: Optional[Topology] = None):
     """
     Detach internet gateway of given VPC and delete it consecutively
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC where internet gateway was defined
+    :param topology: snapshot of VPC loaded by `load_topology`, to find internet gateway without describe call
     :return: None
     """
-    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
-    igw_info = ec2_client.describe_internet_gateways(
-        Filters=[{"Name": "attachment.vpc-id", "Values": [vpc_id]}]
-    )["InternetGateways"]
-    igw_id = igw_info[0]["InternetGatewayId"]
+    if topology is not None:
+        vpc_id, igw_id = topology.vpc_id, topology.internet_gateway_id()
+    else:
+        vpc_id = fetch_vpc_id(ec2_client, vpc_name)
+        igw_id = _fetch_internet_gateway_id(ec2_client, vpc_name)
     ec2_client.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
     ec2_client.delete_internet_gateway(InternetGatewayId=igw_id)
+    cache.invalidate(ec2_client, "internet-gateway", vpc_name)
 
 
-def delete_vpc(ec2_client, vpc_name: str):
+def delete_vpc(ec2_client, vpc_name: str, topology: Optional[Topology] = None):
     """
     Delete VPC whose tagged name is vpc_name
     :param ec2_client: EC2 client created by boto3 session
     :param vpc_name: name of VPC to delete
+    :param topology: snapshot of VPC loaded by `load_topology`, to find VPC without describe call
     :return: None
     """
-    vpc_id = fetch_vpc_id(ec2_client, vpc_name)
+    vpc_id = fetch_vpc_id(ec2_client, vpc_name) if topology is None else topology.vpc_id
     ec2_client.delete_vpc(VpcId=vpc_id)
+    cache.invalidate(ec2_client, "vpc", vpc_name)
+    cache.invalidate(ec2_client, "vpc-cidr", vpc_name)
+
+
+def _describe_vpc_security_group(ec2_client, vpc_name: str) -> dict:
+    """
+    Describe security group created by this project within VPC, including its ingress rules
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC for the security group
+    :return: description of security group
+    """
+    sg_name = f"{vpc_name.replace('_', '-')}-sg"
+    sg_info = list_resources(
+        ec2_client,
+        "describe_security_groups",
+        limit=2,
+        Filters=[
+            {"Name": "vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]},
+            {"Name": "group-name", "Values": [sg_name]},
+        ]
+    )
+    if len(sg_info) == 1:
+        return sg_info[0]
+    elif len(sg_info) == 0:
+        raise ValueError(f"Security group with GroupName '{sg_name}' does not exists")
+    else:
+        raise ValueError(f"Security group with GroupName '{sg_name}' is ambiguous")
+
+
+def _open_port_ranges(security_group: dict) -> List[Tuple[int, int]]:
+    """
+    Collect TCP port ranges of security group that are open to any address
+    :param security_group: description of security group
+    :return: list of (FromPort, ToPort) ranges
+    """
+    return [
+        (permission["FromPort"], permission["ToPort"])
+        for permission in security_group.get("IpPermissions", [])
+        if permission.get("IpProtocol") == "tcp"
+        and any(ip_range.get("CidrIp") == "0.0.0.0/0" for ip_range in permission.get("IpRanges", []))
+    ]
+
+
+def _fetch_internet_gateway_id(ec2_client, vpc_name: str) -> str:
+    """
+    Fetch ID of internet gateway attached to VPC
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where internet gateway is attached
+    :return: InternetGatewayId
+    """
+    def lookup():
+        igw_info = list_resources(
+            ec2_client,
+            "describe_internet_gateways",
+            limit=1,
+            Filters=[{"Name": "attachment.vpc-id", "Values": [fetch_vpc_id(ec2_client, vpc_name)]}],
+        )
+        assert len(igw_info) > 0, f"Internet gateway attached to VPC '{vpc_name}' is not generated"
+        return igw_info[0]["InternetGatewayId"]
+
+    return cache.resolve(ec2_client, "internet-gateway", vpc_name, lookup)
+
+
+def _attach_internet_gateway(ec2_client, vpc_name: str, igw_info: dict) -> InternetGateway:
+    """
+    Attach internet gateway to VPC and cache its ID
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC to attach internet gateway
+    :param igw_info: description of internet gateway returned by create or describe call
+    :return: handle of attached internet gateway
+    """
+    igw_id = igw_info["InternetGatewayId"]
+    ec2_client.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=fetch_vpc_id(ec2_client, vpc_name))
+    cache.store(
+        ec2_client,
+        "internet-gateway",
+        vpc_name,
+        igw_id,
+        arn=state.build_arn(ec2_client, igw_info["OwnerId"], "internet-gateway", igw_id),
+    )
+    return InternetGateway(vpc_name, igw_id)
 
 
 def _parse_ip_permissions(ingress_ports: List[str]):
     """
-    Parse ingress port and convert it into port ingress permission statement. If ingress port string is:
-        * single integer, both FromPort and ToPort
-        * string that contains hyphen between two integers,
-        * otherwise, return error since the value is not in expected format
+    Convert ingress ports into port ingress permission statements, one statement per disjoint range of ports
     :param ingress_ports: list of port(ex. '22') or range of ports(ex. '8888-8890')
     :return: list of parsed permissions
     """
-    permission_statements = []
-    for ingress_port in ingress_ports:
-        try:
-            from_port = int(ingress_port)
-            to_port = int(ingress_port)
-        except ValueError:  # ValueError with message 'invalid literal for int() with base 10'
-            if "-" in ingress_port:
-                from_port, to_port = map(int, ingress_port.split("-"))
-            else:
-                raise ValueError(
-                    f"ingress_port should be either integer or contains '-' as separator; got {ingress_port}"
-                )
-        if from_port == to_port:
-            description = f"allow any connection attempt on port {from_port}"
-        else:
-            description = f"allow any connection attempt on port {from_port} to {to_port} (inclusive)"
-        parsed_permission = {
-            "FromPort": from_port,
-            "ToPort": to_port,
-            "IpProtocol": "tcp",
-            "IpRanges": [
-                {
-                    "CidrIp": "0.0.0.0/0",
-                    "Description": description
-                }
-            ]
-        }
-        permission_statements.append(parsed_permission)
-    return permission_statements
+    return [_build_ip_permission(from_port, to_port) for from_port, to_port in merge_port_ranges(ingress_ports)]
+
+
+def _build_ip_permission(from_port: int, to_port: int) -> dict:
+    """
+    Build permission statement that allows connection from any address to range of ports
+    :param from_port: first port of range
+    :param to_port: last port of range
+    :return: permission statement
+    """
+    if from_port == to_port:
+        description = f"allow any connection attempt on port {from_port}"
+    else:
+        description = f"allow any connection attempt on port {from_port} to {to_port} (inclusive)"
+    return {
+        "FromPort": from_port,
+        "ToPort": to_port,
+        "IpProtocol": "tcp",
+        "IpRanges": [
+            {
+                "CidrIp": "0.0.0.0/0",
+                "Description": description
+            }
+        ]
+    }
@@ -0,0 +1,224 @@
+import dataclasses
+import random
+import time
+from typing import Dict, Iterator, List
+
+from botocore.exceptions import ClientError, WaiterError
+
+from commands.listing import iter_resources, list_resources
+from commands.ratelimit import polling
+
+# states that can never reach target state without another API call
+FAILURE_STATES = {
+    "running": ("shutting-down", "terminated"),
+    "stopped": ("shutting-down", "terminated"),
+    "terminated": (),
+}
+WAIT_MODES = ("describe", "status", "botocore")
+# maximum number of instance IDs accepted by single describe call of each wait mode
+MAX_IDS_PER_CALL = {"describe": 1000, "status": 100}
+
+
+@dataclasses.dataclass(frozen=True)
+class Schedule:
+    """
+    Polling schedule of waiter: first probe is made after `first_delay` seconds, and following probes are delayed by
+    `delay` seconds multiplied by `factor` on every attempt, capped to `max_delay` and randomized by `jitter` ratio.
+    Waiting is given up when `timeout` seconds are passed.
+    """
+    first_delay: float = 1.0
+    delay: float = 2.0
+    factor: float = 1.5
+    max_delay: float = 15.0
+    jitter: float = 0.2
+    timeout: float = 600.0
+
+    def delays(self) -> Iterator[float]:
+        yield self.first_delay
+        delay = self.delay
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = min(delay * self.factor, self.max_delay)
+
+
+def wait_for_instance_state(
+        ec2_client,
+        instance_ids: List[str],
+        target_state: str,
+        schedule: Schedule = Schedule(),
+        mode: str = "describe",
+) -> List[dict]:
+    """
+    Wait until every instance reaches target state. States are polled by batched describe calls on up to 1000 IDs
+    (100 IDs for describe_instance_status) each, so number of calls per poll barely grows with number of instances.
+    Waiting ends early with RuntimeError if any instance falls into state
+    that cannot lead to target state(ex. 'shutting-down' while waiting for 'running'), and TimeoutError is raised when
+    deadline of the schedule is passed.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs to wait for
+    :param target_state: one of ('running', 'stopped', 'terminated')
+    :param schedule: polling schedule
+    :param mode: one of ('describe', 'status', 'botocore') to poll state by describe_instances, lighter
+        describe_instance_status or built-in waiter of botocore respectively
+    :return: list of state transitions observed, each as dictionary of InstanceId, From, To and Elapsed seconds
+    """
+    validate_wait(target_state, mode)
+    if mode == "botocore":
+        return wait_by_botocore(ec2_client, instance_ids, target_state, schedule)
+    progress = WaitProgress(instance_ids, target_state, schedule.timeout)
+    for delay in schedule.delays():
+        time.sleep(progress.clip(delay))
+        if progress.observe(fetch_states(ec2_client, instance_ids, target_state, mode)):
+            return progress.transitions
+
+
+def validate_wait(target_state: str, mode: str):
+    """
+    Check that target state and wait mode are supported before any call is made
+    :param target_state: one of ('running', 'stopped', 'terminated')
+    :param mode: one of ('describe', 'status', 'botocore')
+    :return: None
+    """
+    if target_state not in FAILURE_STATES:
+        raise ValueError(f"target_state must be one of {tuple(FAILURE_STATES)}; got: '{target_state}'")
+    if mode not in WAIT_MODES:
+        raise ValueError(f"mode must be one of {WAIT_MODES}; got: '{mode}'")
+
+
+def fetch_states(ec2_client, instance_ids: List[str], target_state: str, mode: str) -> Dict[str, str]:
+    """
+    Fetch state of every instance by batched describe calls of wait mode, which are rate-limited as polling
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :param target_state: state being waited for
+    :param mode: one of ('describe', 'status')
+    :return: dictionary of instance ID to name of its state
+    """
+    fetch = _fetch_states if mode == "describe" else _fetch_status_states
+    states = {}
+    with polling():
+        for index in range(0, len(instance_ids), MAX_IDS_PER_CALL[mode]):
+            states.update(fetch(ec2_client, instance_ids[index:index + MAX_IDS_PER_CALL[mode]], target_state))
+    return states
+
+
+def wait_by_botocore(ec2_client, instance_ids: List[str], target_state: str, schedule: Schedule) -> List[dict]:
+    """
+    Wait by built-in waiter of botocore, which polls with fixed delay. Only final state of each instance is reported.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :param target_state: state being waited for
+    :param schedule: polling schedule whose delay and timeout are converted into waiter configuration
+    :return: list of state transitions observed
+    """
+    started_at = time.monotonic()
+    delay = max(int(schedule.delay), 1)
+    try:
+        with polling():  # waiter of botocore polls by describe_instances
+            for index in range(0, len(instance_ids), MAX_IDS_PER_CALL["describe"]):
+                ec2_client.get_waiter(f"instance_{target_state}").wait(
+                    InstanceIds=instance_ids[index:index + MAX_IDS_PER_CALL["describe"]],
+                    WaiterConfig={"Delay": delay, "MaxAttempts": max(int(schedule.timeout // delay), 1)},
+                )
+    except WaiterError as error:
+        if "Max attempts exceeded" in str(error):
+            raise TimeoutError(f"Instances did not reach state '{target_state}' within {schedule.timeout} seconds")
+        raise RuntimeError(f"Instances cannot reach state '{target_state}': {error}")
+    elapsed = round(time.monotonic() - started_at, 2)
+    return [
+        {"InstanceId": instance_id, "From": None, "To": target_state, "Elapsed": elapsed}
+        for instance_id in instance_ids
+    ]
+
+
+class WaitProgress:
+    """
+    Progress of instances toward target state, shared by blocking and asynchronous waiters. Each observation of states
+    records transitions, and tells whether waiting is over or raises once it cannot end successfully.
+    """
+
+    def __init__(self, instance_ids: List[str], target_state: str, timeout: float):
+        self.instance_ids = instance_ids
+        self.target_state = target_state
+        self.timeout = timeout
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout
+        self.last_states: Dict[str, str] = {}
+        self.transitions: List[dict] = []
+
+    def clip(self, delay: float) -> float:
+        """
+        Shorten delay before next poll so that it does not pass deadline
+        :param delay: delay given by schedule
+        :return: seconds to sleep
+        """
+        return min(delay, max(self.deadline - time.monotonic(), 0))
+
+    def observe(self, states: Dict[str, str]) -> bool:
+        """
+        Record states fetched by a poll
+        :param states: dictionary of instance ID to name of its state
+        :return: whether every instance reached target state
+        """
+        elapsed = round(time.monotonic() - self.started_at, 2)
+        for instance_id, state in states.items():
+            last_state = self.last_states.get(instance_id)
+            if last_state != state:
+                self.transitions.append(
+                    {"InstanceId": instance_id, "From": last_state, "To": state, "Elapsed": elapsed}
+                )
+                self.last_states[instance_id] = state
+            if state in FAILURE_STATES[self.target_state]:
+                raise RuntimeError(
+                    f"Instance '{instance_id}' fell into state '{state}' while waiting for '{self.target_state}'"
+                )
+        if len(states) == len(self.instance_ids) and all(state == self.target_state for state in states.values()):
+            return True
+        if time.monotonic() >= self.deadline:
+            raise TimeoutError(
+                f"Instances did not reach state '{self.target_state}' within {self.timeout} seconds; "
+                f"last states: {states}"
+            )
+        return False
+
+
+def _fetch_states(ec2_client, instance_ids: List[str], target_state: str) -> Dict[str, str]:
+    """
+    Fetch state of instances by describe_instances. Instances that are not visible yet right after launch are omitted.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :param target_state: state being waited for
+    :return: dictionary of instance ID to name of its state
+    """
+    try:
+        return {
+            instance["InstanceId"]: instance["State"]["Name"]
+            for instance in iter_resources(ec2_client, "describe_instances", InstanceIds=instance_ids)
+        }
+    except ClientError as error:
+        if error.response["Error"]["Code"] == "InvalidInstanceID.NotFound":  # eventual consistency of new instance
+            return {}
+        raise
+
+
+def _fetch_status_states(ec2_client, instance_ids: List[str], target_state: str) -> Dict[str, str]:
+    """
+    Fetch state of instances by describe_instance_status, which does not carry whole instance description. Terminated
+    instances may disappear from its response, so they are regarded as terminated once missing.
+    :param ec2_client: EC2 client created by boto3 session
+    :param instance_ids: list of instance IDs
+    :param target_state: state being waited for
+    :return: dictionary of instance ID to name of its state
+    """
+    try:
+        statuses = list_resources(
+            ec2_client, "describe_instance_status", InstanceIds=instance_ids, IncludeAllInstances=True
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+            return {}
+        raise
+    states = {status["InstanceId"]: status["InstanceState"]["Name"] for status in statuses}
+    if target_state == "terminated":
+        states.update({instance_id: "terminated" for instance_id in instance_ids if instance_id not in states})
+    return states
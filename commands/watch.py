@@ -0,0 +1,68 @@
+import datetime
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from commands.ec2 import build_instance_filters
+from commands.listing import iter_resources
+from commands.ratelimit import polling
+from commands.topology import name_of
+
+
+def watch_instances(
+        ec2_client,
+        vpc_name: str,
+        subnet_name: Optional[str],
+        instance_names: Optional[List[str]] = None,
+        tags: Optional[Dict[str, str]] = None,
+        interval: float = 5.0,
+        duration: Optional[float] = None,
+) -> Iterator[dict]:
+    """
+    Stream state changes of instances in VPC or subnet. Every tick makes single paginated describe_instances call with
+    server-side filters and compares its result with snapshot of previous tick, so only instances that appeared,
+    changed state or disappeared are yielded. Every instance is yielded on the first tick as it appears.
+    :param ec2_client: EC2 client created by boto3 session
+    :param vpc_name: name of VPC where instances are created
+    :param subnet_name: name of subnet where instances are created, or None to watch whole VPC
+    :param instance_names: names or glob patterns(ex. 'ws-*') of instances, or None to watch every instance
+    :param tags: dictionary of tag key and value(or glob pattern) that instances must have
+    :param interval: seconds between ticks
+    :param duration: seconds to watch, or None to watch until interrupted
+    :return: iterator of dictionary of Time, Name, InstanceId, From, To and Elapsed seconds spent in previous state
+    """
+    filters = build_instance_filters(ec2_client, vpc_name, subnet_name, instance_names, tags)
+    started_at = time.monotonic()
+    snapshot: Dict[str, Tuple[str, str, float]] = {}  # instance ID -> (name, state, monotonic time state was seen)
+    while True:
+        tick_started_at = time.monotonic()
+        observed_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        with polling():
+            current = {
+                instance["InstanceId"]: (name_of(instance) or "", instance["State"]["Name"])
+                for instance in iter_resources(ec2_client, "describe_instances", Filters=filters)
+            }
+        for instance_id, (name, state) in current.items():
+            previous = snapshot.get(instance_id)
+            if previous is None or previous[1] != state:
+                yield {
+                    "Time": observed_at,
+                    "Name": name,
+                    "InstanceId": instance_id,
+                    "From": None if previous is None else previous[1],
+                    "To": state,
+                    "Elapsed": None if previous is None else round(tick_started_at - previous[2], 2),
+                }
+                snapshot[instance_id] = (name, state, tick_started_at)
+        for instance_id in [instance_id for instance_id in snapshot if instance_id not in current]:
+            name, state, since = snapshot.pop(instance_id)
+            yield {
+                "Time": observed_at,
+                "Name": name,
+                "InstanceId": instance_id,
+                "From": state,
+                "To": None,
+                "Elapsed": round(tick_started_at - since, 2),
+            }
+        if duration is not None and time.monotonic() + interval > started_at + duration:
+            return
+        time.sleep(max(interval - (time.monotonic() - tick_started_at), 0))
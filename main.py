@@ -1,11 +1,61 @@
-import boto3
-import pathlib
-import commands.ec2 as ec2_commands
-import commands.vpc as vpc_commands
-import typer
-from typing import Optional
+import time
+
+STARTED_AT = time.perf_counter()
+
+import dataclasses  # noqa: E402
+import functools  # noqa: E402
+import pathlib  # noqa: E402
+import typer  # noqa: E402
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa: E402
 
 app = typer.Typer()
+timings: Dict[str, float] = {}
+command_started_at = STARTED_AT
+shell_options: Optional[Dict[str, Any]] = None  # global options given to `shell` command while it is running
+command_options: Dict[str, Any] = {}  # global options of the running command
+
+
+@app.callback()
+def configure(
+        ctx: typer.Context,
+        state_file: Optional[str] = typer.Option(None, envvar="WORKSPACE_STATE_FILE"),
+        journal_file: Optional[str] = typer.Option(None, envvar="WORKSPACE_JOURNAL_FILE"),
+        resume: bool = typer.Option(False, "--resume"),
+        show_timings: bool = typer.Option(False, "--timings"),
+        max_pool_connections: int = typer.Option(50),
+        retry_mode: str = typer.Option("adaptive"),
+        max_attempts: int = typer.Option(10),
+        connect_timeout: float = typer.Option(5.0),
+        read_timeout: float = typer.Option(30.0),
+        tcp_keepalive: bool = typer.Option(True),
+        metrics: Optional[str] = typer.Option(None, "--metrics"),
+        describe_rate: float = typer.Option(20.0),
+        mutate_rate: float = typer.Option(5.0),
+):
+    # modules configured by global options are imported by `_configure_commands` after the command validated its own
+    # arguments, so `--help` or mistyped action does not pay for them
+    global command_started_at
+    options = dict(ctx.params)
+    if shell_options is not None:  # options omitted in command of shell follow those given to the shell
+        import click
+        for name, value in shell_options.items():
+            if ctx.get_parameter_source(name) == click.core.ParameterSource.DEFAULT:
+                options[name] = value
+    command_options.clear()
+    command_options.update(options)
+    timings.clear()
+    if shell_options is None:
+        timings["startup"] = time.perf_counter() - STARTED_AT
+    else:
+        command_started_at = time.perf_counter()
+    if options["show_timings"]:
+        ctx.call_on_close(_print_timings)
+    if options["metrics"] is not None:
+        import commands.metrics as metrics_commands
+        if options["metrics"] not in metrics_commands.FORMATS:
+            raise ValueError(f"metrics must be one of {metrics_commands.FORMATS}; got: '{options['metrics']}'")
+        metrics_commands.reset()
+        ctx.call_on_close(functools.partial(_print_metrics, options["metrics"]))
 
 
 @app.command("vpc")
@@ -17,38 +67,95 @@ def manage_vpc(
         vpc_cidr: Optional[str] = typer.Option(None),
         ports: Optional[str] = typer.Option(None),
 ):
-    session = boto3.Session(profile_name=profile_name, region_name=region_name)
-    ec2_client = session.client("ec2")
+    _validate_action_type(action_type, ("create", "delete", "ports"))
+    _configure_commands()
+    import commands.clients as clients_commands
+    import commands.dag as dag_commands
+    import commands.journal as journal_commands
+    import commands.topology as topology_commands
+    import commands.vpc as vpc_commands
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
     if action_type.lower() == "create":
-        vpc_commands.create_vpc(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            vpc_cidr=vpc_cidr,
-        )
-        vpc_commands.create_vpc_security_group(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            ingress_ports=ports.split(","),
-        )
-        vpc_commands.create_vpc_internet_gateway(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-        )
+        operation = journal_commands.begin(ec2_client, f"vpc create {vpc_name}")
+        dag_commands.run_steps(operation.steps({
+            "vpc": (
+                functools.partial(
+                    vpc_commands.create_vpc,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    vpc_cidr=vpc_cidr,
+                ),
+                [],
+            ),
+            "security-group": (
+                functools.partial(
+                    vpc_commands.create_vpc_security_group,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    ingress_ports=ports.split(","),
+                ),
+                ["vpc"],
+            ),
+            "internet-gateway": (
+                functools.partial(
+                    vpc_commands.create_vpc_internet_gateway,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                ),
+                ["vpc"],
+            ),
+        }, recover={
+            "vpc": functools.partial(vpc_commands.fetch_vpc, ec2_client, vpc_name),
+            "security-group": functools.partial(
+                vpc_commands.recover_vpc_security_group, ec2_client, vpc_name, ports.split(",")
+            ),
+            "internet-gateway": functools.partial(vpc_commands.recover_vpc_internet_gateway, ec2_client, vpc_name),
+        }))
+        operation.finish()
     elif action_type.lower() == "delete":
-        vpc_commands.delete_vpc_security_group(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-        )
-        vpc_commands.delete_vpc_internet_gateway(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-        )
-        vpc_commands.delete_vpc(
+        topology = topology_commands.load_topology(ec2_client, vpc_name)
+        assert len(topology.subnets) == 0, f"Subnets {sorted(topology.subnets_by_name)} must be deleted in advance"
+        dag_commands.run_steps({
+            "security-group": (
+                functools.partial(
+                    vpc_commands.delete_vpc_security_group,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    topology=topology,
+                ),
+                [],
+            ),
+            "internet-gateway": (
+                functools.partial(
+                    vpc_commands.delete_vpc_internet_gateway,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    topology=topology,
+                ),
+                [],
+            ),
+            "vpc": (
+                functools.partial(
+                    vpc_commands.delete_vpc,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    topology=topology,
+                ),
+                ["security-group", "internet-gateway"],
+            ),
+        })
+    elif action_type.lower() == "ports":
+        assert ports is not None, "ports must be given to sync ingress rules of security group"
+        authorized, revoked = vpc_commands.sync_vpc_security_group_ports(
             ec2_client=ec2_client,
             vpc_name=vpc_name,
+            ingress_ports=ports.split(","),
         )
-    else:
-        raise ValueError(f"action_type must be one of ('create', 'delete'); got: '{action_type}'")
+        for verb, port_ranges in (("authorized", authorized), ("revoked", revoked)):
+            for from_port, to_port in port_ranges:
+                print(f">>> {verb} : {from_port}" + ("" if from_port == to_port else f"-{to_port}"))
+        if not authorized and not revoked:
+            print(">>> Security group already allows the ports")
 
 
 @app.command("subnet")
@@ -57,121 +164,273 @@ def manage_subnet(
         profile_name: str = typer.Option(...),
         region_name: str = typer.Option(...),
         vpc_name: str = typer.Option(...),
-        route_table_name: str = typer.Option(...),
-        subnet_name: str = typer.Option(...),
+        route_table_name: List[str] = typer.Option(...),
+        subnet_name: List[str] = typer.Option(...),
         cidr_substitute: Optional[str] = typer.Option(None),
-        az_postfix: Optional[str] = typer.Option(None),
+        prefix_length: int = typer.Option(24),
+        count: Optional[int] = typer.Option(None),
+        az_postfix: Optional[List[str]] = typer.Option(None),
         is_public: Optional[bool] = typer.Option(None),
 ):
-    session = boto3.Session(profile_name=profile_name, region_name=region_name)
-    ec2_client = session.client("ec2")
+    _validate_action_type(action_type, ("create", "delete"))
+    _configure_commands()
+    import commands.cidr as cidr_commands
+    import commands.clients as clients_commands
+    import commands.dag as dag_commands
+    import commands.journal as journal_commands
+    import commands.topology as topology_commands
+    import commands.vpc as vpc_commands
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
+    layout = _expand_subnet_layout(ec2_client, region_name, subnet_name, route_table_name, az_postfix or [], count)
+    steps = {}
     if action_type.lower() == "create":
-        vpc_commands.create_subnet(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            subnet_name=subnet_name,
-            cidr_substitute=cidr_substitute,
-            region_name=region_name,
-            az_postfix=az_postfix,
-            is_public=is_public,
-        )
-        vpc_commands.create_route_table(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            rt_name=route_table_name,
-            is_public=is_public,
-        )
-        vpc_commands.create_route_table_subnet_association(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            subnet_name=subnet_name,
-            rt_name=route_table_name,
+        if cidr_substitute is not None and len(layout) > 1:
+            raise ValueError("cidr_substitute can only be given to create single subnet")
+        operation = journal_commands.begin(
+            ec2_client, f"subnet create {vpc_name} {[(subnet, route_table) for subnet, route_table, _ in layout]}"
         )
+        allocator = cidr_commands.load_allocator(ec2_client, vpc_name) if cidr_substitute is None else None
+        recover = {}
+        for subnet, route_table, postfix in layout:
+            is_done = f"subnet:{subnet}" in operation.results  # resumed subnet keeps block assigned at first run
+            subnet_cidr = None if allocator is None or is_done else allocator.allocate(prefix_length)
+            steps[f"subnet:{subnet}"] = (
+                functools.partial(
+                    vpc_commands.create_subnet,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    subnet_name=subnet,
+                    cidr_substitute=cidr_substitute,
+                    region_name=region_name,
+                    az_postfix=postfix,
+                    is_public=is_public,
+                    subnet_cidr=subnet_cidr,
+                ),
+                [],
+            )
+            steps[f"route-table:{route_table}"] = (
+                functools.partial(
+                    vpc_commands.create_route_table,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    rt_name=route_table,
+                    is_public=is_public,
+                ),
+                [],
+            )
+            steps[f"association:{subnet}"] = (
+                functools.partial(
+                    vpc_commands.create_route_table_subnet_association,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    subnet_name=subnet,
+                    rt_name=route_table,
+                ),
+                [f"subnet:{subnet}", f"route-table:{route_table}"],
+            )
+            recover[f"subnet:{subnet}"] = functools.partial(
+                vpc_commands.recover_subnet, ec2_client, vpc_name, subnet, is_public
+            )
+            recover[f"route-table:{route_table}"] = functools.partial(
+                vpc_commands.recover_route_table, ec2_client, vpc_name, route_table, is_public
+            )
+            recover[f"association:{subnet}"] = functools.partial(
+                vpc_commands.recover_route_table_subnet_association, ec2_client, vpc_name, subnet, route_table
+            )
+            if subnet_cidr is not None:
+                print(f">>> Subnet '{subnet}' is assigned CIDR block {subnet_cidr} in {region_name}{postfix}")
+        dag_commands.run_steps(operation.steps(steps, recover))
+        operation.finish()
     elif action_type.lower() == "delete":
-        vpc_commands.delete_route_table_subnet_association(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            subnet_name=subnet_name,
-            rt_name=route_table_name,
-        )
-        vpc_commands.delete_route_table(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            rt_name=route_table_name,
-        )
-        vpc_commands.delete_subnet(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            subnet_name=subnet_name,
-        )
-    else:
-        raise ValueError(f"action_type must be one of ('create', 'delete'); got: '{action_type}'")
+        topology = topology_commands.load_topology(ec2_client, vpc_name)
+        for subnet, route_table, _ in layout:
+            steps[f"association:{subnet}"] = (
+                functools.partial(
+                    vpc_commands.delete_route_table_subnet_association,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    subnet_name=subnet,
+                    rt_name=route_table,
+                    topology=topology,
+                ),
+                [],
+            )
+            steps[f"route-table:{route_table}"] = (
+                functools.partial(
+                    vpc_commands.delete_route_table,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    rt_name=route_table,
+                ),
+                [f"association:{subnet}"],
+            )
+            steps[f"subnet:{subnet}"] = (
+                functools.partial(
+                    vpc_commands.delete_subnet,
+                    ec2_client=ec2_client,
+                    vpc_name=vpc_name,
+                    subnet_name=subnet,
+                ),
+                [f"association:{subnet}"],
+            )
+        dag_commands.run_steps(steps)
 
 
 @app.command("instance")
 def manage_instance(
         action_type: str = typer.Argument(...),
         profile_name: str = typer.Option(...),
-        region_name: str = typer.Option(...),
+        region_name: Optional[str] = typer.Option(None),
+        regions: Optional[str] = typer.Option(None),
         vpc_name: str = typer.Option(...),
-        subnet_name: str = typer.Option(...),
-        instance_name: str = typer.Option(...),
+        subnet_name: Optional[str] = typer.Option(None),
+        instance_name: Optional[List[str]] = typer.Option(None),
+        tag: Optional[List[str]] = typer.Option(None),
         image_id: Optional[str] = typer.Option(None),
         instance_type: Optional[str] = typer.Option(None),
         key_name: Optional[str] = typer.Option(None),
+        count: Optional[int] = typer.Option(None),
+        wait_timeout: float = typer.Option(600.0),
+        wait_mode: str = typer.Option("describe"),
+        wait_ready: bool = typer.Option(False),
+        ready_ports: Optional[str] = typer.Option(None),
+        interval: float = typer.Option(5.0),
+        duration: Optional[float] = typer.Option(None),
+        placement: Optional[str] = typer.Option(None),
 ):
-    session = boto3.Session(profile_name=profile_name, region_name=region_name)
-    ec2_client = session.client("ec2")
+    _validate_action_type(action_type, ("run", "start", "stop", "reboot", "terminate", "describe", "watch"))
+    _configure_commands()
+    import commands.clients as clients_commands
+    import commands.ec2 as ec2_commands
+    import commands.waiter as waiter_commands
+    schedule = waiter_commands.Schedule(timeout=wait_timeout)
+    tags = _parse_key_values("tag", tag) if tag else None
+    if regions is not None:
+        _validate_action_type(action_type, ("describe", "stop", "start"))
+        ec2_commands.check_instance_selection(instance_name, tags)
+
+        def run_in_region(ec2_client, _) -> List[str]:
+            if action_type.lower() == "describe":
+                try:
+                    instances = ec2_commands.fetch_instances(ec2_client, vpc_name, subnet_name, instance_name, tags)
+                except ValueError:
+                    return ["Instance has not been created yet"]
+                return ec2_commands.format_instances(instances)
+            change_state = {"stop": ec2_commands.stop_instances, "start": ec2_commands.start_instances}
+            try:
+                transitions = change_state[action_type.lower()](
+                    ec2_client, vpc_name, subnet_name, instance_name, tags, schedule, wait_mode
+                )
+            except ValueError as error:
+                return [f"Skipped : {error}"]
+            return [_format_transition(transition) for transition in transitions]
+
+        _run_in_regions(profile_name, region_name, regions, run_in_region)
+        return
+    assert region_name is not None, "Either region_name or regions must be specified"
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
     if action_type.lower() == "run":
-        ec2_commands.run_instance(
+        assert subnet_name is not None or placement is not None, "subnet_name must be specified to run instance"
+        assert instance_name, "instance_name must be specified to run instance"
+        if count is not None:  # instance_name is template formatted with index(ex. 'ws-{i}')
+            assert len(instance_name) == 1, "single template of instance_name must be specified with count"
+            instance_name = [instance_name[0].format(i=index) for index in range(count)]
+    if action_type.lower() in ("run", "start", "stop", "reboot", "terminate"):
+        import commands.journal as journal_commands
+        operation = journal_commands.begin(
+            ec2_client, f"instance {action_type.lower()} {vpc_name}/{subnet_name} {instance_name} {tags}"
+        )
+    if action_type.lower() == "run" and placement is None:
+        instances = operation.step("launch", functools.partial(
+            ec2_commands.launch_instances,
             ec2_client=ec2_client,
             image_id=image_id,
             instance_type=instance_type,
             key_name=key_name,
             vpc_name=vpc_name,
             subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
-    elif action_type.lower() == "start":
-        ec2_commands.start_instance(
-            ec2_client=ec2_client,
-            vpc_name=vpc_name,
-            subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
-    elif action_type.lower() == "stop":
-        ec2_commands.stop_instance(
+            instance_names=instance_name,
+            client_token=operation.client_token("launch"),  # interrupted launch is not repeated on resume
+        ))
+        instance_ids = [instance.instance_id for instance in instances]
+        target_state = "running"
+    elif action_type.lower() == "run":  # subnet_name is optional glob pattern of candidate subnets
+        import commands.placement as placement_commands
+        instances = operation.step("launch", functools.partial(
+            placement_commands.place_instances,
             ec2_client=ec2_client,
+            image_id=image_id,
+            instance_type=instance_type,
+            key_name=key_name,
             vpc_name=vpc_name,
-            subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
-    elif action_type.lower() == "reboot":
-        ec2_commands.reboot_instance(
+            subnet_names=None if subnet_name is None else [subnet_name],
+            instance_names=instance_name,
+            policy=placement,
+            operation=operation,  # each group keeps its idempotency token on resume
+        ))
+        for instance in instances:
+            print(f">>> {instance.name} : placed in {instance.subnet_name}")
+        instance_ids = [instance.instance_id for instance in instances]
+        target_state = "running"
+    elif action_type.lower() in ("start", "stop", "reboot", "terminate"):
+        instance_ids = operation.step(action_type.lower(), functools.partial(
+            ec2_commands.change_instance_state,
             ec2_client=ec2_client,
+            action=action_type.lower(),
             vpc_name=vpc_name,
             subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
-    elif action_type.lower() == "terminate":
-        ec2_commands.terminate_instance(
+            instance_names=instance_name,
+            tags=tags,
+        ))
+        target_state = ec2_commands.TARGET_STATES[action_type.lower()]
+    elif action_type.lower() == "watch":
+        import commands.watch as watch_commands
+        for change in watch_commands.watch_instances(
             ec2_client=ec2_client,
             vpc_name=vpc_name,
             subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
+            instance_names=instance_name,
+            tags=tags,
+            interval=interval,
+            duration=duration,
+        ):
+            print(f">>> {_format_state_change(change)}")
+        return
     elif action_type.lower() == "describe":
-        ec2_commands.describe_instance(
+        ec2_commands.describe_instances(
             ec2_client=ec2_client,
             vpc_name=vpc_name,
             subnet_name=subnet_name,
-            instance_name=instance_name,
-        )
-    
-    else:
-        raise ValueError(
-            f"action_type must be one of ('run', 'start', 'stop', 'reboot', 'terminate', 'describe'); got: '{action_type}'"
+            instance_names=instance_name,
+            tags=tags,
         )
+        return
+    transitions = operation.step(f"wait:{target_state}", functools.partial(
+        waiter_commands.wait_for_instance_state,
+        ec2_client=ec2_client,
+        instance_ids=instance_ids,
+        target_state=target_state,
+        schedule=schedule,
+        mode=wait_mode,
+    ))
+    for transition in transitions:
+        print(f">>> {_format_transition(transition)}")
+    if wait_ready and action_type.lower() in ("run", "start", "reboot"):
+        import commands.readiness as readiness_commands
+        if ready_ports is None:
+            ports = readiness_commands.fetch_default_ports(ec2_client, vpc_name)
+        else:
+            ports = readiness_commands.parse_ports(ready_ports)
+        readiness = operation.step("ready", functools.partial(
+            readiness_commands.wait_until_usable,
+            ec2_client=ec2_client,
+            instance_ids=sorted(instance_ids),
+            ports=ports,
+            schedule=schedule,
+        ))
+        for ready in readiness:
+            print(f">>> {ready['InstanceId']} : usable at {ready['Host']} ({ready['Elapsed']}s)")
+    operation.finish()
 
 
 @app.command("key-pair")
@@ -182,8 +441,11 @@ def manage_key_pair(
         key_name: str = typer.Option(...),
         key_dir: Optional[str] = typer.Option("."),
 ):
-    session = boto3.Session(profile_name=profile_name, region_name=region_name)
-    ec2_client = session.client("ec2")
+    _validate_action_type(action_type, ("create", "delete"))
+    _configure_commands()
+    import commands.clients as clients_commands
+    import commands.ec2 as ec2_commands
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
     local_dir = pathlib.Path(key_dir).resolve()
     local_dir.mkdir(parents=True, exist_ok=True)
     if action_type.lower() == "create":
@@ -198,20 +460,35 @@ def manage_key_pair(
             key_name=key_name,
             local_dir=local_dir,
         )
-    else:
-        raise ValueError(f"action_type must be one of ('create', 'delete'); got: '{action_type}'")
 
 
 @app.command("elastic-ip")
 def manage_elastic_ip(
         action_type: str = typer.Argument(...),
         profile_name: str = typer.Option(...),
-        region_name: str = typer.Option(...),
+        region_name: Optional[str] = typer.Option(None),
+        regions: Optional[str] = typer.Option(None),
         eip_name: str = typer.Option(...),
         instance_name: Optional[str] = typer.Option(None),
 ):
-    session = boto3.Session(profile_name=profile_name, region_name=region_name)
-    ec2_client = session.client("ec2")
+    _validate_action_type(action_type, ("allocate", "fetch", "associate", "disassociate", "release"))
+    _configure_commands()
+    import commands.clients as clients_commands
+    import commands.ec2 as ec2_commands
+    if regions is not None:
+        _validate_action_type(action_type, ("fetch",))
+
+        def fetch_in_region(ec2_client, region) -> List[str]:
+            try:
+                eip_info = ec2_commands.fetch_elastic_ip_info(ec2_client, region, eip_name)
+            except ValueError:
+                return [f"Elastic IP of name {eip_name} does not exists"]
+            return [f"Address of {eip_name} is '{eip_info['PublicIp']}'"]
+
+        _run_in_regions(profile_name, region_name, regions, fetch_in_region)
+        return
+    assert region_name is not None, "Either region_name or regions must be specified"
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
     if action_type.lower() == "allocate":
         ec2_commands.allocate_elastic_ip(
             ec2_client=ec2_client,
@@ -246,10 +523,299 @@ def manage_elastic_ip(
             region_name=region_name,
             eip_name=eip_name,
         )
+
+
+@app.command("apply")
+def apply_workspace_spec(
+        spec_path: str = typer.Argument(...),
+        profile_name: str = typer.Option(...),
+        region_name: str = typer.Option(...),
+        dry_run: bool = typer.Option(False),
+):
+    import commands.clients as clients_commands
+    import commands.spec as spec_commands
+    spec = spec_commands.load_spec(spec_path)
+    _configure_commands()
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
+    step_names = spec_commands.apply_spec(
+        ec2_client=ec2_client,
+        spec=spec,
+        region_name=region_name,
+        dry_run=dry_run,
+    )
+    for step_name in step_names:
+        print(f">>> {'planned' if dry_run else 'applied'} : {step_name}")
+    if not step_names:
+        print(">>> Workspace already matches the spec")
+
+
+@app.command("destroy")
+def destroy_workspace(
+        profile_name: str = typer.Option(...),
+        region_name: str = typer.Option(...),
+        vpc_name: str = typer.Option(...),
+        wait_timeout: float = typer.Option(600.0),
+        wait_mode: str = typer.Option("describe"),
+        dry_run: bool = typer.Option(False),
+):
+    _configure_commands()
+    import commands.clients as clients_commands
+    import commands.teardown as teardown_commands
+    import commands.waiter as waiter_commands
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
+    step_names = teardown_commands.destroy_workspace(
+        ec2_client=ec2_client,
+        vpc_name=vpc_name,
+        schedule=waiter_commands.Schedule(timeout=wait_timeout),
+        wait_mode=wait_mode,
+        dry_run=dry_run,
+    )
+    for step_name in step_names:
+        print(f">>> {'planned' if dry_run else 'deleted'} : {step_name}")
+
+
+@app.command("list")
+def list_resources(
+        resource_type: str = typer.Argument(...),
+        profile_name: str = typer.Option(...),
+        region_name: str = typer.Option(...),
+        vpc_name: Optional[str] = typer.Option(None),
+        filter: Optional[List[str]] = typer.Option(None),
+        page_size: Optional[int] = typer.Option(None),
+):
+    import commands.listing as listing_commands
+    _validate_action_type(resource_type, tuple(listing_commands.LISTABLE_RESOURCES))
+    _configure_commands()
+    import json
+    import commands.clients as clients_commands
+    import commands.vpc as vpc_commands
+    operation_name, vpc_filter_name = listing_commands.LISTABLE_RESOURCES[resource_type.lower()]
+    ec2_client = clients_commands.get_ec2_client(profile_name, region_name)
+    filters = listing_commands.build_filters(
+        vpc_id=vpc_commands.fetch_vpc_id(ec2_client, vpc_name) if vpc_name is not None else None,
+        vpc_filter_name=vpc_filter_name,
+        filters=_parse_key_values("filter", filter) if filter else {},
+    )
+    resources = listing_commands.iter_resources(
+        ec2_client, operation_name, page_size=page_size, **({"Filters": filters} if filters else {})
+    )
+    for resource in resources:  # one JSON document per line, printed as soon as its page arrives
+        print(json.dumps(resource, default=str), flush=True)
+
+
+@app.command("shell")
+def run_shell(ctx: typer.Context):
+    global shell_options, command_started_at
+    import click
+    import shlex
+    shell_options = dict(ctx.parent.params)
+    print(">>> Enter commands without 'python main.py'(ex. instance describe ...), or 'exit' to quit")
+    try:
+        while True:
+            try:
+                line = input("workspace> ")
+            except EOFError:
+                print()
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            try:
+                args = shlex.split(line)
+            except ValueError as error:
+                print(f">>> {error}")
+                continue
+            if not args:
+                continue
+            if args[0] in ("exit", "quit"):
+                break
+            if args[0] == "shell":
+                print(">>> Already running in shell")
+                continue
+            try:
+                app(args, standalone_mode=False)
+            except click.ClickException as error:
+                error.show()
+            except (click.exceptions.Abort, KeyboardInterrupt):
+                print(">>> Aborted")
+            except Exception as error:
+                print(f">>> {type(error).__name__} : {error}")
+    finally:
+        shell_options = None
+        command_started_at = STARTED_AT
+
+
+def _validate_action_type(action_type: str, action_types: Tuple[str, ...]):
+    """
+    Check action type before any AWS session is created, so typo is reported without loading boto3
+    :param action_type: action type given as argument
+    :param action_types: allowed action types of the command
+    :return: None
+    """
+    if action_type.lower() not in action_types:
+        raise ValueError(f"action_type must be one of {action_types}; got: '{action_type}'")
+
+
+def _configure_commands():
+    """
+    Configure client factory, rate limiter, state store and journal by global options of the running command
+    :return: None
+    """
+    import commands.clients as clients_commands
+    import commands.journal as journal_commands
+    import commands.ratelimit as ratelimit_commands
+    import commands.state as state_commands
+    clients_commands.configure(clients_commands.ClientOptions(
+        max_pool_connections=command_options["max_pool_connections"],
+        retry_mode=command_options["retry_mode"],
+        max_attempts=command_options["max_attempts"],
+        connect_timeout=command_options["connect_timeout"],
+        read_timeout=command_options["read_timeout"],
+        tcp_keepalive=command_options["tcp_keepalive"],
+        collect_metrics=command_options["metrics"] is not None,
+    ))
+    default_rate_limits = ratelimit_commands.RateLimitOptions()
+    ratelimit_commands.configure(dataclasses.replace(
+        default_rate_limits,
+        describe=dataclasses.replace(default_rate_limits.describe, refill_rate=command_options["describe_rate"]),
+        mutate=dataclasses.replace(default_rate_limits.mutate, refill_rate=command_options["mutate_rate"]),
+    ))
+    ratelimit_commands.reset()
+    state_commands.configure(command_options["state_file"])
+    journal_commands.configure(command_options["journal_file"], command_options["resume"])
+    clients_commands.timings.clear()
+
+
+def _parse_key_values(option_name: str, items: List[str]) -> Dict[str, str]:
+    """
+    Parse items of option given as 'key=value'(ex. --tag team=nlp)
+    :param option_name: name of option to be reported when an item is malformed
+    :param items: items given to the option
+    :return: dictionary of key and value
+    """
+    malformed = [item for item in items if "=" not in item or item.startswith("=")]
+    if malformed:
+        raise ValueError(f"{option_name} must be given as 'key=value'; got: {malformed}")
+    return dict(item.split("=", 1) for item in items)
+
+
+def _expand_subnet_layout(
+        ec2_client,
+        region_name: str,
+        subnet_names: List[str],
+        route_table_names: List[str],
+        az_postfixes: List[str],
+        count: Optional[int],
+) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Pair each subnet with its route table and availability zone. If count is given, names are templates formatted with
+    index `i` and availability zone postfix `az`(ex. 'public-{az}'), and subnets are spread over given availability
+    zones, or over every available zone of the region if none is given.
+    :param ec2_client: EC2 client created by boto3 session
+    :param region_name: name of region
+    :param subnet_names: names of subnets, or single name template if count is given
+    :param route_table_names: names of route tables, or single name template if count is given
+    :param az_postfixes: availability zone postfixes, where single postfix is shared by every subnet
+    :param count: number of subnets to be expanded from name templates
+    :return: list of tuples of subnet name, route table name and availability zone postfix
+    """
+    if count is not None:
+        if len(subnet_names) != 1 or len(route_table_names) != 1:
+            raise ValueError("Single template of subnet_name and route_table_name must be given with count")
+        if not az_postfixes:
+            import commands.vpc as vpc_commands
+            az_postfixes = vpc_commands.fetch_availability_zone_postfixes(ec2_client, region_name)
+        postfixes = [az_postfixes[index % len(az_postfixes)] for index in range(count)]
+        subnet_names = [subnet_names[0].format(i=index, az=postfix) for index, postfix in enumerate(postfixes)]
+        route_table_names = [
+            route_table_names[0].format(i=index, az=postfix) for index, postfix in enumerate(postfixes)
+        ]
+    elif len(az_postfixes) <= 1:
+        postfixes = [az_postfixes[0] if az_postfixes else None] * len(subnet_names)
     else:
-        raise ValueError(
-            f"action_type must be one of ('allocate', 'associate', 'disassociate', 'release'); got: '{action_type}'"
+        postfixes = list(az_postfixes)
+    if not len(subnet_names) == len(route_table_names) == len(postfixes):
+        raise ValueError("Same number of subnet_name, route_table_name and az_postfix must be given")
+    if len(set(subnet_names)) < len(subnet_names) or len(set(route_table_names)) < len(route_table_names):
+        raise ValueError(f"Names of subnets and route tables must be unique; got: {subnet_names}, {route_table_names}")
+    return list(zip(subnet_names, route_table_names, postfixes))
+
+
+def _run_in_regions(
+        profile_name: str,
+        region_name: Optional[str],
+        regions: str,
+        function: Callable[[Any, str], List[str]],
+):
+    """
+    Run function for every region concurrently, print lines returned by each region as soon as it is finished, and
+    print merged report of regions at last
+    :param profile_name: name of AWS profile
+    :param region_name: name of region used to list regions when regions is 'all'
+    :param regions: comma separated region names or 'all'
+    :param function: function that takes EC2 client and name of region, and returns lines to print
+    :return: None
+    """
+    import commands.clients as clients_commands
+    import commands.regions as regions_commands
+    ec2_client = None
+    if regions.strip().lower() == regions_commands.ALL_REGIONS:
+        ec2_client = clients_commands.get_ec2_client(
+            profile_name,
+            region_name or clients_commands.get_session(profile_name).region_name or "us-east-1",
         )
+    region_names = regions_commands.parse_region_names(ec2_client, regions)
+    ec2_clients = {name: clients_commands.get_ec2_client(profile_name, name) for name in region_names}
+    failures = {}
+    for name, lines, error in regions_commands.fan_out(lambda name: function(ec2_clients[name], name), region_names):
+        print(f"[{name}]")
+        if error is not None:
+            failures[name] = error
+            lines = [f"FAILED : {error!r}"]
+        for line in lines:
+            print(f"  {line}")
+    print(f">>> {len(region_names) - len(failures)} of {len(region_names)} regions succeeded")
+    if failures:
+        raise RuntimeError(f"Command failed in regions {sorted(failures)}")
+
+
+def _format_transition(transition: dict) -> str:
+    return f"{transition['InstanceId']} : {transition['From']} -> {transition['To']} ({transition['Elapsed']}s)"
+
+
+def _format_state_change(change: dict) -> str:
+    if change["From"] is None:
+        return f"{change['Time']} {change['Name']} ({change['InstanceId']}) : {change['To']}"
+    return (
+        f"{change['Time']} {change['Name']} ({change['InstanceId']}) : {change['From']} -> {change['To'] or 'gone'}"
+        f" after {change['Elapsed']}s in {change['From']}"
+    )
+
+
+def _print_metrics(output_format: str):
+    """
+    Print metrics of API calls made by the command
+    :param output_format: one of ('table', 'json', 'prometheus')
+    :return: None
+    """
+    import commands.metrics as metrics_commands
+    print(metrics_commands.format_metrics(output_format))
+
+
+def _print_timings():
+    """
+    Print time spent on each phase of the command
+    :return: None
+    """
+    total = time.perf_counter() - command_started_at
+    import commands.clients as clients_commands
+    import commands.ratelimit as ratelimit_commands
+    timings.update(clients_commands.timings)
+    for call_class, (_, seconds) in ratelimit_commands.queued().items():  # summed over calls made concurrently
+        timings[f"queued {call_class}"] = seconds
+    timings["total"] = total
+    for phase, seconds in timings.items():
+        print(f">>> {phase:<14} : {seconds:.3f}s")
 
 
 if __name__ == "__main__":